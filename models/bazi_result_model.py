@@ -293,6 +293,26 @@ class BaziResultModel:
             logging.error(traceback.format_exc())
             return None
     
+    @staticmethod
+    def find_analysis_status(result_id, projection):
+        """只读取分析状态相关字段，不做 find_by_id 中的数据修复写入
+        
+        Args:
+            result_id: 结果ID（与 find_by_id 一样兼容 RES 前缀）
+            projection: 需要的字段
+            
+        Returns:
+            dict: 含 _id 和 projection 中字段的记录，未找到时返回 None
+        """
+        candidates = [result_id]
+        if isinstance(result_id, str):
+            candidates.append(result_id[3:] if result_id.startswith('RES') else f"RES{result_id}")
+        for candidate in candidates:
+            result = results_collection.find_one({'_id': candidate}, projection)
+            if result:
+                return result
+        return None
+    
     @staticmethod
     def find_by_user(user_id):
         """查找用户的所有结果"""
@@ -301,6 +321,37 @@ class BaziResultModel:
             result['_id'] = str(result['_id'])
         return results
     
+    @staticmethod
+    def find_bazi_charts(result_ids):
+        """
+        批量读取分析结果中的四柱（合婚排序用），只取四柱字段
+        
+        Args:
+            result_ids: 结果ID列表（与 find_by_id 一样兼容 RES 前缀）
+            
+        Returns:
+            dict: 调用方传入的结果ID -> baziChart（只含 yearPillar、monthPillar、dayPillar、hourPillar）
+        """
+        # 每个ID连同多或少 RES 前缀的写法一起查询，记录查到后映射回传入的ID
+        requested = {}
+        for result_id in result_ids:
+            candidates = [result_id]
+            if isinstance(result_id, str):
+                candidates.append(result_id[3:] if result_id.startswith('RES') else f"RES{result_id}")
+            for rank, candidate in enumerate(candidates):
+                requested.setdefault(candidate, []).append((rank, str(result_id)))
+        
+        projection = {f"baziChart.{name}Pillar": 1 for name in ("year", "month", "day", "hour")}
+        cursor = results_collection.find({'_id': {'$in': list(requested)}}, projection)
+        charts, ranks = {}, {}
+        for result in cursor:
+            for rank, result_id in requested.get(result['_id'], []):
+                # 原样的ID和加减前缀的ID都存在时，与 find_by_id 一样优先原样的ID
+                if result_id not in ranks or rank < ranks[result_id]:
+                    ranks[result_id] = rank
+                    charts[result_id] = result.get('baziChart', {})
+        return charts
+    
     @staticmethod
     def find_by_order_id(order_id):
         """通过订单ID查找结果"""
@@ -379,8 +430,14 @@ class BaziResultModel:
             return None
     
     @staticmethod
-    def update_ai_analysis(result_id, analysis_data):
-        """更新AI分析结果"""
+    def update_ai_analysis(result_id, analysis_data, sections_status=None):
+        """更新AI分析结果
+        
+        Args:
+            result_id: 结果ID
+            analysis_data: 分析结果
+            sections_status: 各部分状态（completed / failed），为 None 时全部视为 completed
+        """
         try:
             # 记录更新内容
             logger.info(f"更新AI分析结果: {result_id}")
@@ -400,6 +457,9 @@ class BaziResultModel:
                 if field not in analysis_data or not analysis_data[field]:
                     logger.warning(f"aiAnalysis缺少必要字段: {field}，添加默认值")
                     analysis_data[field] = f"正在分析{field}..."
+            # 整体更新后各部分都以此为准（流式生成时已逐个写入过）
+            if sections_status is None:
+                sections_status = {field: 'completed' for field in analysis_data}
             
             # 尝试直接使用原始ID更新
             result = results_collection.find_one_and_update(
@@ -408,6 +468,7 @@ class BaziResultModel:
                     'aiAnalysis': analysis_data,
                     'analysisStatus': 'completed',  # 添加分析状态
                     'analysisProgress': 100,         # 添加分析进度
+                    'analysisSections': sections_status,
                     'updateTime': datetime.now()
                 }},
                 return_document=ReturnDocument.AFTER
@@ -423,6 +484,7 @@ class BaziResultModel:
                         'aiAnalysis': analysis_data,
                         'analysisStatus': 'completed',  # 添加分析状态
                         'analysisProgress': 100,         # 添加分析进度
+                        'analysisSections': sections_status,
                         'updateTime': datetime.now()
                     }},
                     return_document=ReturnDocument.AFTER
@@ -503,6 +565,45 @@ class BaziResultModel:
             logger.error(traceback.format_exc())
             return None
     
+    @staticmethod
+    def update_analysis_section(result_id, section, content, progress=None):
+        """保存流式生成中已完成的一个分析部分，前端轮询时即可看到
+        
+        Args:
+            result_id: 结果ID
+            section: 分析部分字段名，如'coreAnalysis'
+            content: 该部分的分析内容
+            progress: 分析进度（百分比），为 None 时不更新
+            
+        Returns:
+            bool: 是否更新成功
+        """
+        try:
+            update_data = {
+                f"aiAnalysis.{section}": content,
+                f"analysis.{section}": content,
+                f"analysisSections.{section}": "completed",
+                "updateTime": datetime.now()
+            }
+            if progress is not None:
+                update_data["analysisProgress"] = progress
+            
+            update_result = results_collection.update_one({'_id': result_id}, {'$set': update_data})
+            
+            # 如果没找到，尝试添加RES前缀
+            if update_result.matched_count == 0 and isinstance(result_id, str) and not result_id.startswith('RES'):
+                update_result = results_collection.update_one({'_id': f"RES{result_id}"}, {'$set': update_data})
+            
+            if update_result.matched_count > 0:
+                logger.info(f"已保存分析部分: {result_id}, {section}, 内容长度: {len(content)} 字符")
+                return True
+            logger.warning(f"未找到要更新的记录: {result_id}")
+            return False
+        except Exception as e:
+            logger.error(f"保存分析部分失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+    
     @staticmethod
     def update_analysis(result_id, bazi_chart, ai_analysis):
         """更新分析结果
@@ -682,7 +783,7 @@ class BaziResultModel:
             return None
     
     @staticmethod
-    def update_birth_info(result_id, birth_date, birth_time, gender):
+    def update_birth_info(result_id, birth_date, birth_time, gender, chart_changes=None):
         """更新出生信息
         
         Args:
@@ -690,6 +791,8 @@ class BaziResultModel:
             birth_date: 出生日期
             birth_time: 出生时间
             gender: 性别
+            chart_changes: 重新排盘后有变化的命盘部件 {部件名: 新值}，只更新这些部件，
+                新值为 None 时删除该部件（见 bazi_calculator.diff_bazi_charts）
             
         Returns:
             dict: 更新后的结果
@@ -705,16 +808,25 @@ class BaziResultModel:
                 update_data["birthTime"] = birth_time
             if gender:
                 update_data["gender"] = gender
+            unset_data = {}
+            for component, value in (chart_changes or {}).items():
+                if value is None:
+                    unset_data[f"baziChart.{component}"] = ""
+                else:
+                    update_data[f"baziChart.{component}"] = value
                 
             # 如果没有需要更新的数据，直接返回
-            if not update_data:
+            if not update_data and not unset_data:
                 logging.warning("没有需要更新的出生信息")
                 return None
+            update = {"$set": update_data} if update_data else {}
+            if unset_data:
+                update["$unset"] = unset_data
                 
             # 更新数据
             result = results_collection.find_one_and_update(
                 {"_id": result_id},
-                {"$set": update_data},
+                update,
                 return_document=ReturnDocument.AFTER
             )
             
@@ -724,7 +836,7 @@ class BaziResultModel:
                     obj_id = ObjectId(result_id)
                     result = results_collection.find_one_and_update(
                         {"_id": obj_id},
-                        {"$set": update_data},
+                        update,
                         return_document=ReturnDocument.AFTER
                     )
                 except Exception as e:
@@ -1,13 +1,25 @@
-from flask import Blueprint, jsonify, request, send_file, current_app
+from flask import Blueprint, Response, jsonify, request, send_file, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from pymongo import MongoClient
 import os
 import logging
+import json
+import time
 import traceback
 from models.bazi_result_model import BaziResultModel
 from models.order_model import OrderModel
-from utils.bazi_calculator import calculate_bazi, calculate_flowing_years
-from utils.ai_service import generate_bazi_analysis
+from utils.chart_pool import calculate_bazi, calculate_bazi_many, calculate_flowing_years
+from utils.bazi_calculator import (
+    calculate_bazi_chart, chart_code_from_dict, compare_charts, diff_bazi_charts, rank_charts
+)
+from utils.bazi_timeline import get_timeline_page
+from utils.luck_calendar import get_luck_calendar, parse_calendar_date
+from utils.bazi_reverse_index import find_birth_datetimes
+from utils import analysis_events
+from utils.ai_service import (
+    ANALYSIS_SECTIONS, format_five_element_strength, generate_bazi_analysis, sections_affected_by
+)
+from utils.birth_datetime import BirthDateTimeError, parse_birth_datetime
 from datetime import datetime
 from flask_cors import cross_origin
 
@@ -39,6 +51,17 @@ logging.info(f"DeepSeek API URL: {DEEPSEEK_API_URL}")
 # 存储正在进行分析的结果ID，避免重复分析
 analyzing_results = {}
 
+# 合婚批量排序一次最多比较的候选数
+BAZI_MATCH_MAX_CANDIDATES = int(os.getenv('BAZI_MATCH_MAX_CANDIDATES', '10000'))
+
+# 批量计算八字单次请求允许的最大记录数
+BAZI_BATCH_MAX_SIZE = int(os.getenv('BAZI_BATCH_MAX_SIZE', '1000'))
+
+# 分析进度 SSE 连接的最长持续秒数（客户端随后按 Last-Event-ID 重连）、心跳间隔，以及长轮询最长等待秒数
+ANALYSIS_EVENTS_MAX_SECONDS = float(os.getenv('ANALYSIS_EVENTS_MAX_SECONDS', '300'))
+ANALYSIS_EVENTS_HEARTBEAT = float(os.getenv('ANALYSIS_EVENTS_HEARTBEAT', '15'))
+ANALYSIS_EVENTS_MAX_WAIT = float(os.getenv('ANALYSIS_EVENTS_MAX_WAIT', '30'))
+
 
 @bazi_bp.route('/history', methods=['GET'])
 @jwt_required()
@@ -136,6 +159,11 @@ def get_bazi_result(result_id):
             ai_analysis_complete = False
             analysis_status = 'pending'
         
+        # 流式生成中只有部分完成时，返回已完成的部分，整体仍为进行中（failed 的部分不再等待）
+        analysis_sections = result.get('analysisSections') or {}
+        if any(status == 'pending' for status in analysis_sections.values()):
+            ai_analysis_complete = False
+        
         # 只有当AI分析真正完成时，才返回completed状态
         if ai_analysis_complete:
             analysis_status = 'completed'
@@ -152,13 +180,356 @@ def get_bazi_result(result_id):
                 "baziChart": result.get('baziChart', {}),
                 "aiAnalysis": result.get('aiAnalysis', {}),
                 "analysisStatus": analysis_status,
-                "analysisProgress": analysis_progress
+                "analysisProgress": analysis_progress,
+                "analysisSections": analysis_sections
             }
         )
     except Exception as e:
         logging.error(f"获取八字分析结果出错: {str(e)}")
         return jsonify(code=500, message=f"获取分析结果出错: {str(e)}"), 500
 
+def _format_sse(event, data, event_id=None):
+    """格式化一条 SSE 消息"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+def _analysis_event_stream(result_id, document, last_event_id):
+    """
+    SSE 消息生成器：先发 snapshot，再转发本进程的分析事件；分析在其他进程中进行时
+    监视数据库中的结果记录推算事件。收到 completed / failed 或超过最长持续时间后结束
+    """
+    state = analysis_events.snapshot(document)
+    yield _format_sse("snapshot", state)
+    if state["analysisStatus"] in analysis_events.TERMINAL_EVENTS and not analysis_events.has_channel(result_id):
+        return
+    
+    watcher = analysis_events.DocumentWatcher(db.bazi_results, {"_id": document["_id"]})
+    deadline = time.monotonic() + ANALYSIS_EVENTS_MAX_SECONDS
+    last_sent = time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            wait = min(ANALYSIS_EVENTS_HEARTBEAT, analysis_events.ANALYSIS_EVENTS_POLL_INTERVAL)
+            events, done = analysis_events.wait_events(result_id, last_event_id, timeout=wait)
+            if events or done:
+                for event in events:
+                    yield _format_sse(event["event"], event["data"], event["id"])
+                    last_event_id = event["id"]
+                if done:
+                    return
+                last_sent = time.monotonic()
+            elif not analysis_events.has_channel(result_id):
+                changed = watcher.wait_change(wait)
+                if changed:
+                    for event, data in analysis_events.diff_status(state, changed):
+                        yield _format_sse(event, data)
+                        last_sent = time.monotonic()
+                        if event in analysis_events.TERMINAL_EVENTS:
+                            return
+                    state = analysis_events.snapshot(changed)
+            if time.monotonic() - last_sent >= ANALYSIS_EVENTS_HEARTBEAT:
+                # SSE 注释行，保持连接不被代理断开
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        watcher.close()
+
+@bazi_bp.route('/events/<result_id>', methods=['GET'])
+def get_analysis_events(result_id):
+    """
+    分析进度推送，代替反复请求 /result/<result_id>
+    
+    默认返回 text/event-stream：先发 snapshot（当前状态和已完成的部分），之后推送
+    progress、section（部分完成，含内容）、completed、failed 事件。断线重连时浏览器
+    自动带上 Last-Event-ID，只补发之后的事件。
+    
+    mode=poll 时为长轮询：最多等待 timeout 秒（默认 25），返回 after 之后的事件；
+    分析在其他进程中进行时返回变化后的 snapshot。
+    """
+    try:
+        document = BaziResultModel.find_analysis_status(result_id, analysis_events.STATUS_PROJECTION)
+        if not document:
+            return jsonify(code=404, message="未找到分析结果"), 404
+        # 分析线程按记录中的 ID 发布事件，请求中的 ID 可能多或少 RES 前缀
+        if not analysis_events.has_channel(result_id) and analysis_events.has_channel(str(document['_id'])):
+            result_id = str(document['_id'])
+        
+        if request.args.get('mode') == 'poll':
+            try:
+                after = int(request.args.get('after', 0))
+                timeout = min(float(request.args.get('timeout', 25)), ANALYSIS_EVENTS_MAX_WAIT)
+            except ValueError:
+                return jsonify(code=400, message="after、timeout 参数格式错误"), 400
+            timeout = max(0.0, timeout)
+            if analysis_events.has_channel(result_id):
+                events, done = analysis_events.wait_events(result_id, after, timeout=timeout)
+                data = {"events": events, "done": done, "lastEventId": events[-1]["id"] if events else after}
+            else:
+                # 分析不在本进程中进行，本进程不会有事件，直接等待数据库记录变化
+                watcher = analysis_events.DocumentWatcher(db.bazi_results, {"_id": document["_id"]})
+                try:
+                    changed = watcher.wait_change(timeout)
+                finally:
+                    watcher.close()
+                data = {"events": [], "done": False, "lastEventId": after,
+                        "snapshot": analysis_events.snapshot(changed or document)}
+            return jsonify(code=200, message="获取成功", data=data)
+        
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+        except ValueError:
+            last_event_id = 0
+        response = Response(stream_with_context(_analysis_event_stream(result_id, document, last_event_id)),
+                            mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # 关闭 nginx 缓冲，事件立即送达
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        logging.error(f"获取分析进度出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"获取分析进度出错: {str(e)}"), 500
+
+def _chart_for_result(result):
+    """
+    由分析结果中保存的出生信息重建 BaziChart，保存了出生地经度时按真太阳时排盘
+    
+    Raises:
+        BirthDateTimeError: 保存的出生时间无法解析
+    """
+    birth = parse_birth_datetime(result.get('birthDate'), result.get('birthTime'))
+    return calculate_bazi_chart(f"{birth.date_text} {birth.time_text}", result.get('gender', 'male'),
+                                result.get('longitude'))
+
+def _parse_longitude(value):
+    """
+    解析请求中的出生地经度，未提供时返回 None
+    
+    Raises:
+        ValueError: 不是数字或超出 [-180, 180]
+    """
+    if value is None or value == '':
+        return None
+    try:
+        longitude = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"经度格式错误: {value}")
+    if not -180 <= longitude <= 180:
+        raise ValueError(f"经度超出范围: {value}")
+    return longitude
+
+@bazi_bp.route('/timeline/<result_id>', methods=['GET'])
+def get_bazi_timeline(result_id):
+    """
+    分页获取大运流年时间线
+    
+    查询参数:
+    - offset: 跳过的大运周期数，默认 0（第 0 项为起运前）
+    - limit: 本页大运周期数，默认 3
+    - months: 为 1 时每个流年附带流月
+    """
+    try:
+        result = BaziResultModel.find_by_id(result_id)
+        if not result:
+            return jsonify(code=404, message="未找到分析结果"), 404
+        
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', 3))
+        except ValueError:
+            return jsonify(code=400, message="offset 和 limit 必须是整数"), 400
+        include_months = request.args.get('months') in ('1', 'true')
+        
+        try:
+            chart = _chart_for_result(result)
+        except BirthDateTimeError as e:
+            logging.error(f"出生时间解析失败: {str(e)}")
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+        
+        page = get_timeline_page(chart, offset, limit, include_months)
+        return jsonify(code=200, message="获取成功", data=page)
+    except Exception as e:
+        logging.error(f"获取大运流年时间线出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"获取时间线出错: {str(e)}"), 500
+
+@bazi_bp.route('/calendar/<result_id>', methods=['GET'])
+def get_bazi_luck_calendar(result_id):
+    """
+    获取流月、流日运势日历
+    
+    查询参数:
+    - start: 起始日期 YYYY-MM-DD，默认今天
+    - end: 结束日期 YYYY-MM-DD，默认起始日期后一个月（逐日）或一年（逐月）
+    - granularity: day（默认）或 month
+    """
+    try:
+        result = BaziResultModel.find_by_id(result_id)
+        if not result:
+            return jsonify(code=404, message="未找到分析结果"), 404
+        
+        try:
+            chart = _chart_for_result(result)
+        except BirthDateTimeError as e:
+            logging.error(f"出生时间解析失败: {str(e)}")
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+        
+        try:
+            calendar = get_luck_calendar(chart,
+                                         parse_calendar_date(request.args.get('start')),
+                                         parse_calendar_date(request.args.get('end')),
+                                         request.args.get('granularity', 'day'))
+        except ValueError as e:
+            return jsonify(code=400, message=str(e)), 400
+        return jsonify(code=200, message="获取成功", data=calendar)
+    except Exception as e:
+        logging.error(f"获取运势日历出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"获取运势日历出错: {str(e)}"), 500
+
+def _chart_for_match_side(side):
+    """
+    合婚请求中的一方：{"resultId": ...} 或 {"birthDate", "birthTime", "gender"}
+    
+    Raises:
+        LookupError: 结果ID不存在
+        BirthDateTimeError: 出生时间无法解析
+    """
+    if not isinstance(side, dict):
+        side = {}
+    if side.get('resultId'):
+        result = BaziResultModel.find_by_id(side['resultId'])
+        if not result:
+            raise LookupError(f"未找到分析结果: {side['resultId']}")
+        return _chart_for_result(result)
+    return _chart_for_result(side)
+
+@bazi_bp.route('/compare', methods=['POST'])
+def compare_bazi_charts():
+    """
+    合婚：比较两个命盘
+    
+    请求体: {"a": 一方, "b": 另一方}，每一方为 {"resultId"} 或 {"birthDate", "birthTime", "gender"}
+    """
+    try:
+        data = request.json or {}
+        try:
+            chart_a = _chart_for_match_side(data.get('a'))
+            chart_b = _chart_for_match_side(data.get('b'))
+        except LookupError as e:
+            return jsonify(code=404, message=str(e)), 404
+        except BirthDateTimeError as e:
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+        
+        return jsonify(code=200, message="获取成功", data=compare_charts(chart_a, chart_b))
+    except Exception as e:
+        logging.error(f"合婚比较出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"合婚比较出错: {str(e)}"), 500
+
+@bazi_bp.route('/compare/rank', methods=['POST'])
+def rank_bazi_charts():
+    """
+    合婚批量排序：用一方命盘给数据库中保存的候选命盘打分排序
+    
+    请求体: {"target": 一方, "candidateIds": [结果ID, ...], "limit": 20}
+    """
+    try:
+        data = request.json or {}
+        candidate_ids = data.get('candidateIds') or []
+        if not isinstance(candidate_ids, list) or not candidate_ids:
+            return jsonify(code=400, message="candidateIds 不能为空"), 400
+        if len(candidate_ids) > BAZI_MATCH_MAX_CANDIDATES:
+            return jsonify(code=400, message=f"候选数不能超过 {BAZI_MATCH_MAX_CANDIDATES}"), 400
+        try:
+            limit = int(data.get('limit', 20))
+        except (TypeError, ValueError):
+            return jsonify(code=400, message="limit 必须是整数"), 400
+        
+        try:
+            target = _chart_for_match_side(data.get('target'))
+        except LookupError as e:
+            return jsonify(code=404, message=str(e)), 404
+        except BirthDateTimeError as e:
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+        
+        # 候选命盘直接用保存的四柱求编码，不重新排盘
+        stored_charts = BaziResultModel.find_bazi_charts(candidate_ids)
+        ranked_ids, codes, skipped = [], [], []
+        for result_id in candidate_ids:
+            code = chart_code_from_dict(stored_charts.get(str(result_id)))
+            if code is None:
+                skipped.append(result_id)
+            else:
+                ranked_ids.append(result_id)
+                codes.append(code)
+        
+        ranking = [
+            {"resultId": ranked_ids[item["index"]], "score": item["score"], "level": item["level"]}
+            for item in rank_charts(target, codes, limit)
+        ]
+        return jsonify(code=200, message="获取成功", data={
+            "ranking": ranking,
+            "total": len(codes),
+            "skipped": skipped
+        })
+    except Exception as e:
+        logging.error(f"合婚排序出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"合婚排序出错: {str(e)}"), 500
+
+@bazi_bp.route('/calculate/batch', methods=['POST'])
+def calculate_bazi_batch():
+    """
+    批量计算八字（不保存结果）
+    
+    请求体: {"records": [{"birthDate": "1990-05-15", "birthTime": "14:30", "gender": "male"}, ...]}
+    
+    返回与 records 顺序一致的八字信息列表，某条记录计算失败时该位置为 {"error": 错误信息, ...}，
+    不影响其他记录
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        records = data.get('records')
+        if not isinstance(records, list):
+            return jsonify(code=400, message="请提供出生信息列表"), 400
+        if len(records) > BAZI_BATCH_MAX_SIZE:
+            return jsonify(code=400, message=f"单次最多计算{BAZI_BATCH_MAX_SIZE}条记录"), 400
+        
+        # 非对象的记录原位报错，其余记录照常批量计算
+        valid = [index for index, record in enumerate(records) if isinstance(record, dict)]
+        results = [{"error": "出生信息格式错误"}] * len(records)
+        for index, result in zip(valid, calculate_bazi_many([records[index] for index in valid])):
+            results[index] = result
+        return jsonify(code=200, message="计算成功", data=results)
+    except Exception as e:
+        logging.error(f"批量计算八字出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"批量计算八字出错: {str(e)}"), 500
+
+@bazi_bp.route('/reverse', methods=['GET'])
+def reverse_bazi_lookup():
+    """
+    由四柱反查出生时间（1900-2100 年）
+    
+    查询参数:
+    - pillars: 年、月、日柱和可选的时柱，如 "庚午 辛巳 庚辰 癸未" 或 "庚午,辛巳,庚辰"
+    """
+    try:
+        try:
+            matches = find_birth_datetimes(request.args.get('pillars', ''))
+        except ValueError as e:
+            return jsonify(code=400, message=str(e)), 400
+        return jsonify(code=200, message="获取成功", data={
+            "matches": matches,
+            "total": len(matches)
+        })
+    except Exception as e:
+        logging.error(f"四柱反查出错: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify(code=500, message=f"四柱反查出错: {str(e)}"), 500
+
 # 新增API端点：更新八字分析数据
 @bazi_bp.route('/update/<result_id>', methods=['POST', 'OPTIONS'])
 @cross_origin()  # 添加跨域支持
@@ -197,16 +568,33 @@ def update_bazi_analysis(result_id):
                     f"generateDayunData={generate_dayun_data}, generateLiunianData={generate_liunian_data}, "
                     f"useDeepseekAPI={use_deepseek_api}")
         
-        # 组合出生日期时间
-        birth_datetime = f"{birth_date} {birth_time}"
+        recalculate = force_recalculate or not result.get('baziChart')
+        if recalculate or birth_date:
+            # 解析出生日期时间
+            try:
+                birth = parse_birth_datetime(birth_date, birth_time)
+            except BirthDateTimeError as e:
+                logging.error(f"出生时间解析失败: {str(e)}")
+                return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+            try:
+                longitude = _parse_longitude(data.get('longitude', result.get('longitude')))
+            except ValueError as e:
+                return jsonify(code=400, message=str(e)), 400
+            birth_datetime = f"{birth.date_text} {birth.time_text}"
+        
+        # 已有八字数据时修改出生信息：只更新有变化的命盘部件，只重新生成受影响的分析部分
+        if not recalculate and birth_date:
+            return _update_birth_info(result_id, result, birth_date, birth_time, gender, longitude,
+                                      calculate_bazi(birth_datetime, gender, longitude), use_deepseek_api)
         
         # 计算八字(如果强制重新计算或没有八字数据)
-        if force_recalculate or not result.get('baziChart'):
-            logging.info(f"计算八字数据: {birth_datetime}, gender={gender}")
-            bazi_chart = calculate_bazi(birth_datetime, gender)
+        if recalculate:
+            logging.info(f"计算八字数据: {birth_datetime}, gender={gender}, longitude={longitude}")
+            bazi_chart = calculate_bazi(birth_datetime, gender, longitude)
             
             # 更新八字图
             result['baziChart'] = bazi_chart
+            result['longitude'] = longitude
             
             # 如果需要，生成神煞数据
             if generate_shensha_data:
@@ -222,12 +610,9 @@ def update_bazi_analysis(result_id):
             if generate_liunian_data:
                 logging.info(f"生成流年数据")
                 # 生成流年数据
-                current_year = datetime.now().year
-                birth_year = int(birth_date.split('-')[0])
-                
                 # 使用calculate_flowing_years函数生成流年数据
                 flowing_years = calculate_flowing_years(gender, {
-                    "birthYear": birth_year,
+                    "birthYear": birth.year,
                     "dayHeavenlyStem": result['baziChart']['dayPillar']['heavenlyStem'],
                     "dayEarthlyBranch": result['baziChart']['dayPillar']['earthlyBranch']
                 })
@@ -263,6 +648,47 @@ def update_bazi_analysis(result_id):
         logging.error(traceback.format_exc())
         return jsonify(code=500, message=str(e)), 500
 
+def _update_birth_info(result_id, result, birth_date, birth_time, gender, longitude, bazi_chart, use_deepseek_api):
+    """
+    修改出生信息后的增量更新：与原命盘比较，只写入有变化的部件，只重新生成受影响的分析部分
+    
+    Returns:
+        Response: data 中 chartDiff 为命盘变化（见 diff_bazi_charts），sections 为已安排重新生成的分析部分；
+            分析正在进行时返回 409，不写入任何修改（进行中的分析基于原命盘，完成后会覆盖新写入的部分）
+    """
+    if result_id in analyzing_results:
+        logging.info(f"分析进行中，拒绝修改出生信息: {result_id}")
+        return jsonify(code=409, message="分析正在进行中，请在分析完成后再修改出生信息"), 409
+    
+    chart_diff = diff_bazi_charts(result['baziChart'], bazi_chart)
+    sections = sections_affected_by(chart_diff) if use_deepseek_api else []
+    logging.info(f"出生信息修改: {result_id}, 变化部件={list(chart_diff)}, 重新生成={sections}")
+    # 写入前占住分析标志，避免另一个请求在写入和启动分析之间开始分析
+    if sections:
+        analyzing_results[result_id] = True
+    
+    chart_changes = {component: change['after'] for component, change in chart_diff.items()}
+    if not BaziResultModel.update_birth_info(result_id, birth_date, birth_time, gender, chart_changes):
+        logging.error(f"更新出生信息失败: {result_id}")
+        analyzing_results.pop(result_id, None)
+        return jsonify(code=500, message="更新出生信息失败"), 500
+    if longitude != result.get('longitude'):
+        BaziResultModel.update_field(result_id, 'longitude', longitude)
+    
+    if sections:
+        updated = BaziResultModel.find_by_id(result_id)
+        updated['analysisStatus'] = 'pending'
+        updated['analysisProgress'] = 0
+        if not BaziResultModel.update(result_id, updated):
+            logging.error(f"更新分析状态失败: {result_id}")
+        
+        from threading import Thread
+        Thread(target=process_deepseek_analysis, args=(result_id, updated, sections)).start()
+        logging.info(f"已触发异步DeepSeek分析: {result_id}, 部分={sections}")
+    
+    return jsonify(code=200, message="八字分析数据更新成功",
+                   data={"resultId": result_id, "chartDiff": chart_diff, "sections": sections})
+
 # 新增API端点：触发八字深度分析
 @bazi_bp.route('/analyze/<result_id>', methods=['POST', 'OPTIONS'])
 @cross_origin()  # 添加跨域支持
@@ -313,15 +739,26 @@ def analyze_bazi(result_id):
         return jsonify(code=500, message=str(e)), 500
 
 # DeepSeek API处理函数
-def process_deepseek_analysis(result_id, result):
+def process_deepseek_analysis(result_id, result, sections=None):
+    """
+    异步生成分析并写回结果
+    
+    Args:
+        sections: 只重新生成这些部分并合并到已有分析中，为 None 时生成完整分析
+    """
     try:
         logging.info(f"开始进行DeepSeek API分析: {result_id}")
         
+        # 各部分的生成状态，流式生成时逐个标记为 completed
+        section_keys = sections if sections is not None else [key for key, _, _ in ANALYSIS_SECTIONS]
+        result['analysisSections'] = {key: 'pending' for key in section_keys}
+        
         # 更新分析进度
         result['analysisProgress'] = 10
         success = BaziResultModel.update(result_id, result)
         if not success:
             logging.error(f"更新分析进度失败(10%): {result_id}")
+        analysis_events.publish(result_id, 'progress', {'progress': 10, 'sections': section_keys})
         
         # 获取八字数据
         bazi_chart = result.get('baziChart', {})
@@ -330,6 +767,7 @@ def process_deepseek_analysis(result_id, result):
             result['analysisStatus'] = 'failed'
             result['analysisMessage'] = "没有八字数据，无法进行分析"
             BaziResultModel.update(result_id, result)
+            analysis_events.publish(result_id, 'failed', {'message': result['analysisMessage']})
             del analyzing_results[result_id]
             return
         
@@ -343,17 +781,38 @@ def process_deepseek_analysis(result_id, result):
         success = BaziResultModel.update(result_id, result)
         if not success:
             logging.error(f"更新分析进度失败(20%): {result_id}")
+        analysis_events.publish(result_id, 'progress', {'progress': 20})
         
         # 调用DeepSeek API进行分析
         try:
+            completed = []
+            
+            def save_section(key, content):
+                # 每个部分生成完立即写入，前端轮询时先看到已完成的部分
+                # 内存中的结果也同步更新，之后整体写回（包括失败时）不会丢掉已完成的部分
+                completed.append(key)
+                progress = min(90, 20 + 70 * len(completed) // max(1, len(section_keys)))
+                if not result.get('aiAnalysis'):
+                    result['aiAnalysis'] = {}
+                result['aiAnalysis'][key] = content
+                result['analysisSections'][key] = 'completed'
+                result['analysisProgress'] = progress
+                BaziResultModel.update_analysis_section(result_id, key, content, progress)
+                analysis_events.publish(result_id, 'section', {'section': key, 'content': content, 'progress': progress})
+            
             # 准备分析请求
-            analysis = generate_bazi_analysis(bazi_chart, gender_cn)
+            analysis = generate_bazi_analysis(bazi_chart, gender_cn, sections, on_section=save_section)
+            if not analysis:
+                raise ValueError("没有生成任何分析内容")
             logging.info(f"DeepSeek API分析完成: {result_id}")
             
             # 更新结果
             result['analysisStatus'] = 'completed'  # 明确设置为已完成
             result['analysisProgress'] = 100  # 明确设置为100%
-            result['analysis'] = analysis
+            if sections is None:
+                result['analysis'] = analysis
+            else:
+                result['analysis'] = {**(result.get('analysis') or {}), **analysis}
             
             # 同时更新到aiAnalysis字段，确保前端能正确显示
             if 'aiAnalysis' not in result or not result['aiAnalysis']:
@@ -365,12 +824,15 @@ def process_deepseek_analysis(result_id, result):
                 
             # 确保分析状态明确标记为已完成
             result['analysisCompleted'] = True
+            # 按部分并发生成时，个别部分可能失败
+            result['analysisSections'] = {key: 'completed' if analysis.get(key) else 'failed' for key in section_keys}
             
             success = BaziResultModel.update(result_id, result)
             if not success:
                 logging.error(f"更新分析结果失败: {result_id}")
             else:
                 logging.info(f"成功更新分析结果: {result_id}")
+            analysis_events.publish(result_id, 'completed', {'progress': 100, 'sections': result['analysisSections']})
             
         except Exception as api_error:
             logging.error(f"DeepSeek API调用失败: {str(api_error)}")
@@ -378,6 +840,7 @@ def process_deepseek_analysis(result_id, result):
             result['analysisMessage'] = f"DeepSeek API调用失败: {str(api_error)}"
             result['analysisProgress'] = 0
             BaziResultModel.update(result_id, result)
+            analysis_events.publish(result_id, 'failed', {'message': result['analysisMessage']})
         
     except Exception as e:
         logging.error(f"处理DeepSeek分析时出错: {str(e)}")
@@ -388,6 +851,7 @@ def process_deepseek_analysis(result_id, result):
             result['analysisMessage'] = f"处理失败: {str(e)}"
             result['analysisProgress'] = 0
             BaziResultModel.update(result_id, result)
+            analysis_events.publish(result_id, 'failed', {'message': result['analysisMessage']})
         except:
             pass
     finally:
@@ -631,14 +1095,9 @@ def async_generate_followup(result_id, area, birth_date=None, birth_time=None, g
         gender_text = "男性" if gender == "male" else "女性"
         
         # 计算年龄
-        if birth_date:
-            try:
-                birth_year = int(birth_date.split('-')[0])
-                current_year = datetime.now().year
-                age = current_year - birth_year
-            except:
-                age = None
-        else:
+        try:
+            age = datetime.now().year - parse_birth_datetime(birth_date, require_time=False).year
+        except BirthDateTimeError:
             age = None
         
         # 根据年龄确定分析类型
@@ -700,6 +1159,9 @@ def async_generate_followup(result_id, area, birth_date=None, birth_time=None, g
         火: {bazi_chart.get('fiveElements', {}).get('fire', 0)}
         土: {bazi_chart.get('fiveElements', {}).get('earth', 0)}
         
+        【五行强弱】（含藏干，按月令旺相休囚死加权）
+        {format_five_element_strength(bazi_chart)}
+        
         【神煞信息】
         日冲: {bazi_chart.get('shenSha', {}).get('dayChong', '无')}
         值神: {bazi_chart.get('shenSha', {}).get('zhiShen', '无')}
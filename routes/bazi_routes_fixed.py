@@ -6,7 +6,7 @@ import time
 import json
 import requests
 from datetime import datetime
-from utils.bazi_calculator import calculate_bazi as calculate_bazi_util
+from utils.chart_pool import calculate_bazi as calculate_bazi_util
 from models.bazi_result_model import BaziResultModel
 from models.order_model import OrderModel
 
@@ -32,8 +32,8 @@ def calculate_bazi(birth_date, birth_time, gender):
         包含八字信息的字典
     """
     try:
-        # 使用八字计算工具
-        bazi_data = calculate_bazi_util(birth_date, birth_time, gender)
+        # 与其他路由共用同一个排盘入口（启用进程池时在进程池中计算）
+        bazi_data = calculate_bazi_util(f"{birth_date} {birth_time}", gender)
         return bazi_data
     except Exception as e:
         logging.error(f"计算八字出错: {str(e)}")
@@ -6,7 +6,8 @@ import time
 import json
 import requests
 from datetime import datetime
-from utils.bazi_calculator import calculate_bazi as calculate_bazi_util
+from utils.chart_pool import calculate_bazi as calculate_bazi_util
+from utils.birth_datetime import BirthDateTimeError, parse_birth_datetime
 from models.bazi_result_model import BaziResultModel
 from models.order_model import OrderModel
 import traceback
@@ -34,8 +35,8 @@ def calculate_bazi(birth_date, birth_time, gender):
         包含八字信息的字典
     """
     try:
-        # 使用八字计算工具
-        bazi_data = calculate_bazi_util(birth_date, birth_time, gender)
+        # 使用八字计算工具（启用进程池时在进程池中计算）
+        bazi_data = calculate_bazi_util(f"{birth_date} {birth_time}", gender)
         return bazi_data
     except Exception as e:
         logging.error(f"计算八字出错: {str(e)}")
@@ -73,9 +74,7 @@ def generate_ai_analysis(bazi_chart, focus_areas, gender, birth_date=None, birth
         gender_text = "男性" if gender == "male" else "女性"
         
         # 计算年龄
-        birth_year = int(birth_date.split('-')[0])
-        current_year = datetime.now().year
-        age = current_year - birth_year
+        age = datetime.now().year - parse_birth_datetime(birth_date, require_time=False).year
         
         # 根据年龄确定分析类型
         age_category = "成人"
@@ -510,13 +509,12 @@ def analyze_bazi():
         # 保存原始日期格式，用于显示
         original_birth_date = birth_date
         
-        # 确保日期格式正确
-        if '/' in birth_date:
-            # 将格式从YYYY/MM/DD转换为YYYY-MM-DD
-            parts = birth_date.split('/')
-            if len(parts) == 3:
-                birth_date = f"{parts[0]}-{parts[1].zfill(2)}-{parts[2].zfill(2)}"
-                logging.info(f"日期格式已转换: {birth_date}")
+        # 解析出生日期时间，日期统一为YYYY-MM-DD格式
+        try:
+            birth = parse_birth_datetime(birth_date, birth_time)
+        except BirthDateTimeError as e:
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
+        birth_date = birth.date_text
         
         # 可选参数
         name = data.get('name', '匿名用户')
@@ -552,9 +550,9 @@ def analyze_bazi():
                 'livingPlace': living_place
             },
             'basicInfo': {
-                'solarYear': birth_date.split('-')[0],
-                'solarMonth': birth_date.split('-')[1],
-                'solarDay': birth_date.split('-')[2],
+                'solarYear': str(birth.year),
+                'solarMonth': f"{birth.month:02d}",
+                'solarDay': f"{birth.day:02d}",
                 'solarHour': birth_time,
                 'gender': gender,
                 'birthPlace': birth_place,
@@ -830,6 +828,11 @@ def calculate_bazi_api():
         
         if not birth_time:
             birth_time = "12:00"  # 默认中午
+        
+        try:
+            parse_birth_datetime(birth_date, birth_time)
+        except BirthDateTimeError as e:
+            return jsonify(code=400, message=str(e), error=e.to_dict()), 400
             
         # 调用计算函数
         bazi_data = calculate_bazi(birth_date, birth_time, gender)
@@ -924,14 +927,9 @@ def followup_analysis(result_id):
         gender_text = "男性" if gender == "male" else "女性"
         
         # 计算年龄
-        if birth_date:
-            try:
-                birth_year = int(birth_date.split('-')[0])
-                current_year = datetime.now().year
-                age = current_year - birth_year
-            except:
-                age = None
-        else:
+        try:
+            age = datetime.now().year - parse_birth_datetime(birth_date, require_time=False).year
+        except BirthDateTimeError:
             age = None
         
         # 根据年龄确定分析类型
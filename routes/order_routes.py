@@ -11,7 +11,11 @@ import traceback
 import time
 import logging
 from utils.bazi_calculator import calculate_bazi
-from utils.ai_service import analyze_bazi_with_ai, extract_analysis_from_text, generate_bazi_analysis, generate_followup_analysis
+from utils.birth_datetime import parse_birth_datetime
+from utils import analysis_events
+from utils.ai_service import (
+    ANALYSIS_SECTIONS, analyze_bazi_with_ai, extract_analysis_from_text, generate_bazi_analysis, generate_followup_analysis
+)
 import threading
 from pymongo import MongoClient
 from utils.wechat_pay_v3 import wechat_pay_v3
@@ -189,9 +193,10 @@ def wechat_notify():
                             from routes.bazi_routes_fixed_new import calculate_bazi, generate_ai_analysis
                             
                             # 计算八字
+                            birth = parse_birth_datetime(bazi_result['birthTime'])
                             bazi_chart = calculate_bazi(
-                                bazi_result['birthTime'].split(' ')[0],
-                                bazi_result['birthTime'].split(' ')[1],
+                                birth.date_text,
+                                birth.time_text,
                                 bazi_result['gender']
                             )
                             
@@ -269,8 +274,10 @@ def alipay_notify():
                     from routes.bazi_routes_fixed_new import calculate_bazi, generate_ai_analysis
                     
                     # 计算八字
+                    birth = parse_birth_datetime(bazi_result['birthTime'])
                     bazi_chart = calculate_bazi(
-                        bazi_result['birthTime'],
+                        birth.date_text,
+                        birth.time_text,
                         bazi_result['gender']
                     )
                     
@@ -377,15 +384,27 @@ def async_generate_analysis(result_id, bazi_chart, gender):
     """
     try:
         logging.info(f"开始异步生成八字分析: {result_id}")
-        # 生成AI分析
-        ai_analysis = generate_bazi_analysis(bazi_chart, gender)
+        # 流式生成时每个部分完成就先写入，全部完成后再整体更新
+        BaziResultModel.update_field(result_id, 'analysisSections',
+                                     {key: 'pending' for key, _, _ in ANALYSIS_SECTIONS})
+        analysis_events.publish(result_id, 'progress', {'progress': 0})
+        
+        def save_section(key, content):
+            BaziResultModel.update_analysis_section(result_id, key, content)
+            analysis_events.publish(result_id, 'section', {'section': key, 'content': content})
+        
+        ai_analysis = generate_bazi_analysis(bazi_chart, gender, on_section=save_section)
         
         # 更新AI分析结果
-        BaziResultModel.update_ai_analysis(result_id, ai_analysis)
+        sections_status = {key: 'completed' if ai_analysis and ai_analysis.get(key) else 'failed'
+                           for key, _, _ in ANALYSIS_SECTIONS}
+        BaziResultModel.update_ai_analysis(result_id, ai_analysis, sections_status)
+        analysis_events.publish(result_id, 'completed', {'progress': 100})
         logging.info(f"八字分析异步生成完成: {result_id}")
     except Exception as e:
         logging.error(f"异步生成八字分析失败: {str(e)}")
         logging.error(traceback.format_exc())
+        analysis_events.publish(result_id, 'failed', {'message': str(e)})
 
 # 异步生成追问分析
 def async_generate_followup(result_id, area, birth_date=None, birth_time=None, gender=None):
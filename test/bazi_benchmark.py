@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+排盘回归与性能基准
+
+用固定种子生成一份出生时间语料（默认 20000 条，1901-2099 年，分钟精度，男女各半），
+逐条调用 calculate_bazi：
+
+1. 回归：把每条结果规范化（去掉随当前年份变化的 flowingYears，按键排序序列化）后取摘要，
+   与 test/data/bazi_golden.json.gz 中保存的摘要逐条比对，列出不一致的记录；
+2. 性能：统计每秒排盘数、单条耗时 p50/p99，并在抽样记录上用 tracemalloc 统计单条排盘的
+   内存分配峰值和调用后仍占用的内存块数。
+
+整个流程离线运行，一条命令：
+
+    python test/bazi_benchmark.py                  # 比对 + 基准
+    python test/bazi_benchmark.py --update-golden  # 有意修改排盘结果后重新生成基准数据
+    python test/bazi_benchmark.py --engine lunar   # 用 lunar_python 参考引擎比对和计时
+
+比对失败时退出码为 1。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import chart_cache
+from utils.bazi_calculator import calculate_bazi
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bazi_golden.json.gz')
+GOLDEN_VERSION = 1
+CORPUS_SEED = 20240701
+CORPUS_SIZE = 20000
+# 统计内存分配的抽样条数（tracemalloc 会显著拖慢排盘，不参与耗时统计）
+ALLOCATION_SAMPLE = 1000
+
+
+def generate_corpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    """
+    生成确定的出生时间语料
+
+    Returns:
+        list: (出生时间 "YYYY-MM-DD HH:MM", 性别) 列表
+    """
+    rng = random.Random(seed)
+    first, last = date(1901, 1, 1).toordinal(), date(2099, 12, 31).toordinal()
+    corpus = []
+    for i in range(size):
+        day = date.fromordinal(rng.randrange(first, last + 1)).isoformat()
+        corpus.append((f"{day} {rng.randrange(24):02d}:{rng.randrange(60):02d}", "male" if i % 2 == 0 else "female"))
+    return corpus
+
+
+def chart_digest(result):
+    """
+    排盘结果的摘要，不含随当前年份变化的流年窗口
+
+    Returns:
+        tuple: (四柱字符串, 摘要)
+    """
+    canonical = {key: value for key, value in result.items() if key != "flowingYears"}
+    payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    pillars = "".join(result[f"{name}Pillar"]["heavenlyStem"] + result[f"{name}Pillar"]["earthlyBranch"]
+                      for name in ("year", "month", "day", "hour"))
+    return pillars, hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_golden(path=GOLDEN_FILE):
+    """读取基准数据，返回 {"version", "entries": [[出生时间, 性别, 四柱, 摘要], ...]}"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_golden(entries, path=GOLDEN_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 使相同内容生成完全相同的文件
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+        f.write(json.dumps({"version": GOLDEN_VERSION, "entries": entries},
+                           ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def verify(entries, engine=None):
+    """
+    逐条重新排盘并与基准比对
+
+    Returns:
+        list: 不一致的记录 (出生时间, 性别, 基准四柱, 当前四柱)
+    """
+    mismatches = []
+    for birth_datetime, gender, pillars, digest in entries:
+        current_pillars, current_digest = chart_digest(calculate_bazi(birth_datetime, gender, engine=engine))
+        if current_digest != digest:
+            mismatches.append((birth_datetime, gender, pillars, current_pillars))
+    return mismatches
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def benchmark(corpus, allocation_sample=ALLOCATION_SAMPLE, engine=None):
+    """
+    排盘性能基准（清空命盘缓存后逐条计算，语料中的命盘基本互不相同）
+
+    Returns:
+        dict: charts、seconds、chartsPerSecond、p50Ms、p99Ms、peakBytesPerChart、retainedBlocksPerChart
+    """
+    chart_cache.clear_cache()
+    latencies = []
+    started = time.perf_counter()
+    for birth_datetime, gender in corpus:
+        begin = time.perf_counter_ns()
+        calculate_bazi(birth_datetime, gender, engine=engine)
+        latencies.append(time.perf_counter_ns() - begin)
+    seconds = time.perf_counter() - started
+    latencies.sort()
+
+    # 内存分配：每条排盘前重置峰值，峰值减去起点即为这一条排盘过程中的最大新增占用
+    chart_cache.clear_cache()
+    sample = corpus[:allocation_sample]
+    peaks = []
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for birth_datetime, gender in sample:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        calculate_bazi(birth_datetime, gender, engine=engine)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    return {
+        "charts": len(corpus),
+        "seconds": round(seconds, 3),
+        "chartsPerSecond": round(len(corpus) / seconds, 1),
+        "p50Ms": round(_percentile(latencies, 0.5) / 1e6, 3),
+        "p99Ms": round(_percentile(latencies, 0.99) / 1e6, 3),
+        "peakBytesPerChart": round(sum(peaks) / len(peaks)) if peaks else 0,
+        # 包含进程内命盘缓存和各级查表缓存的增长
+        "retainedBlocksPerChart": round((blocks_after - blocks_before) / len(sample), 1) if sample else 0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排盘回归与性能基准")
+    parser.add_argument("--size", type=int, default=CORPUS_SIZE, help="语料条数（比对时不能超过基准数据条数）")
+    parser.add_argument("--update-golden", action="store_true", help="用当前排盘结果重新生成基准数据")
+    parser.add_argument("--skip-verify", action="store_true", help="只跑性能基准")
+    parser.add_argument("--skip-benchmark", action="store_true", help="只做回归比对")
+    parser.add_argument("--engine", help="排盘引擎（默认取 BAZI_ENGINE）")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.size)
+    if args.update_golden:
+        entries = [[birth_datetime, gender, *chart_digest(calculate_bazi(birth_datetime, gender))]
+                   for birth_datetime, gender in corpus]
+        save_golden(entries)
+        print(f"已生成基准数据: {GOLDEN_FILE}（{len(entries)} 条）")
+        return 0
+
+    status = 0
+    if not args.skip_verify:
+        golden = load_golden()
+        entries = golden["entries"][:args.size]
+        started = time.perf_counter()
+        mismatches = verify(entries, args.engine)
+        print(f"回归比对: {len(entries)} 条，不一致 {len(mismatches)} 条，"
+              f"耗时 {time.perf_counter() - started:.2f} 秒")
+        for birth_datetime, gender, expected, actual in mismatches[:20]:
+            print(f"  {birth_datetime} {gender}: 基准 {expected}，当前 {actual}")
+        if mismatches:
+            status = 1
+
+    if not args.skip_benchmark:
+        stats = benchmark(corpus, engine=args.engine)
+        print(f"性能基准: {stats['charts']} 条，{stats['seconds']} 秒，{stats['chartsPerSecond']} 条/秒")
+        print(f"  单条耗时 p50 {stats['p50Ms']} ms，p99 {stats['p99Ms']} ms")
+        print(f"  单条内存分配峰值 {stats['peakBytesPerChart']} 字节，"
+              f"调用后新增内存块 {stats['retainedBlocksPerChart']} 个")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,7 +8,29 @@ import datetime
 # 添加项目根目录到路径，以便导入模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.bazi_calculator import get_bazi, format_bazi_analysis
+from utils.bazi_calculator import calculate_bazi
+
+PILLAR_NAMES = (("yearPillar", "年柱"), ("monthPillar", "月柱"), ("dayPillar", "日柱"), ("hourPillar", "时柱"))
+
+def get_bazi(year, month, day, hour, gender):
+    """按年月日时排盘，gender 为 '男' 或 '女'"""
+    return calculate_bazi(f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:00",
+                          'male' if gender == '男' else 'female')
+
+def format_bazi_analysis(bazi_data):
+    """把排盘结果整理成适合放进 AI 提示词的几行文本"""
+    bazi = " ".join(bazi_data[key]["heavenlyStem"] + bazi_data[key]["earthlyBranch"] for key, _ in PILLAR_NAMES)
+    shen_sha = "\n".join(
+        f"{position}: {', '.join(values) if isinstance(values, list) else values}"
+        for position, values in bazi_data["shenSha"].items() if values
+    )
+    qi_yun = bazi_data["daYun"].get("qiYun")
+    if qi_yun:
+        qi_yun_text = (f"{qi_yun['years']}年{qi_yun['months']}个月{qi_yun['days']}天起运"
+                       f"（{qi_yun['jieQi']} {qi_yun['jieQiTime']}）")
+    else:
+        qi_yun_text = f"{bazi_data['daYun']['startAge']}岁起运"
+    return {"bazi": bazi, "shen_sha": shen_sha, "qi_yun": qi_yun_text}
 
 def print_header(text):
     """打印格式化的标题"""
@@ -22,33 +44,41 @@ def print_subheader(text):
     print(f" {text} ".center(38, "-"))
     print("-" * 40)
 
-def print_bazi_chart(bazi):
+def print_bazi_chart(bazi_data):
     """打印漂亮的八字排盘"""
     try:
-        year = bazi['year']
-        month = bazi['month']
-        day = bazi['day']
-        time = bazi['time']
+        year, month, day, time = (bazi_data[key] for key, _ in PILLAR_NAMES)
         
         print("\n┌─────┬─────┬─────┬─────┐")
         print(f"│ 年柱 │ 月柱 │ 日柱 │ 时柱 │")
         print("├─────┼─────┼─────┼─────┤")
-        print(f"│ {year[0]} {year[1]} │ {month[0]} {month[1]} │ {day[0]} {day[1]} │ {time[0]} {time[1]} │")
+        print(f"│ {year['heavenlyStem']} {year['earthlyBranch']} │ {month['heavenlyStem']} {month['earthlyBranch']} │ "
+              f"{day['heavenlyStem']} {day['earthlyBranch']} │ {time['heavenlyStem']} {time['earthlyBranch']} │")
         print("└─────┴─────┴─────┴─────┘")
     except Exception as e:
         print(f"打印八字图表时出错: {e}")
-        print(f"原始八字数据: {bazi}")
+        print(f"原始八字数据: {bazi_data}")
+
+def print_qi_yun(bazi_data):
+    """打印起运信息"""
+    da_yun = bazi_data['daYun']
+    print(f"\n起运年龄: {da_yun['startAge']}岁")
+    print(f"起运年份: {da_yun['startYear']}年")
+    qi_yun = da_yun.get('qiYun')
+    if qi_yun:
+        print(f"精确起运: {qi_yun['years']}年{qi_yun['months']}个月{qi_yun['days']}天{qi_yun['hours']}小时"
+              f"（{qi_yun['jieQi']} {qi_yun['jieQiTime']}）")
 
 def show_analysis_results(bazi_data):
     """显示八字分析结果"""
     # 打印八字
     print_subheader("八字排盘")
-    print_bazi_chart(bazi_data['bazi'])
+    print_bazi_chart(bazi_data)
     
     # 打印神煞
     print_subheader("神煞信息")
-    if bazi_data['shen_sha']:
-        for position, values in bazi_data['shen_sha'].items():
+    if bazi_data['shenSha']:
+        for position, values in bazi_data['shenSha'].items():
             values_str = ', '.join(values) if isinstance(values, list) else values
             print(f"{position}: {values_str}")
     else:
@@ -56,17 +86,16 @@ def show_analysis_results(bazi_data):
     
     # 打印大运
     print_subheader("大运信息")
-    qi_yun = bazi_data['da_yun']['qi_yun']
-    print(f"起运年龄: {qi_yun['years']}岁")
-    print(f"起运日期: {qi_yun['date']}")
+    print_qi_yun(bazi_data)
     
     # 显示大运列表
     print_subheader("大运列表")
     print("┌───────┬───────┬───────┬───────┬───────┬───────┐")
-    print("│ 大运  │ 年龄  │ 开始  │ 结束  │ 十神  │ 旺衰  │")
+    print("│ 大运  │ 年龄  │ 开始  │ 结束  │ 纳音  │ 吉凶  │")
     print("├───────┼───────┼───────┼───────┼───────┼───────┤")
-    for yun in bazi_data['da_yun']['da_yun_list'][:8]:  # 显示8个大运
-        print(f"│ {yun['da_yun']} │ {yun['start_age']}-{yun['end_age']}岁 │ {yun['start_year']}年 │ {yun['end_year']}年 │ {yun['shi_shen']} │ {yun['chang_sheng']} │")
+    for yun in bazi_data['daYun']['daYunList'][:8]:  # 显示8个大运
+        print(f"│ {yun['heavenlyStem']}{yun['earthlyBranch']} │ {yun['startAge']}-{yun['endAge']}岁 │ "
+              f"{yun['startYear']}年 │ {yun['endYear']}年 │ {yun['naYin']} │ {yun['jiXiong']} │")
     print("└───────┴───────┴───────┴───────┴───────┴───────┘")
     
     # 格式化输出
@@ -146,17 +175,15 @@ def test_predefined_dates():
         )
         
         # 打印八字排盘
-        print_bazi_chart(bazi_data['bazi'])
+        print_bazi_chart(bazi_data)
         
         # 打印起运信息
-        qi_yun = bazi_data['da_yun']['qi_yun']
-        print(f"\n起运年龄: {qi_yun['years']}岁")
-        print(f"起运日期: {qi_yun['date']}")
+        print_qi_yun(bazi_data)
         
         # 打印神煞
-        if bazi_data['shen_sha']:
+        if bazi_data['shenSha']:
             print("\n神煞信息:")
-            for position, values in bazi_data['shen_sha'].items():
+            for position, values in bazi_data['shenSha'].items():
                 values_str = ', '.join(values) if isinstance(values, list) else values
                 print(f"  {position}: {values_str}")
 
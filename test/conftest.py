@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+import pytest
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import analysis_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_analysis_cache():
+    """各测试伪造的大模型回答不同，不能复用其他测试缓存的回答"""
+    analysis_cache.clear_cache()
+    yield
+    analysis_cache.clear_cache()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_service, analysis_cache, llm_client
+from utils.bazi_calculator import calculate_bazi
+
+
+def test_make_key():
+    key = analysis_cache.make_key("1990:123:7+:男:adult", "full", 1, year=2025)
+    assert key == analysis_cache.make_key("1990:123:7+:男:adult", "full", 1, year=2025)
+    assert key != analysis_cache.make_key("1990:123:7+:男:adult", "health", 1, year=2025)
+    assert key != analysis_cache.make_key("1990:123:7+:男:adult", "full", 2, year=2025)
+    assert key != analysis_cache.make_key("1990:123:7+:男:adult", "full", 1, year=2026)
+    assert key != analysis_cache.make_key("1990:123:7+:男:adult", "full", 1, year=2025, max_tokens=800)
+
+
+def test_fingerprint_ignores_birth_minute_and_date_text():
+    chart = calculate_bazi("1990-05-15 08:30", "male")
+    same_shichen = dict(calculate_bazi("1990-05-15 08:50", "male"), birthDate="1990-05-15", birthTime="08:50")
+    fingerprint = ai_service.analysis_fingerprint(chart, "男")
+    assert fingerprint == ai_service.analysis_fingerprint(same_shichen, "男")
+    assert fingerprint.startswith("1990:") and fingerprint.endswith(":男:adult")
+    assert fingerprint != ai_service.analysis_fingerprint(chart, "女")
+    assert ai_service.analysis_fingerprint({"yearPillar": {}}, "男") is None
+
+    # 提示词由指纹决定：不含具体出生日期、时间，年龄按今年计算
+    prompt = ai_service.format_analysis_prompt(same_shichen, "男", "")
+    assert prompt == ai_service.format_analysis_prompt(chart, "男", "")
+    assert "1990-05-15" not in prompt and "08:50" not in prompt
+    assert f"当前年龄：{datetime.now().year - 1990}岁" in prompt
+
+
+def test_age_bracket():
+    assert [ai_service.age_bracket(age) for age in (-1, 0, 5, 6, 17, 18, 80)] == \
+        ["unborn", "infant", "infant", "minor", "minor", "adult", "adult"]
+
+
+def test_hit_and_failure_not_cached():
+    calls = []
+    compute = lambda: calls.append(1) or "回答"
+    assert analysis_cache.get_or_compute("k1", compute) == "回答"
+    assert analysis_cache.get_or_compute("k1", compute) == "回答"
+    assert len(calls) == 1
+
+    assert analysis_cache.get_or_compute("k2", lambda: None) is None
+    assert analysis_cache.get_or_compute("k2", compute) == "回答"
+    stats = analysis_cache.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 3, 2)
+
+
+def test_lru_and_ttl(monkeypatch):
+    monkeypatch.setattr(analysis_cache, "ANALYSIS_CACHE_SIZE", 2)
+    for key in ("a", "b", "c"):
+        analysis_cache.get_or_compute(key, lambda: key)
+    assert analysis_cache.get_cache_stats()["size"] == 2
+    assert analysis_cache.get_or_compute("a", lambda: "重新生成") == "重新生成"
+
+    monkeypatch.setattr(analysis_cache, "ANALYSIS_CACHE_TTL", 0)
+    analysis_cache.get_or_compute("d", lambda: "旧")
+    assert analysis_cache.get_or_compute("d", lambda: "新") == "新"
+
+
+def test_single_flight():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "回答"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(analysis_cache.get_or_compute("same", compute)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["回答"] * 5
+    assert len(calls) == 1
+    assert analysis_cache.get_cache_stats()["shared"] == 4
+
+
+def test_single_flight_error_reaches_waiters():
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        time.sleep(0.1)
+        raise llm_client.LLMError("上游错误")
+
+    errors = []
+
+    def run():
+        try:
+            analysis_cache.get_or_compute("broken", compute)
+        except llm_client.LLMError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=run)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ["上游错误", "上游错误"]
+    # 失败后下一次请求重新调用
+    assert analysis_cache.get_or_compute("broken", lambda: "恢复") == "恢复"
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return doc if doc and doc["expireAt"] > query["expireAt"]["$gt"] else None
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = doc
+
+
+def test_mongo_shared_cache(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(analysis_cache, "ANALYSIS_CACHE_MONGO", True)
+    monkeypatch.setattr(analysis_cache, "_collection", collection)
+    analysis_cache.get_or_compute("shared-key", lambda: "回答")
+    assert collection.docs["shared-key"]["response"] == "回答"
+
+    # 另一个进程（清空进程内缓存）从 MongoDB 取到
+    analysis_cache.clear_cache()
+    assert analysis_cache.get_or_compute("shared-key", lambda: pytest.fail("不应调用大模型")) == "回答"
+    assert analysis_cache.get_cache_stats()["mongoHits"] == 1
+
+
+def test_generate_analysis_reuses_response(monkeypatch):
+    prompts = []
+
+    def fake_api(prompt):
+        prompts.append(prompt)
+        return "### 子女情况\n子女缘分较好。"
+
+    monkeypatch.setattr(ai_service, "call_deepseek_api", fake_api)
+    chart = calculate_bazi("1990-05-15 08:30", "male")
+    first = ai_service.generate_bazi_analysis(chart, "male", ["children"])
+    # 同一时辰不同分钟出生、带出生日期的命盘共用回答
+    second = ai_service.generate_bazi_analysis(
+        dict(calculate_bazi("1990-05-15 08:50", "male"), birthDate="1990-05-15"), "male", ["children"])
+    assert first == second
+    assert len(prompts) == 1
+    # 分析范围、性别不同不复用
+    ai_service.generate_bazi_analysis(chart, "male", ["children", "health"])
+    ai_service.generate_bazi_analysis(calculate_bazi("1990-05-15 08:30", "female"), "female", ["children"])
+    assert len(prompts) == 3
+
+
+def test_streaming_replays_cached_sections(monkeypatch):
+    monkeypatch.setattr(ai_service, "DEEPSEEK_STREAM", True)
+    streams = []
+
+    def fake_stream(prompt, on_section):
+        streams.append(prompt)
+        on_section("children", "子女缘分较好。")
+        on_section("lifePlan", "稳步发展。")
+        return "### 子女情况\n子女缘分较好。\n### 人生规划建议\n稳步发展。"
+
+    monkeypatch.setattr(ai_service, "stream_deepseek_api", fake_stream)
+    chart = calculate_bazi("1990-05-15 08:30", "male")
+    received = [{}, {}]
+    for saved in received:
+        ai_service.generate_bazi_analysis(chart, "male", ["children", "lifePlan"], on_section=saved.__setitem__)
+    assert len(streams) == 1
+    assert received[0] == received[1] == {"children": "子女缘分较好。", "lifePlan": "稳步发展。"}
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import threading
+import time
+
+import pytest
+from pymongo.errors import PyMongoError
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import analysis_events
+
+
+def test_publish_and_resume_after_id():
+    analysis_events.publish("ev-1", "progress", {"progress": 10})
+    analysis_events.publish("ev-1", "section", {"section": "coreAnalysis", "content": "日主庚金"})
+
+    events, done = analysis_events.wait_events("ev-1")
+    assert [event["event"] for event in events] == ["progress", "section"]
+    assert [event["id"] for event in events] == [1, 2]
+    assert not done
+
+    # 断线重连时只补发之后的事件
+    events, done = analysis_events.wait_events("ev-1", after_id=1)
+    assert [event["data"].get("section") for event in events] == ["coreAnalysis"]
+    assert analysis_events.wait_events("ev-1", after_id=2) == ([], False)
+
+
+def test_wait_blocks_until_publish():
+    analysis_events.publish("ev-2", "progress", {"progress": 20})
+    timer = threading.Timer(0.1, analysis_events.publish, ("ev-2", "completed", {"progress": 100}))
+    started = time.monotonic()
+    timer.start()
+    events, done = analysis_events.wait_events("ev-2", after_id=1, timeout=5)
+    assert time.monotonic() - started < 2
+    assert [event["event"] for event in events] == ["completed"]
+    assert done
+
+
+def test_wait_for_channel_not_yet_created():
+    timer = threading.Timer(0.1, analysis_events.publish, ("ev-3", "progress", {"progress": 10}))
+    timer.start()
+    events, done = analysis_events.wait_events("ev-3", timeout=5)
+    assert [event["event"] for event in events] == ["progress"]
+    assert analysis_events.wait_events("ev-unknown", timeout=0.05) == ([], False)
+
+
+def test_new_analysis_starts_new_channel():
+    analysis_events.publish("ev-4", "progress", {"progress": 10})
+    analysis_events.publish("ev-4", "failed", {"message": "超时"})
+    assert analysis_events.wait_events("ev-4", after_id=2) == ([], True)
+
+    # 重新分析时 id 从头开始，持有旧 id 的连接收到新频道的全部事件
+    analysis_events.publish("ev-4", "progress", {"progress": 10})
+    events, done = analysis_events.wait_events("ev-4", after_id=2)
+    assert [(event["id"], event["event"]) for event in events] == [(1, "progress")]
+    assert not done
+
+
+def test_diff_status():
+    before = {"analysisStatus": "analyzing", "analysisProgress": 20,
+              "analysisSections": {"coreAnalysis": "pending", "health": "pending"}}
+    after = {"analysisStatus": "analyzing", "analysisProgress": 55,
+             "analysisSections": {"coreAnalysis": "completed", "health": "pending"},
+             "aiAnalysis": {"coreAnalysis": "日主庚金"}}
+    assert analysis_events.diff_status(before, after) == [
+        ("section", {"section": "coreAnalysis", "content": "日主庚金", "progress": 55})]
+
+    finished = dict(after, analysisStatus="completed", analysisProgress=100,
+                    analysisSections={"coreAnalysis": "completed", "health": "completed"},
+                    aiAnalysis={"coreAnalysis": "日主庚金", "health": "注意肺"})
+    events = analysis_events.diff_status(after, finished)
+    assert [event for event, _ in events] == ["section", "completed"]
+    assert analysis_events.diff_status(finished, finished) == []
+
+
+class StandaloneCollection:
+    """单机 MongoDB：不支持 change stream"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.finds = 0
+
+    def watch(self, *args, **kwargs):
+        raise PyMongoError("The $changeStream stage is only supported on replica sets")
+
+    def find_one(self, query, projection):
+        self.finds += 1
+        return self.documents.pop(0) if len(self.documents) > 1 else self.documents[0]
+
+
+def test_watcher_falls_back_to_polling(monkeypatch):
+    monkeypatch.setattr(analysis_events, "ANALYSIS_EVENTS_POLL_INTERVAL", 0.01)
+    collection = StandaloneCollection([{"analysisProgress": 20}, {"analysisProgress": 40}])
+    watcher = analysis_events.DocumentWatcher(collection, {"_id": "RES1"})
+    assert watcher.wait_change(1) == {"analysisProgress": 20}
+    assert watcher.wait_change(1) == {"analysisProgress": 40}
+    assert collection.finds == 2
+    watcher.close()
+
+
+class ChangeStream:
+    def __init__(self, changes):
+        self.changes = changes
+        self.closed = False
+
+    def try_next(self):
+        return self.changes.pop(0) if self.changes else None
+
+    def close(self):
+        self.closed = True
+
+
+class ReplicaSetCollection:
+    def __init__(self, changes):
+        self.stream = ChangeStream(changes)
+
+    def watch(self, pipeline, **kwargs):
+        assert pipeline[0]["$match"]["documentKey._id"] == "RES1"
+        return self.stream
+
+    def find_one(self, query, projection):
+        raise AssertionError("使用 change stream 时不应查询")
+
+
+def test_watcher_uses_change_stream():
+    collection = ReplicaSetCollection([None, {"fullDocument": {"analysisProgress": 60, "other": 1}}])
+    watcher = analysis_events.DocumentWatcher(collection, {"_id": "RES1"})
+    change = watcher.wait_change(1)
+    assert change["analysisProgress"] == 60
+    assert "other" not in change
+    assert watcher.wait_change(0.05) is None
+    watcher.close()
+    assert collection.stream.closed
+
+
+class RecordingWatcher:
+    waits = []
+
+    def __init__(self, collection, query):
+        self.query = query
+
+    def wait_change(self, timeout):
+        RecordingWatcher.waits.append(timeout)
+        return {"analysisStatus": "analyzing", "analysisProgress": 40}
+
+    def close(self):
+        pass
+
+
+def test_poll_without_local_channel_watches_document(monkeypatch):
+    """分析在其他进程中进行时，长轮询直接等待数据库记录变化，不先空等本进程的事件"""
+    from flask import Flask
+    from routes import bazi_routes
+
+    monkeypatch.setattr(bazi_routes.BaziResultModel, "find_analysis_status",
+                        staticmethod(lambda result_id, projection: {"_id": "RES-other", "analysisProgress": 20}))
+    monkeypatch.setattr(analysis_events, "DocumentWatcher", RecordingWatcher)
+    monkeypatch.setattr(analysis_events, "wait_events",
+                        lambda *args, **kwargs: pytest.fail("没有本进程频道时不应等待事件"))
+    RecordingWatcher.waits = []
+    app = Flask(__name__)
+    app.register_blueprint(bazi_routes.bazi_bp, url_prefix='/api/bazi')
+
+    response = app.test_client().get('/api/bazi/events/RES-other?mode=poll&timeout=5')
+    data = response.get_json()["data"]
+    assert RecordingWatcher.waits == [5.0]
+    assert data["events"] == [] and not data["done"]
+    assert data["snapshot"]["analysisProgress"] == 40
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_service
+from utils.bazi_calculator import calculate_bazi
+
+CHART = calculate_bazi("1990-05-15 08:30", "male")
+TITLES = {title: key for key, title, _ in ai_service.ANALYSIS_SECTIONS}
+
+
+def requested_title(prompt):
+    """单部分提示词中要求返回的标题"""
+    return prompt.rsplit("### ", 1)[1].split("\n", 1)[0].strip()
+
+
+def test_section_request_asks_for_one_section():
+    request = ai_service.format_section_request("health")
+    assert "### 身体健康" in request
+    assert request.count("###") == 1
+    prompt = ai_service.format_analysis_prompt(CHART, "男", request)
+    assert "年柱：" in prompt and prompt.rstrip().endswith("[分析内容]")
+
+
+def test_extract_section():
+    assert ai_service._extract_section("health", "### 身体健康\n[注意**肺**部。]\n") == "注意肺部。"
+    # 标题与要求不同但只有一个部分
+    assert ai_service._extract_section("health", "### 健康分析\n注意肺部。") == "注意肺部。"
+    # 没有标题时整段作为该部分
+    assert ai_service._extract_section("health", "注意肺部。") == "注意肺部。"
+
+
+def test_sections_generated_concurrently(monkeypatch):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    tokens = []
+
+    def fake_call(prompt, max_tokens=1500):
+        tokens.append(max_tokens)
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        title = requested_title(prompt)
+        if TITLES[title] == "children":
+            return None
+        return f"### {title}\n{title}的分析"
+
+    monkeypatch.setattr(ai_service, "call_deepseek_api", fake_call)
+    monkeypatch.setattr(ai_service, "ANALYSIS_PARALLEL_WORKERS", 13)
+    callbacks = []
+    started = time.monotonic()
+    analysis, status = ai_service.generate_analysis_sections(
+        CHART, "男", on_section=lambda key, content: callbacks.append((key, threading.current_thread())))
+    elapsed = time.monotonic() - started
+
+    # 13 个部分并发，总耗时接近单个部分而不是总和
+    assert elapsed < 13 * 0.1 / 2
+    assert peak[0] > 1
+    assert set(tokens) == {ai_service.ANALYSIS_SECTION_MAX_TOKENS}
+    assert list(status) == [key for key, _, _ in ai_service.ANALYSIS_SECTIONS]
+    assert status["children"] == "failed"
+    assert [key for key, value in status.items() if value == "completed"] == list(analysis)
+    assert analysis["health"] == "身体健康的分析"
+    # 回调在调用线程中依次执行
+    assert sorted(key for key, _ in callbacks) == sorted(analysis)
+    assert {thread for _, thread in callbacks} == {threading.current_thread()}
+
+
+def test_generate_bazi_analysis_parallel_mode(monkeypatch):
+    monkeypatch.setattr(ai_service, "call_deepseek_api",
+                        lambda prompt, max_tokens=1500: f"### {requested_title(prompt)}\n内容")
+    analysis = ai_service.generate_bazi_analysis(CHART, "male", ["health", "career"], parallel=True)
+    assert analysis == {"career": "内容", "health": "内容"}
+
+    monkeypatch.setattr(ai_service, "ANALYSIS_PARALLEL", True)
+    saved = []
+    ai_service.generate_bazi_analysis(CHART, "male", ["future"], on_section=lambda *item: saved.append(item))
+    assert saved == [("future", "内容")]
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import json
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_service, llm_client
+from utils.bazi_calculator import calculate_bazi
+
+RESPONSE = "### 八字命局核心分析\n[日主庚金，**生于巳月**。]\n\n### 五行旺衰与用神\n火旺金弱。\n### 学业\n宜文科。\n"
+
+
+def test_parser_emits_sections_as_they_close():
+    parser = ai_service.SectionStreamParser()
+    emitted = []
+    # 逐字输入，标题可能被切在任意位置
+    for i, char in enumerate(RESPONSE):
+        for section in parser.feed(char):
+            emitted.append((i, section))
+    last = parser.finish()
+
+    assert [section for _, section in emitted] == [
+        ("coreAnalysis", "日主庚金，生于巳月。"), ("fiveElements", "火旺金弱。")]
+    # 核心分析在第二个标题那一行结束时就已给出
+    assert emitted[0][0] == RESPONSE.index("\n", RESPONSE.index("### 五行"))
+    assert last == ("education", "宜文科。")
+    assert parser.finish() is None
+
+
+class FakeClient:
+    def __init__(self, text, fail_after=None):
+        self.text = text
+        self.fail_after = fail_after
+        self.payloads = []
+        self.sent = 0
+
+    def stream_events(self, url, payload, api_key=None):
+        self.payloads.append(payload)
+        for i in range(0, len(self.text), 7):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise llm_client.LLMError("connection reset")
+            self.sent = i + 7
+            yield {"choices": [{"delta": {"content": self.text[i:i + 7]}}]}
+        yield {"choices": [{"delta": {}, "finish_reason": "stop"}]}
+
+
+def test_stream_deepseek_api(monkeypatch):
+    client = FakeClient(RESPONSE)
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    received = []
+    content = ai_service.stream_deepseek_api("出生日期：1990年5月15日",
+                                             lambda key, text: received.append((key, client.sent)))
+    assert content == RESPONSE
+    assert client.payloads[0]["stream"] is True
+    assert [key for key, _ in received] == ["coreAnalysis", "fiveElements", "education"]
+    # 第一部分在流结束前就已回调
+    assert received[0][1] < len(RESPONSE)
+
+
+def test_stream_failure_keeps_completed_sections(monkeypatch):
+    client = FakeClient(RESPONSE, fail_after=RESPONSE.index("火旺") + 1)
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    received = []
+    assert ai_service.stream_deepseek_api("提示词", lambda key, text: received.append(key)) is None
+    assert received == ["coreAnalysis"]
+
+
+def test_generate_analysis_streaming(monkeypatch):
+    client = FakeClient(RESPONSE)
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    monkeypatch.setattr(ai_service, "DEEPSEEK_STREAM", True)
+    received = {}
+    analysis = ai_service.generate_bazi_analysis(calculate_bazi("1990-05-15 14:30", "male"), "male",
+                                                 ["coreAnalysis", "education"], on_section=received.__setitem__)
+    assert set(received) == {"coreAnalysis", "education"}
+    assert set(analysis) == {"coreAnalysis", "education"}
+    assert json.dumps(client.payloads[0], ensure_ascii=False).count("### 学业") == 1
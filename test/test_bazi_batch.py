@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import pickle
+import random
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bazi_calculator import calculate_bazi, calculate_bazi_chart, calculate_bazi_many
+
+
+def test_batch_matches_single():
+    """批量计算结果与逐条调用 calculate_bazi 完全一致（含速查表范围外的年份）"""
+    rng = random.Random(20240501)
+    records = []
+    for _ in range(300):
+        year = rng.choice([rng.randint(1900, 2100), rng.randint(1900, 2100), 1899, 2101])
+        hour = rng.randint(0, 23)
+        birth_time = rng.choice([f"{hour:02d}:{rng.randint(0, 59):02d}",
+                                 "子丑寅卯辰巳午未申酉戌亥"[hour // 2] + "时 (00:00-00:00)"])
+        records.append({
+            "birthDate": f"{year:04d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "birthTime": birth_time,
+            "gender": rng.choice(["male", "female"])
+        })
+
+    results = calculate_bazi_many(records)
+    assert len(results) == len(records)
+    for record, result in zip(records, results):
+        expected = calculate_bazi(f"{record['birthDate']} {record['birthTime']}", record["gender"])
+        assert result == expected, record
+
+
+def test_batch_reports_invalid_records():
+    records = [
+        {"birthDate": "1990-05-15", "birthTime": "14:00", "gender": "male"},
+        {"birthDate": "not-a-date", "birthTime": "14:00", "gender": "male"},
+    ]
+    results = calculate_bazi_many(records)
+    assert "yearPillar" in results[0]
+    assert "error" in results[1]
+
+
+def test_bazi_chart_compact_form():
+    """BaziChart 以整数保存四柱，可哈希、可 pickle，to_dict() 与 calculate_bazi 一致"""
+    chart = calculate_bazi_chart("1990-05-15 14:00", "male")
+    assert chart.pillars == ["庚午", "辛巳", "庚辰", "癸未"]
+    assert chart.day_master == "庚"
+    # 精确起运时间 qiYun 与出生分钟有关，由 calculate_bazi 在命盘之外补上
+    result = calculate_bazi("1990-05-15 14:00", "male")
+    assert result["daYun"].pop("qiYun")
+    assert chart.to_dict() == result
+
+    same = calculate_bazi_chart("1990-05-15 15:30", "male")
+    assert chart == same and hash(chart) == hash(same)
+    assert chart != calculate_bazi_chart("1990-05-15 16:00", "male")
+    assert pickle.loads(pickle.dumps(chart)) == chart
+
+
+def make_client():
+    """只注册八字蓝图的测试客户端，与 app.py 中的挂载路径一致"""
+    from flask import Flask
+    from routes import bazi_routes
+    app = Flask(__name__)
+    app.register_blueprint(bazi_routes.bazi_bp, url_prefix='/api/bazi')
+    return app.test_client(), bazi_routes
+
+
+def test_batch_endpoint():
+    client, _ = make_client()
+    records = [
+        {"birthDate": "1990-05-15", "birthTime": "14:00", "gender": "male"},
+        {"birthTime": "14:00", "gender": "male"},
+        "1990-05-15",
+        {"birthDate": "1990-02-30", "birthTime": "08:00", "gender": "female"},
+        {"birthDate": "1976-07-20", "birthTime": "20:00", "gender": "female"},
+    ]
+    response = client.post('/api/bazi/calculate/batch', json={"records": records})
+    assert response.status_code == 200
+    data = response.get_json()["data"]
+    # 与输入顺序一致，出错的记录原位返回错误，不影响其他记录
+    assert len(data) == len(records)
+    assert data[0] == calculate_bazi("1990-05-15 14:00", "male")
+    assert data[4] == calculate_bazi("1976-07-20 20:00", "female")
+    assert [("error" in item) for item in data] == [False, True, True, True, False]
+
+    assert client.post('/api/bazi/calculate/batch', json={"records": "x"}).status_code == 400
+
+
+def test_batch_endpoint_size_cap(monkeypatch):
+    client, bazi_routes = make_client()
+    monkeypatch.setattr(bazi_routes, "BAZI_BATCH_MAX_SIZE", 2)
+    record = {"birthDate": "1990-05-15", "birthTime": "14:00", "gender": "male"}
+    response = client.post('/api/bazi/calculate/batch', json={"records": [record] * 3})
+    assert response.status_code == 400
+    assert "2" in response.get_json()["message"]
+    assert client.post('/api/bazi/calculate/batch', json={"records": [record] * 2}).status_code == 200
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+from datetime import timedelta
+from lunar_python import Solar
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bazi_calendar
+
+
+def test_table_matches_lunar_python_every_day():
+    """速查表与 lunar_python 在 1900-2100 每一天的年、月、日柱及下一节气一致"""
+    mismatches = []
+    current = bazi_calendar.TABLE_START
+    n = 0
+    while current <= bazi_calendar.TABLE_END:
+        # 轮换小时，覆盖节气当天交接时刻前后的情况
+        hour = (n * 7) % 24
+        lunar = Solar.fromYmdHms(current.year, current.month, current.day, hour, 0, 0).getLunar()
+
+        year_index, month_index, day_index = bazi_calendar.lookup(current.year, current.month, current.day)
+        expected = (lunar.getYearGan() + lunar.getYearZhi(),
+                    lunar.getMonthGan() + lunar.getMonthZhi(),
+                    lunar.getDayGan() + lunar.getDayZhi())
+        actual = tuple(''.join(bazi_calendar.gan_zhi(i)) for i in (year_index, month_index, day_index))
+        if actual != expected:
+            mismatches.append((current, expected, actual))
+
+        jie_qi = lunar.getNextJieQi()
+        name, jie_qi_time = bazi_calendar.next_jie_qi(current.year, current.month, current.day, hour)
+        if (name, jie_qi_time.strftime("%Y-%m-%d %H:%M:%S")) != (jie_qi.getName(), jie_qi.getSolar().toYmdHms()):
+            mismatches.append((current, hour, jie_qi.getName(), name))
+
+        current += timedelta(days=1)
+        n += 1
+
+    assert not mismatches, f"{len(mismatches)} 处不一致，前几处: {mismatches[:5]}"
+
+
+def test_packaged_file_matches_build():
+    """打包的速查表文件与 lunar_python 现场构建的结果一致"""
+    loaded = bazi_calendar.load_table()
+    assert loaded is not None
+    built = bazi_calendar._build_table()
+    for field in built.__slots__:
+        assert getattr(loaded, field) == getattr(built, field), field
+
+
+def test_out_of_range():
+    assert not bazi_calendar.in_range(1899, 12, 31)
+    assert not bazi_calendar.in_range(2101, 1, 1)
+    try:
+        bazi_calendar.lookup(1711, 9, 25)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("超出范围的日期应抛出 ValueError")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import bazi_benchmark
+from utils import bazi_engine
+from utils.bazi_calculator import BaziChart, calculate_bazi, calculate_bazi_many
+
+
+def test_lunar_engine_matches_table():
+    """参考引擎与速查表引擎对基准语料给出完全相同的结果"""
+    for birth_datetime, gender, pillars, digest in bazi_benchmark.load_golden()["entries"][:300]:
+        result = calculate_bazi(birth_datetime, gender, engine="lunar")
+        assert bazi_benchmark.chart_digest(result) == (pillars, digest), birth_datetime
+
+
+def test_unknown_engine():
+    try:
+        calculate_bazi("1990-05-15 14:30", "male", engine="missing")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知引擎应报错")
+
+
+def test_custom_engine(monkeypatch):
+    class FixedEngine(bazi_engine.BaziEngine):
+        name = "fixed"
+
+        def chart_at(self, year, month, day, hour, minute, gender):
+            return BaziChart(year, [0, 2, 0, 0], [0, 2, 0, 0], 5, True)
+
+    monkeypatch.setitem(bazi_engine._engines, "fixed", FixedEngine())
+    result = calculate_bazi("1990-05-15 14:30", "male", engine="fixed")
+    assert result["dayPillar"]["heavenlyStem"] + result["dayPillar"]["earthlyBranch"] == "甲子"
+    assert result["daYun"]["startAge"] == 5
+
+    # 非向量化引擎下批量计算逐条走 calculate_bazi
+    monkeypatch.setattr(bazi_engine, "BAZI_ENGINE", "fixed")
+    batch = calculate_bazi_many([{"birthDate": "1990-05-15", "birthTime": "14:30", "gender": "male"}])
+    assert batch[0] == calculate_bazi("1990-05-15 14:30", "male")
+    assert batch[0]["monthPillar"]["earthlyBranch"] == "寅"
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import bazi_benchmark
+
+
+def test_corpus_is_stable():
+    golden = bazi_benchmark.load_golden()
+    assert golden["version"] == bazi_benchmark.GOLDEN_VERSION
+    corpus = bazi_benchmark.generate_corpus(len(golden["entries"]))
+    assert [tuple(entry[:2]) for entry in golden["entries"]] == corpus
+
+
+def test_golden_charts():
+    """完整比对用 python test/bazi_benchmark.py，这里只比对前 2000 条"""
+    entries = bazi_benchmark.load_golden()["entries"][:2000]
+    assert bazi_benchmark.verify(entries) == []
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import random
+from datetime import date, timedelta
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bazi_calendar, bazi_reverse_index
+from utils.bazi_calculator import calculate_bazi_chart
+from utils.bazi_reverse_index import find_birth_datetimes
+
+
+def _pillars(chart):
+    return ["甲乙丙丁戊己庚辛壬癸"[gan] + "子丑寅卯辰巳午未申酉戌亥"[zhi]
+            for gan, zhi in zip(chart.stems, chart.branches)]
+
+
+def test_round_trip_random_datetimes():
+    rng = random.Random(20240601)
+    for _ in range(40):
+        day = date(1900, 3, 1) + timedelta(days=rng.randrange(73000))
+        hour, minute = rng.randrange(24), rng.randrange(60)
+        chart = calculate_bazi_chart(f"{day.isoformat()} {hour:02d}:{minute:02d}", "male")
+        pillars = _pillars(chart)
+
+        matches = find_birth_datetimes(pillars)
+        assert {"date": day.isoformat(), "startTime": f"{hour // 2 * 2:02d}:00",
+                "endTime": f"{hour // 2 * 2 + 1:02d}:59"} in matches
+        dates = [match["date"] for match in matches]
+        assert dates == sorted(dates)
+        # 每个结果反过来排盘都得到同样的四柱
+        for match in matches:
+            check = calculate_bazi_chart(f"{match['date']} {match['startTime']}", "male")
+            assert _pillars(check) == pillars
+
+        whole_days = find_birth_datetimes(" ".join(pillars[:3]))
+        assert [match["date"] for match in whole_days] == dates
+
+
+def test_invalid_pillars():
+    # 日干为甲时子时是甲子，丙子不可能出现
+    assert find_birth_datetimes("庚午 辛巳 甲子 丙子") == []
+    for bad in ("庚午 辛巳", "庚午 辛巳 庚辰 癸未 甲子", "甲丑 辛巳 庚辰", "庚午 辛巳 庚X"):
+        try:
+            find_birth_datetimes(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"无效的四柱应报错: {bad}")
+
+
+def test_index_file_round_trip(tmp_path):
+    table = bazi_calendar.get_table()
+    checksum = bazi_reverse_index._table_checksum(table)
+    index = bazi_reverse_index.build_index(table)
+    path = str(tmp_path / "index.bin")
+    bazi_reverse_index.save_index(index, checksum, path)
+
+    loaded = bazi_reverse_index.load_index(checksum, path)
+    assert list(loaded.keys) == list(index.keys)
+    assert list(loaded.offsets) == list(index.offsets)
+    # 速查表变化后旧文件失效
+    assert bazi_reverse_index.load_index(checksum + 1, path) is None
+    assert bazi_reverse_index.load_index(checksum, str(tmp_path / "missing.bin")) is None
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lunar_python import Solar
+
+from utils.bazi_calculator import calculate_bazi, calculate_bazi_chart
+from utils.bazi_timeline import get_timeline_page, iter_liu_yue, iter_timeline
+
+
+def test_timeline_covers_lifetime_lazily():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    timeline = iter_timeline(chart)
+    before_start = next(timeline)
+    assert before_start["index"] == 0 and before_start["startYear"] == 1990
+    assert [year["year"] for year in before_start["liuNian"]] == \
+        list(range(1990, before_start["endYear"] + 1))
+
+    # 前 8 步与命盘中的大运一致，之后继续往后排
+    da_yun_list = calculate_bazi("1990-05-15 14:30", "male")["daYun"]["daYunList"]
+    periods = [next(timeline) for _ in range(10)]
+    assert [{k: v for k, v in period.items() if k != "liuNian"} for period in periods[:8]] == da_yun_list
+    assert periods[9]["startYear"] == periods[8]["endYear"] + 1
+    assert all(len(period["liuNian"]) == 10 for period in periods)
+
+
+def test_timeline_paging():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    full = list(iter_timeline(chart, max_age=100))
+    first = get_timeline_page(chart, 0, 4, max_age=100)
+    second = get_timeline_page(chart, 4, 20, max_age=100)
+    assert first["hasMore"] and not second["hasMore"]
+    assert first["items"] + second["items"] == full
+
+
+def test_liu_yue_follows_jie():
+    """流月干支与交节后 lunar_python 的月柱一致"""
+    for year in (1899, 1990, 2100):
+        months = list(iter_liu_yue(year))
+        assert [month["jieQi"] for month in months[:2]] == ["立春", "惊蛰"]
+        for month in months:
+            moment = datetime.strptime(month["startTime"], "%Y-%m-%d %H:%M:%S") + timedelta(minutes=1)
+            lunar = Solar.fromYmdHms(moment.year, moment.month, moment.day,
+                                     moment.hour, moment.minute, moment.second).getLunar()
+            assert lunar.getMonthInGanZhiExact() == month["heavenlyStem"] + month["earthlyBranch"]
+
+
+def test_stored_chart_keeps_window():
+    chart = calculate_bazi_chart("1950-05-15 14:30", "male")
+    years = [year["year"] for year in calculate_bazi("1950-05-15 14:30", "male")["flowingYears"]]
+    assert years == list(range(chart.flowing_start_year, chart.flowing_end_year + 1))
+    assert years[0] > 1951
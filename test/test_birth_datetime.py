@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.birth_datetime import BirthDateTimeError, parse_birth_datetime
+from utils.bazi_calculator import parse_birth_date_time
+
+
+def test_accepted_formats():
+    """各种写法解析成相同的出生时间"""
+    cases = [
+        (("1990-05-15 14:30",), (1990, 5, 15, 14, 30, None)),
+        (("1990-05-15T14:30:45",), (1990, 5, 15, 14, 30, None)),
+        (("1990/5/15", "14:30"), (1990, 5, 15, 14, 30, None)),
+        (("19900515", "14:30:00"), (1990, 5, 15, 14, 30, None)),
+        (("1990-05-15 未时 (13:00-15:00)",), (1990, 5, 15, 14, 0, "未")),
+        (("1990-05-15", "未时（13:00-15:00）"), (1990, 5, 15, 14, 0, "未")),
+        (("1990-05-15", "未时"), (1990, 5, 15, 14, 0, "未")),
+        (("1990-05-15", "子"), (1990, 5, 15, 0, 0, "子")),
+    ]
+    for args, expected in cases:
+        assert tuple(parse_birth_datetime(*args)) == expected, args
+
+    parsed = parse_birth_datetime("1990-5-15", "7:05")
+    assert (parsed.date_text, parsed.time_text) == ("1990-05-15", "07:05")
+    assert parse_birth_date_time("1990-05-15", "子时 (23:00-01:00)") == \
+        {"year": 1990, "month": 5, "day": 15, "hour": 0}
+
+
+def test_structured_errors():
+    cases = [
+        ((None, "12:00"), "missing_date", "birthDate"),
+        (("1990-05-15",), "missing_time", "birthTime"),
+        (("15/05/1990", "12:00"), "invalid_format", "birthDate"),
+        (("1990-05-15", "下午两点"), "invalid_format", "birthTime"),
+        (("1990-02-30", "12:00"), "invalid_date", "birthDate"),
+        (("1990-05-15", "25:00"), "invalid_time", "birthTime"),
+    ]
+    for args, code, field in cases:
+        try:
+            parse_birth_datetime(*args)
+        except BirthDateTimeError as e:
+            assert (e.code, e.field) == (code, field), args
+            assert e.to_dict()["message"]
+        else:
+            raise AssertionError(f"应当解析失败: {args}")
+
+    # 旧接口仍然限制年份范围，并且错误仍是 ValueError
+    try:
+        parse_birth_date_time("1850-01-01", "12:00")
+    except ValueError as e:
+        assert e.code == "out_of_range"
+    else:
+        raise AssertionError("超出范围的年份应解析失败")
+
+    assert parse_birth_datetime("1990-05-15", require_time=False).hour == 0
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import chart_cache
+from utils.bazi_calculator import calculate_bazi, calculate_bazi_chart
+
+
+def test_same_shi_chen_hits_cache():
+    """同日同时辰同性别的两次排盘共用缓存，返回结果互不影响"""
+    chart_cache.clear_cache()
+    first = calculate_bazi("1990-05-15 14:05", "male")
+    second = calculate_bazi("1990-05-15 15:50", "male")
+    # 精确起运时间按分钟计算，不属于缓存的命盘部分
+    assert first["daYun"].pop("qiYun") != second["daYun"].pop("qiYun")
+    assert first == second
+    assert chart_cache.get_cache_stats()["hits"] == 1
+    assert chart_cache.get_cache_stats()["misses"] == 1
+
+    # 修改返回值不会污染缓存
+    first["flowingYears"] = []
+    third = calculate_bazi("1990-05-15 15:50", "male")
+    third["daYun"].pop("qiYun")
+    assert third == second
+
+    assert calculate_bazi_chart("1990-05-15 14:00", "male").key() != \
+        calculate_bazi_chart("1990-05-15 16:00", "male").key()
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(chart_cache, "BAZI_CHART_CACHE_SIZE", 2)
+    chart_cache.clear_cache()
+    for day in (1, 2, 3):
+        calculate_bazi(f"2000-01-{day:02d} 08:00", "female")
+    stats = chart_cache.get_cache_stats()
+    assert stats["size"] == 2
+    assert stats["misses"] == 3
+
+    # 最早的条目已被淘汰
+    calculate_bazi("2000-01-01 08:00", "female")
+    assert chart_cache.get_cache_stats()["misses"] == 4
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return doc if doc and doc["expireAt"] > query["expireAt"]["$gt"] else None
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = doc
+
+
+def test_mongo_cache_keyed_by_format_version(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(chart_cache, "BAZI_CHART_CACHE_MONGO", True)
+    monkeypatch.setattr(chart_cache, "_collection", collection)
+    chart_cache.clear_cache()
+    chart = calculate_bazi_chart("1990-05-15 14:00", "male")
+    chart_cache.get_chart_dict(chart)
+    (mongo_id, doc), = collection.docs.items()
+    assert mongo_id == f"v{chart_cache.CHART_FORMAT_VERSION}:{chart.key()}"
+    assert doc["chart"] == chart.to_dict() and "expireAt" in doc
+
+    # 另一个进程从 MongoDB 取到
+    chart_cache.clear_cache()
+    chart_cache.get_chart_dict(chart)
+    assert chart_cache.get_cache_stats()["mongoHits"] == 1
+
+    # 格式版本变化后旧记录不再命中
+    monkeypatch.setattr(chart_cache, "CHART_FORMAT_VERSION", chart_cache.CHART_FORMAT_VERSION + 1)
+    chart_cache.clear_cache()
+    chart_cache.get_chart_dict(chart)
+    assert chart_cache.get_cache_stats()["misses"] == 1
+    assert len(collection.docs) == 2
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_service
+from utils.bazi_calculator import calculate_bazi, diff_bazi_charts
+
+
+def test_same_chart_has_no_diff():
+    chart = calculate_bazi("1990-05-15 14:30", "male")
+    assert diff_bazi_charts(chart, calculate_bazi("1990-05-15 14:30", "male")) == {}
+    assert ai_service.sections_affected_by({}) == []
+
+
+def test_hour_correction():
+    # 未时改为辰时：年、月、日柱和神煞不变
+    before = calculate_bazi("1990-05-15 14:30", "male")
+    after = calculate_bazi("1990-05-15 08:30", "male")
+    diff = diff_bazi_charts(before, after)
+    assert "hourPillar" in diff and diff["hourPillar"]["after"]["earthlyBranch"] == "辰"
+    assert "heavenlyStem" in diff["hourPillar"]["fields"]
+    assert not {"yearPillar", "monthPillar", "dayPillar", "shenSha"} & set(diff)
+
+    sections = ai_service.sections_affected_by(diff)
+    assert "children" in sections
+    assert not {"shenShaAnalysis", "relationship", "parents", "social"} & set(sections)
+
+
+def test_removed_component():
+    diff = diff_bazi_charts(calculate_bazi("1990-05-15 08:30", "male", 87.6),
+                            calculate_bazi("1990-05-15 08:30", "male"))
+    assert diff["trueSolarTime"]["after"] is None
+    assert "hourPillar" in diff
+
+
+def test_partial_analysis_prompt(monkeypatch):
+    prompts = []
+
+    def fake_api(prompt):
+        prompts.append(prompt)
+        return "### 子女情况\n子女缘分较好。\n\n### 人生规划建议\n稳步发展。"
+
+    monkeypatch.setattr(ai_service, "call_deepseek_api", fake_api)
+    analysis = ai_service.generate_bazi_analysis(calculate_bazi("1990-05-15 08:30", "male"), "male",
+                                                 ["children", "lifePlan"])
+    assert "### 子女情况" in prompts[0] and "### 婚姻感情" not in prompts[0]
+    assert set(analysis) == {"children", "lifePlan"}
+    assert "子女缘分较好" in analysis["children"]
+
+
+def test_update_birth_info_rejected_while_analyzing(monkeypatch):
+    from flask import Flask
+    from routes import bazi_routes
+
+    writes = []
+    monkeypatch.setattr(bazi_routes.BaziResultModel, "update_birth_info", lambda *args: writes.append(args) or True)
+    monkeypatch.setattr(bazi_routes.BaziResultModel, "update_field", lambda *args: writes.append(args) or True)
+    monkeypatch.setitem(bazi_routes.analyzing_results, "RES-edit", True)
+    result = {"baziChart": calculate_bazi("1990-05-15 14:30", "male"), "longitude": None}
+
+    with Flask(__name__).app_context():
+        response, status = bazi_routes._update_birth_info(
+            "RES-edit", result, "1990-05-15", "08:30", "male", None,
+            calculate_bazi("1990-05-15 08:30", "male"), True)
+    # 进行中的分析基于原命盘，不能写入新命盘，也不能报告未安排的重新生成
+    assert status == 409
+    assert writes == []
+
+
+def test_update_birth_info_without_analysis_reports_no_sections(monkeypatch):
+    from flask import Flask
+    from routes import bazi_routes
+
+    monkeypatch.setattr(bazi_routes.BaziResultModel, "update_birth_info", lambda *args: True)
+    result = {"baziChart": calculate_bazi("1990-05-15 14:30", "male"), "longitude": None}
+
+    with Flask(__name__).app_context():
+        response = bazi_routes._update_birth_info(
+            "RES-edit", result, "1990-05-15", "08:30", "male", None,
+            calculate_bazi("1990-05-15 08:30", "male"), False)
+    data = response.get_json()["data"]
+    assert "hourPillar" in data["chartDiff"]
+    assert data["sections"] == []
+    assert "RES-edit" not in bazi_routes.analyzing_results
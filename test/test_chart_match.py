@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import random
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bazi_calculator import (
+    BaziChart, calculate_bazi, calculate_bazi_chart, chart_code_from_dict, compare_charts, rank_charts
+)
+
+
+def _chart(pillars):
+    """由 ["甲子", ...] 构造命盘"""
+    return BaziChart(2000, ["甲乙丙丁戊己庚辛壬癸".index(p[0]) for p in pillars],
+                     ["子丑寅卯辰巳午未申酉戌亥".index(p[1]) for p in pillars], 1, True)
+
+
+def test_compare_relations():
+    a = _chart(["甲子", "丙寅", "甲子", "甲子"])
+    b = _chart(["己丑", "丙申", "乙午", "甲辰"])
+    result = compare_charts(a, b)
+    assert [detail["relations"] for detail in result["details"]] == \
+        [["天干五合", "六合"], ["相冲"], ["相冲"], ["三合"]]
+    # 60 + 2*(8+6) - 1*8 - 3*8 + 1*4
+    assert result["score"] == 60
+    assert result["level"] == "平"
+    assert compare_charts(a, b)["score"] == compare_charts(b, a)["score"]
+
+
+def test_rank_matches_pairwise_scores():
+    rng = random.Random(20240513)
+    target = calculate_bazi_chart("1990-05-15 14:30", "male")
+    candidates = [_chart([rng.choice("甲乙丙丁戊己庚辛壬癸") + rng.choice("子丑寅卯辰巳午未申酉戌亥")
+                          for _ in range(4)]) for _ in range(500)]
+    ranking = rank_charts(target, [chart.code() for chart in candidates])
+    assert sorted(item["index"] for item in ranking) == list(range(500))
+    assert [item["score"] for item in ranking] == sorted((item["score"] for item in ranking), reverse=True)
+    for item in ranking:
+        assert item["score"] == compare_charts(target, candidates[item["index"]])["score"]
+
+    assert len(rank_charts(target, [chart.code() for chart in candidates], limit=10)) == 10
+    assert rank_charts(target, []) == []
+
+
+def test_code_from_stored_chart():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    assert chart_code_from_dict(calculate_bazi("1990-05-15 14:30", "male")) == chart.code()
+    assert chart_code_from_dict({"yearPillar": {}}) is None
+    assert chart_code_from_dict(None) is None
+
+
+class ResultsCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection):
+        return [doc for doc in self.documents if doc["_id"] in query["_id"]["$in"]]
+
+
+def test_find_bazi_charts_accepts_res_prefix(monkeypatch):
+    """候选ID多或少 RES 前缀都能查到，结果按调用方传入的ID返回"""
+    from models import bazi_result_model
+
+    chart = {key: value for key, value in calculate_bazi("1990-05-15 14:00", "male").items() if key.endswith("Pillar")}
+    other = {key: value for key, value in calculate_bazi("1992-03-01 08:00", "female").items() if key.endswith("Pillar")}
+    monkeypatch.setattr(bazi_result_model, "results_collection", ResultsCollection([
+        {"_id": "RES1001", "baziChart": chart},
+        {"_id": "1002", "baziChart": chart},
+        {"_id": "1003", "baziChart": other},
+        {"_id": "RES1003", "baziChart": chart},
+    ]))
+    charts = bazi_result_model.BaziResultModel.find_bazi_charts(["1001", "RES1002", "1003", "RES1003", "1004"])
+    assert charts == {"1001": chart, "RES1002": chart, "1003": other, "RES1003": chart}
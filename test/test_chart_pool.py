@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import time
+
+import pytest
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bazi_calculator, chart_pool
+
+
+def test_pool_result_matches_inline(monkeypatch):
+    """进程池计算结果与当前线程直接计算一致，饱和时退回当前线程"""
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_WORKERS", 1)
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_MAX_PENDING", 1)
+    try:
+        expected = bazi_calculator.calculate_bazi("1990-05-15 14:00", "male")
+        assert chart_pool.calculate_bazi("1990-05-15 14:00", "male") == expected
+
+        # 占满排队名额后，任务直接在当前线程执行
+        assert chart_pool._acquire_slot()
+        assert not chart_pool._acquire_slot()
+        assert chart_pool.calculate_bazi("1990-05-15 14:00", "male") == expected
+        chart_pool._release_slot()
+    finally:
+        chart_pool.shutdown_pool()
+
+
+def test_pool_disabled_runs_inline(monkeypatch):
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_WORKERS", 0)
+    assert chart_pool._get_pool() is None
+    records = [{"birthDate": "2001-02-03", "birthTime": "04:05", "gender": "female"}]
+    assert chart_pool.calculate_bazi_many(records) == bazi_calculator.calculate_bazi_many(records)
+
+
+def test_pool_timeout_raises_without_recomputing(monkeypatch):
+    """任务超时时报错，不在当前线程重新计算"""
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_WORKERS", 1)
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_MAX_PENDING", 1)
+    monkeypatch.setattr(chart_pool, "BAZI_POOL_TIMEOUT", 0.5)
+    try:
+        # 先完成一次任务，让 worker 进程完成预热
+        chart_pool.run_chart_job(time.sleep, 0)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            chart_pool.run_chart_job(time.sleep, 3)
+        assert time.monotonic() - started < 2
+    finally:
+        chart_pool.shutdown_pool()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import random
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bazi_calculator import (
+    CANG_GAN, calculate_bazi, calculate_bazi_many, get_five_element_strength, weigh_five_elements
+)
+
+
+def test_hidden_stem_weights():
+    assert all(sum(weight for _, weight in stems) == 100 for stems in CANG_GAN.values())
+
+
+def test_weighted_strength():
+    # 庚午 辛巳 庚辰 癸未，巳月火旺、土相、金死、水囚、木休
+    strength = calculate_bazi("1990-05-15 14:30", "male")["fiveElementStrength"]
+    assert strength["seasonStates"] == {"wood": "休", "fire": "旺", "earth": "相", "metal": "死", "water": "囚"}
+    # 金：庚辛庚 3 + 巳藏庚 0.3 = 3.3，乘死 0.6
+    assert strength["scores"] == {"wood": 0.4, "fire": 2.4, "earth": 1.92, "metal": 1.98, "water": 0.88}
+    assert round(sum(strength["percentages"].values())) == 100
+    assert strength["dayMaster"] == {"stem": "庚", "element": "metal", "supportRatio": 0.515, "strength": "中和"}
+
+
+def test_day_master_verdict():
+    # 甲寅 丙寅 甲寅 丙寅：木旺，日主身强
+    assert get_five_element_strength([0, 2, 0, 2], [2, 2, 2, 2])["dayMaster"]["strength"] == "身强"
+    # 庚申 丙午 甲申 庚午：午月木休、金死，日主甲木只有申中无木，身弱
+    assert get_five_element_strength([6, 2, 0, 6], [8, 6, 8, 6])["dayMaster"]["strength"] == "身弱"
+
+
+def test_batch_matches_single():
+    rng = random.Random(20240620)
+    records = [{"birthDate": f"{rng.randrange(1920, 2080)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+                "birthTime": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", "gender": "male"}
+               for _ in range(50)]
+    for record, result in zip(records, calculate_bazi_many(records)):
+        single = calculate_bazi(f"{record['birthDate']} {record['birthTime']}", "male")
+        assert result["fiveElementStrength"] == single["fiveElementStrength"]
+
+
+def test_weigh_five_elements_is_exact():
+    scores = weigh_five_elements([6, 7, 6, 9], [6, 5, 4, 7])
+    assert scores == (4000, 24000, 19200, 19800, 8800)
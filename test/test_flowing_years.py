@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+from lunar_python import Solar
+from lunar_python.util import LunarUtil
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bazi_calculator import calculate_ji_xiong, calculate_liu_nian_shen_sha, get_flowing_years
+
+ELEMENT_KEYS = {"金": "metal", "木": "wood", "水": "water", "火": "fire", "土": "earth"}
+
+
+def expected_flowing_year(year, birth_year):
+    """由 lunar_python 直接计算的流年，作为对照"""
+    lunar = Solar.fromYmd(year, 5, 1).getLunar()
+    gan, zhi = lunar.getYearGan(), lunar.getYearZhi()
+    return {
+        "year": year,
+        "age": year - birth_year,
+        "heavenlyStem": gan,
+        "earthlyBranch": zhi,
+        "ganElement": ELEMENT_KEYS[LunarUtil.WU_XING_GAN[gan]],
+        "zhiElement": ELEMENT_KEYS[LunarUtil.WU_XING_ZHI[zhi]],
+        "shenSha": calculate_liu_nian_shen_sha(gan, zhi),
+        "jiXiong": calculate_ji_xiong(gan + zhi)
+    }
+
+
+def test_flowing_years_match_lunar_python():
+    """速查表范围 1900-2100 内的每一年都与 lunar_python 一致"""
+    flowing_years = get_flowing_years(1900, 1900, 2100)
+    assert flowing_years == [expected_flowing_year(year, 1900) for year in range(1900, 2101)]
+
+
+def test_flowing_years_outside_table():
+    """超出速查表范围时逐年计算，跨越边界的区间也与 lunar_python 一致"""
+    for start_year, end_year in ((1890, 1899), (2095, 2110)):
+        assert get_flowing_years(1880, start_year, end_year) == \
+            [expected_flowing_year(year, 1880) for year in range(start_year, end_year + 1)]
+
+
+def test_flowing_years_are_fresh_per_call():
+    """每次调用返回新的字典和神煞列表，修改不影响之后的调用"""
+    for start_year, end_year in ((2020, 2022), (2099, 2103)):
+        first = get_flowing_years(1990, start_year, end_year)
+        expected = get_flowing_years(1990, start_year, end_year)
+        for item in first:
+            item["age"] = -1
+            item["shenSha"].append("测试")
+            item.pop("jiXiong")
+        second = get_flowing_years(1990, start_year, end_year)
+        assert second == expected
+        assert all(a is not b and a["shenSha"] is not b["shenSha"] for a, b in zip(first, second))
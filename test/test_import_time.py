@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import json
+import subprocess
+
+# 添加项目根目录到路径，以便导入模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# gunicorn worker 冷启动时导入排盘模块的时间上限（秒）
+IMPORT_TIME_BUDGET = float(os.getenv('BAZI_IMPORT_TIME_BUDGET', '0.5'))
+
+# 在新的解释器中导入，避免受当前进程已加载模块的影响
+IMPORT_SCRIPT = """
+import json, logging, sys, time
+start = time.perf_counter()
+import utils.bazi_calculator
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in ("numpy", "lunar_python", "sxtwl") if name in sys.modules],
+    "rootHandlers": len(logging.getLogger().handlers)
+}))
+"""
+
+
+def _import_in_subprocess():
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_is_lean():
+    """导入时不加载第三方历法库和 numpy，也不改动全局日志配置"""
+    result = _import_in_subprocess()
+    assert result["loaded"] == []
+    assert result["rootHandlers"] == 0
+
+
+def test_import_time_budget():
+    # 第一次导入可能要编译 .pyc，取两次中较快的一次
+    elapsed = min(_import_in_subprocess()["elapsed"] for _ in range(2))
+    print(f"导入 utils.bazi_calculator 耗时: {elapsed * 1000:.1f}ms")
+    assert elapsed < IMPORT_TIME_BUDGET
+
+
+def test_lazy_dependencies_still_work():
+    from utils.bazi_calculator import calculate_bazi, calculate_bazi_many
+
+    # 速查表范围之外的年份按需加载 lunar_python
+    assert calculate_bazi("1850-03-01 10:00", "male")["dayPillar"]["heavenlyStem"]
+    assert "yearPillar" in calculate_bazi_many([{"birthDate": "1990-05-15", "birthTime": "14:00"}])[0]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import threading
+import time
+
+import requests
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_service, llm_client
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+    def iter_lines(self):
+        for line in self.body:
+            yield line.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+def _client_with(responses, **kwargs):
+    client = llm_client.LLMClient(base_delay=0.001, max_delay=0.01, **kwargs)
+    calls = []
+
+    def fake_post(url, headers=None, json=None, timeout=None, stream=False):
+        calls.append((url, headers, json, timeout))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client.session.post = fake_post
+    return client, calls
+
+
+def test_retries_rate_limit_and_server_errors():
+    client, calls = _client_with([FakeResponse(429, headers={"Retry-After": "0"}), FakeResponse(503),
+                                  requests.exceptions.ConnectionError("reset"), FakeResponse(200, {"ok": 1})])
+    assert client.post_json("https://api.example.com", {"a": 1}, api_key="k") == {"ok": 1}
+    assert len(calls) == 4
+    assert calls[0][1]["Authorization"] == "Bearer k"
+    assert calls[0][3] == client.timeout
+
+
+def test_gives_up():
+    client, calls = _client_with([FakeResponse(400, {"error": "bad"})])
+    try:
+        client.post_json("https://api.example.com", {})
+    except llm_client.LLMError as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("4xx 不应重试")
+    assert len(calls) == 1
+
+    client, calls = _client_with([FakeResponse(500)] * 3, max_retries=2)
+    try:
+        client.post_json("https://api.example.com", {})
+    except llm_client.LLMError as e:
+        assert e.status_code == 500
+    else:
+        raise AssertionError("重试用尽应报错")
+    assert len(calls) == 3
+
+    # 读取超时不重试
+    client, calls = _client_with([requests.exceptions.ReadTimeout("slow"), FakeResponse(200, {})])
+    try:
+        client.post_json("https://api.example.com", {})
+    except requests.exceptions.ReadTimeout:
+        pass
+    else:
+        raise AssertionError("读取超时应直接抛出")
+    assert len(calls) == 1
+
+
+def test_retry_delay_is_bounded():
+    client = llm_client.LLMClient(base_delay=1, max_delay=4)
+    assert all(0 <= client._retry_delay(attempt) <= 4 for attempt in range(10))
+    assert client._retry_delay(0, "3") >= 3
+    assert client._retry_delay(0, "600") == 4
+
+
+def test_concurrency_is_bounded():
+    client = llm_client.LLMClient(max_concurrency=2)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def slow_post(url, headers=None, json=None, timeout=None, stream=False):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return FakeResponse(200, {})
+
+    client.session.post = slow_post
+    threads = [threading.Thread(target=client.post_json, args=("https://api.example.com", {})) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_deepseek_uses_shared_client(monkeypatch):
+    client, calls = _client_with([FakeResponse(200, {"choices": [{"message": {"content": "### 学业\n好"}}]})])
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+    assert ai_service.call_deepseek_api("出生日期：1990年5月15日") == "### 学业\n好"
+    assert calls[0][0] == ai_service.DEEPSEEK_API_URL
+
+
+def test_stream_events():
+    lines = [": keep-alive", "", 'data: {"choices": [{"delta": {"content": "八字"}}]}', "",
+             "data: not-json", 'data: {"choices": [{"delta": {"content": "命盘"}}]}', "data: [DONE]",
+             'data: {"choices": [{"delta": {"content": "多余"}}]}']
+    client, calls = _client_with([FakeResponse(503), FakeResponse(200, lines)])
+    events = list(client.stream_events("https://api.example.com", {"stream": True}))
+    assert [event["choices"][0]["delta"]["content"] for event in events] == ["八字", "命盘"]
+    assert len(calls) == 2
+    # 流读完后归还并发名额
+    assert client._slots.acquire(blocking=False)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bazi_calendar
+from utils.bazi_calculator import (
+    DI_ZHI, JI_XIONG_TABLE, NA_YIN, TIAN_GAN, WANG_SHUAI, calculate_bazi, calculate_ji_xiong,
+    get_na_yin, get_shi_shen_name, na_yin_at, shi_shen_at, wang_shuai_at
+)
+
+
+def test_na_yin_covers_sixty_jia_zi():
+    assert len(NA_YIN) == 60
+    assert get_na_yin("壬寅") == "金箔金"
+    assert get_na_yin("癸亥") == "大海水"
+    for i in range(60):
+        gan, zhi = bazi_calendar.gan_zhi(i)
+        assert na_yin_at(TIAN_GAN.index(gan), DI_ZHI.index(zhi)) == NA_YIN[gan + zhi]
+        assert JI_XIONG_TABLE[i] == calculate_ji_xiong(gan + zhi)
+
+
+def test_shi_shen_matrix():
+    # 阳日干
+    assert [shi_shen_at(0, gan) for gan in range(10)] == [
+        "比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"]
+    # 阴日干：乙木见甲为劫财、见丙为伤官、见庚为正官、见癸为偏印
+    assert get_shi_shen_name("乙", "甲") == "劫财"
+    assert get_shi_shen_name("乙", "丙") == "伤官"
+    assert get_shi_shen_name("乙", "庚") == "正官"
+    assert get_shi_shen_name("乙", "癸") == "偏印"
+    assert get_shi_shen_name("", "甲") == "未知"
+
+
+def test_wang_shuai_table():
+    assert [wang_shuai_at(i) for i in range(12)] == [WANG_SHUAI[zhi] for zhi in DI_ZHI]
+
+
+def test_chart_uses_tables():
+    # 庚午 辛巳 庚辰 癸未
+    result = calculate_bazi("1990-05-15 14:30", "male")
+    assert result["yearPillar"]["naYin"] == "路旁土"
+    assert result["monthPillar"]["shiShen"] == "劫财"
+    assert result["hourPillar"]["shiShen"] == "伤官"
+    assert all(yun["naYin"] != "未知" for yun in result["daYun"]["daYunList"])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+from datetime import date
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lunar_python import Solar
+
+from utils.bazi_calculator import calculate_bazi_chart
+from utils.luck_calendar import get_daily_calendar, get_luck_calendar, get_monthly_calendar
+
+
+def test_daily_calendar_matches_lunar():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    days = get_daily_calendar(chart, date(2099, 12, 20), date(2100, 12, 31))
+    assert len(days) == 377
+    assert days[0]["date"] == "2099-12-20" and days[-1]["date"] == "2100-12-31"
+    for day in days[::7]:
+        lunar = Solar.fromYmd(*map(int, day["date"].split("-"))).getLunar()
+        assert day["heavenlyStem"] + day["earthlyBranch"] == lunar.getDayInGanZhi()
+        assert day["monthStem"] + day["monthBranch"] == lunar.getMonthInGanZhi()
+    assert {day["shiShen"] for day in days} >= {"比肩", "正印"}
+
+    # 同一日柱的命盘共用缓存，返回的是副本
+    days[0]["jiXiong"] = None
+    assert get_daily_calendar(chart, date(2099, 12, 20), date(2099, 12, 20))[0]["jiXiong"] is not None
+
+
+def test_monthly_calendar_follows_jie():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    months = get_monthly_calendar(chart, date(2025, 1, 1), date(2025, 12, 31))
+    # 1 月上旬还在上一流年的子月（大雪起），12 月下旬进入本流年的子月
+    assert [month["jieQi"] for month in months][:3] == ["大雪", "小寒", "立春"]
+    assert [month["year"] for month in months] == [2024, 2024] + [2025] * 11
+    assert months[2]["heavenlyStem"] + months[2]["earthlyBranch"] == "戊寅"
+    assert all(month["endTime"] == following["startTime"] for month, following in zip(months, months[1:]))
+
+
+def test_range_limits():
+    chart = calculate_bazi_chart("1990-05-15 14:30", "male")
+    for args in ((date(2025, 2, 1), date(2025, 1, 1), "day"),
+                 (date(2020, 1, 1), date(2025, 1, 1), "day"),
+                 (date(2025, 1, 1), date(2025, 2, 1), "week")):
+        try:
+            get_luck_calendar(chart, *args)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"应当拒绝: {args}")
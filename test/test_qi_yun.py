@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+import random
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lunar_python import Solar
+
+from utils import bazi_calendar
+from utils.bazi_calculator import calculate_bazi, calculate_qi_yun
+
+
+def test_next_and_previous_jie_match_lunar():
+    rng = random.Random(20240509)
+    for _ in range(500):
+        args = (rng.randint(1901, 2099), rng.randint(1, 12), rng.randint(1, 28),
+                rng.randint(0, 23), rng.randint(0, 59))
+        lunar = Solar.fromYmdHms(*args, 0).getLunar()
+        for ours, theirs in ((bazi_calendar.next_jie(*args), lunar.getNextJie()),
+                             (bazi_calendar.previous_jie(*args), lunar.getPrevJie())):
+            assert ours[0] == theirs.getName(), args
+            assert ours[1].strftime("%Y-%m-%d %H:%M:%S") == theirs.getSolar().toYmdHms(), args
+
+
+def test_qi_yun_matches_lunar():
+    """起运时间与 lunar_python getYun(gender, 2) 按分钟计算的结果一致（含速查表范围外）"""
+    rng = random.Random(20240510)
+    for _ in range(300):
+        args = (rng.choice([rng.randint(1901, 2099), 1880, 2120]), rng.randint(1, 12), rng.randint(1, 28),
+                rng.randint(0, 23), rng.randint(0, 59))
+        eight_char = Solar.fromYmdHms(*args, 0).getLunar().getEightChar()
+        for gender in (0, 1):
+            yun = eight_char.getYun(gender, 2)
+            qi_yun = calculate_qi_yun(*args, yun.isForward())
+            assert (qi_yun["years"], qi_yun["months"], qi_yun["days"], qi_yun["hours"]) == \
+                (yun.getStartYear(), yun.getStartMonth(), yun.getStartDay(), yun.getStartHour()), args
+
+
+def test_chart_includes_qi_yun():
+    qi_yun = calculate_qi_yun(1990, 5, 15, 14, 30, True)
+    assert (qi_yun["years"], qi_yun["months"], qi_yun["days"], qi_yun["hours"]) == (7, 2, 21, 8)
+    assert (qi_yun["jieQi"], qi_yun["jieQiTime"]) == ("芒种", "1990-06-06 06:46:18")
+
+    da_yun = calculate_bazi("1990-05-15 14:30", "male")["daYun"]
+    assert da_yun["qiYun"]["jieQi"] == ("芒种" if da_yun["isForward"] else "立夏")
+
+
+def test_da_yun_start_follows_qi_yun():
+    """大运起运年龄、年份和大运列表与精确起运时间一致（按顺逆行数到前后的节）"""
+    for birth_datetime, gender, years, forward in (("1976-07-20 20:00", "female", 4, False),
+                                                   ("1990-05-15 08:00", "male", 7, True)):
+        for engine in ("table", "lunar"):
+            da_yun = calculate_bazi(birth_datetime, gender, engine=engine)["daYun"]
+            assert (da_yun["isForward"], da_yun["qiYun"]["years"]) == (forward, years), (birth_datetime, engine)
+            assert da_yun["startAge"] == years
+            assert da_yun["startYear"] == int(birth_datetime[:4]) + years
+            assert da_yun["daYunList"][0]["startAge"] == years
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import shen_sha
+from utils.bazi_calculator import calculate_ben_ming_shen_sha, calculate_liu_nian_shen_sha
+
+
+def test_packaged_rules():
+    assert calculate_ben_ming_shen_sha("甲", "子", "乙", "巳") == ["天乙贵人", "文昌贵人"]
+    assert calculate_ben_ming_shen_sha("乙", "子", "丁", "巳") == []
+    assert calculate_liu_nian_shen_sha("丙", "寅") == ["太岁合", "驿马"]
+    assert calculate_liu_nian_shen_sha("庚", "申") == ["驿马", "金神"]
+    assert shen_sha.lookup("yearZhi", zhi="酉") == ["劫煞", "灾煞"]
+    assert shen_sha.lookup("dayGan", gan="无") == []
+
+
+def test_compile_declarative_rules():
+    """新增神煞只需要写规则数据"""
+    tables = shen_sha.compile_rules({
+        "categories": {
+            "test": {
+                "pillars": ["year", "day"],
+                "rules": [
+                    {"name": "年日同干", "yearGan": ["甲"], "dayGan": ["甲"]},
+                    {"name": "日柱甲子", "dayGanZhi": ["甲子"]},
+                    {"name": "不限", }
+                ]
+            }
+        }
+    })
+    table = tables["test"]
+    assert table.lookup((0, 0), (0, 0)) == ["年日同干", "日柱甲子", "不限"]
+    assert table.lookup((1, 0), (0, 0)) == ["日柱甲子", "不限"]
+    assert table.lookup((0, 5), (0, 2)) == ["年日同干", "不限"]
+
+    for bad_rule in ({"name": "错字", "gan": ["甲", "子"]}, {"name": "错键", "month": ["甲"]}):
+        try:
+            shen_sha.compile_rules({"categories": {"bad": {"rules": [bad_rule]}}})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"无效规则应报错: {bad_rule}")
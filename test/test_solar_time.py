@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import os
+from datetime import datetime
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import solar_time
+from utils.bazi_calculator import calculate_bazi, calculate_bazi_chart, calculate_bazi_many
+
+
+def test_china_dst_periods():
+    assert solar_time.china_dst_minutes(datetime(1988, 6, 1, 12)) == 60
+    assert solar_time.china_dst_minutes(datetime(1986, 5, 4, 3)) == 60
+    assert solar_time.china_dst_minutes(datetime(1986, 4, 20, 12)) == 0
+    assert solar_time.china_dst_minutes(datetime(1988, 4, 17, 1, 59)) == 0
+    assert solar_time.china_dst_minutes(datetime(1991, 9, 15, 2)) == 0
+    assert solar_time.china_dst_minutes(datetime(1992, 7, 1, 12)) == 0
+
+
+def test_equation_of_time_table():
+    # 均时差在 11 月初最大（约 +16.4 分钟），2 月中旬最小（约 -14.2 分钟）
+    assert 960 <= solar_time.equation_of_time(datetime(2001, 11, 3)) <= 1000
+    assert -870 <= solar_time.equation_of_time(datetime(2001, 2, 11)) <= -840
+    assert max(solar_time.EQUATION_OF_TIME) < 17 * 60
+    assert min(solar_time.EQUATION_OF_TIME) > -15 * 60
+
+
+def test_true_solar_time():
+    # 乌鲁木齐（东经 87.6°），夏令时期间的 08:30：扣 60 分钟，再晚 129.6 分钟，均时差约 +3.6 分钟
+    solar, detail = solar_time.to_true_solar_time(datetime(1990, 5, 15, 8, 30), 87.6)
+    assert detail["dstMinutes"] == 60
+    assert detail["longitudeSeconds"] == -7776
+    assert datetime(1990, 5, 15, 5, 22) <= solar <= datetime(1990, 5, 15, 5, 26)
+
+    try:
+        solar_time.to_true_solar_time(datetime(1990, 5, 15, 8, 30), 200)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("经度超出范围应报错")
+
+
+def test_chart_with_longitude():
+    clock = calculate_bazi("1990-05-15 08:30", "male")
+    corrected = calculate_bazi("1990-05-15 08:30", "male", 87.6)
+    assert "trueSolarTime" not in clock
+    assert corrected["trueSolarTime"]["solarTime"].startswith("1990-05-15 05:2")
+    assert clock["hourPillar"]["earthlyBranch"] == "辰"
+    assert corrected["hourPillar"]["earthlyBranch"] == "寅"
+
+    # 校正跨过午夜时日柱也随之改变
+    previous_day = calculate_bazi_chart("1990-01-09 22:00", "male")
+    assert calculate_bazi_chart("1990-01-10 00:30", "male", 90).stems[2] == previous_day.stems[2]
+
+    # 批量计算同样支持经度
+    batch = calculate_bazi_many([{"birthDate": "1990-05-15", "birthTime": "08:30",
+                                  "gender": "male", "longitude": 87.6}])
+    assert batch[0] == corrected
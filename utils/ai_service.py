@@ -1,20 +1,32 @@
 import os
 import json
 import logging
-import requests
-import openai
 import time
 from datetime import datetime
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import analysis_cache, llm_client
+from utils.bazi_calculator import DI_ZHI, TIAN_GAN, chart_code_from_dict, get_five_element_strength
+from utils.birth_datetime import BirthDateTimeError, parse_birth_datetime
 
 logger = logging.getLogger(__name__)
 
-# 配置OpenAI API
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# OpenAI API配置（与DeepSeek共用 llm_client 的连接池、超时和重试）
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 
 # DeepSeek API配置
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# 完整分析是否流式生成，逐个部分保存（见 generate_bazi_analysis 的 on_section）
+DEEPSEEK_STREAM = os.getenv('DEEPSEEK_STREAM', 'true').lower() == 'true'
+# 完整分析是否拆成每个部分单独的提示词并发生成（见 generate_analysis_sections），
+# 以及并发数和每个部分的 max_tokens（整篇一次生成时为 1500）
+ANALYSIS_PARALLEL = os.getenv('ANALYSIS_PARALLEL', 'false').lower() == 'true'
+ANALYSIS_PARALLEL_WORKERS = int(os.getenv('ANALYSIS_PARALLEL_WORKERS', '6'))
+ANALYSIS_SECTION_MAX_TOKENS = int(os.getenv('ANALYSIS_SECTION_MAX_TOKENS', '800'))
+# 完整分析提示词模板版本，修改 format_analysis_prompt、分析要求或系统提示时递增，使 analysis_cache 中的旧回答失效
+ANALYSIS_PROMPT_VERSION = 2
 
 def get_prompt_template(focus_area):
     """
@@ -47,6 +59,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从五行平衡的角度专门分析其健康状况，包括：
         1. 整体健康状况评估
         2. 潜在的健康风险点
@@ -77,6 +92,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其财运状况，包括：
         1. 整体财运评估
         2. 财富来源和积累方式
@@ -107,6 +125,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其事业状况，包括：
         1. 事业发展总体趋势
         2. 适合从事的行业和职业
@@ -137,6 +158,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其婚姻感情状况，包括：
         1. 感情和婚姻总体运势
         2. 适合的伴侣类型和特征
@@ -167,6 +191,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其子女缘分，包括：
         1. 子女缘分总体评估
         2. 可能的子女数量和性别
@@ -197,6 +224,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其与父母的关系，包括：
         1. 与父母关系的总体状况
         2. 与父亲的关系特点和发展
@@ -227,6 +257,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其学业情况，包括：
         1. 学习能力和思维方式
         2. 适合的学习领域和学科
@@ -257,6 +290,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其人际关系状况，包括：
         1. 社交能力和人际交往特点
         2. 朋友关系和人脉资源
@@ -287,6 +323,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度专门分析其未来五年运势，包括：
         1. 未来五年总体运势
         2. 每年的具体运势变化
@@ -317,6 +356,9 @@ def get_prompt_template(focus_area):
         火：{fire}
         土：{earth}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {five_element_strength}
+        
         请从八字命理的角度进行全面分析，包括：
         1. 性格特点和天赋才能
         2. 人生总体运势和发展方向
@@ -351,6 +393,126 @@ def get_prompt_template(focus_area):
     
     return templates.get(focus_area, templates["overall"])
 
+# 五行英文键对应的中文
+ELEMENT_NAMES = {"metal": "金", "wood": "木", "water": "水", "fire": "火", "earth": "土"}
+
+def format_five_element_strength(bazi_data, indent="        "):
+    """
+    五行强弱的提示词文本，各提示词共用，AI 不必再自行推算旺衰
+    
+    Args:
+        bazi_data: calculate_bazi 返回的字典；旧记录没有 fiveElementStrength 时按四柱现算
+        indent: 第二行起的缩进，与所在提示词对齐
+        
+    Returns:
+        str: 多行文本，四柱无法识别时返回"无"
+    """
+    strength = bazi_data.get("fiveElementStrength")
+    if not strength:
+        try:
+            pillars = [bazi_data[f"{name}Pillar"] for name in ("year", "month", "day", "hour")]
+            strength = get_five_element_strength(
+                [TIAN_GAN.index(pillar["heavenlyStem"]) for pillar in pillars],
+                [DI_ZHI.index(pillar["earthlyBranch"]) for pillar in pillars])
+        except (KeyError, ValueError, TypeError):
+            return "无"
+    
+    lines = [
+        f"{ELEMENT_NAMES[key]}：{strength['scores'][key]}（{strength['percentages'][key]}%，{strength['seasonStates'][key]}）"
+        for key in ("metal", "wood", "water", "fire", "earth")
+    ]
+    day_master = strength["dayMaster"]
+    lines.append(f"日主：{day_master['stem']}{ELEMENT_NAMES[day_master['element']]}，"
+                 f"同党（比劫、印枭）占{round(day_master['supportRatio'] * 100, 1)}%，{day_master['strength']}")
+    return f"\n{indent}".join(lines)
+
+# 完整分析的各部分：(字段名, 标题, 要求)，提示词和返回格式都按这个顺序
+ANALYSIS_SECTIONS = (
+    ("coreAnalysis", "八字命局核心分析", "分析八字四柱的组合特点、日主旺衰、格局类型、命局核心特征，以及对人生的整体影响。"),
+    ("fiveElements", "五行旺衰与用神", "详细分析五行的旺衰状态，确定用神、忌神，并解释它们对人生各方面的影响。"),
+    ("shenShaAnalysis", "神煞解析", "解读命盘中的重要神煞，分析其对命主各方面运势的具体影响。"),
+    ("keyPoints", "大运与流年关键节点", "分析当前及未来大运、流年的特点，指出人生关键转折点和需要注意的时期。"),
+    ("relationship", "婚姻感情", "分析感情特点、婚姻状况、配偶特征，以及相关吉凶。"),
+    ("career", "事业财运", "分析适合的事业方向、财富来源、发展机遇与挑战。"),
+    ("children", "子女情况", "分析子女缘分、教育方式、亲子关系等。"),
+    ("parents", "父母情况", "分析与父母的关系、对父母的影响等。"),
+    ("health", "身体健康", "分析体质特点、易患疾病、保健养生建议。"),
+    ("education", "学业", "分析学习能力、适合的学习领域、学业发展建议。"),
+    ("social", "人际关系", "分析社交特点、人际关系模式、贵人特征等。"),
+    ("future", "近五年运势", "详细分析未来五年的运势变化、机遇与挑战。"),
+    ("lifePlan", "人生规划建议", "结合以上分析，为命主提供具体的人生规划建议。"),
+)
+
+# 各部分分析依赖的命盘部件（见 bazi_calculator.CHART_COMPONENTS），修改出生信息后只重新生成
+# 依赖部件有变化的部分。四柱换了日主时各柱十神都会变化，所有依赖四柱的部分都会重新生成
+ANALYSIS_SECTION_DEPENDENCIES = {
+    "coreAnalysis": ("yearPillar", "monthPillar", "dayPillar", "hourPillar", "fiveElementStrength"),
+    "fiveElements": ("fiveElements", "fiveElementStrength"),
+    "shenShaAnalysis": ("shenSha",),
+    "keyPoints": ("daYun", "flowingYears"),
+    "relationship": ("dayPillar",),
+    "career": ("monthPillar", "fiveElementStrength"),
+    "children": ("hourPillar",),
+    "parents": ("yearPillar", "monthPillar"),
+    "health": ("fiveElements", "fiveElementStrength"),
+    "education": ("monthPillar", "hourPillar"),
+    "social": ("yearPillar", "dayPillar"),
+    "future": ("daYun", "flowingYears"),
+    "lifePlan": ("daYun", "hourPillar"),
+}
+
+def sections_affected_by(chart_diff):
+    """
+    命盘变化后需要重新生成的分析部分
+
+    Args:
+        chart_diff: bazi_calculator.diff_bazi_charts 的结果
+
+    Returns:
+        list: 字段名，按 ANALYSIS_SECTIONS 的顺序
+    """
+    return [key for key, _, _ in ANALYSIS_SECTIONS
+            if any(component in chart_diff for component in ANALYSIS_SECTION_DEPENDENCIES[key])]
+
+def format_analysis_request(sections=None, indent="        "):
+    """
+    提示词中要求分析的内容和返回格式
+
+    Args:
+        sections: 只分析这些部分（字段名列表），为 None 时分析全部
+        indent: 缩进，与所在提示词对齐
+
+    Returns:
+        str: 多行文本
+    """
+    selected = [section for section in ANALYSIS_SECTIONS if sections is None or section[0] in sections]
+    lines = ["请从八字命理的角度进行全面专业的分析，包括以下内容：" if sections is None
+             else "出生信息已修改，请从八字命理的角度只重新分析以下内容：", ""]
+    for i, (_, title, requirement) in enumerate(selected, 1):
+        lines.append(f"{i}. {title}：{requirement}")
+    lines += ["", "请确保分析专业、全面且易于理解。将分析结果按以下格式返回：", ""]
+    for _, title, _ in selected:
+        lines += [f"### {title}", "[分析内容]", ""]
+    return f"\n{indent}".join(lines).rstrip()
+
+def format_section_request(section, indent="        "):
+    """
+    并发生成时单个部分的分析要求和返回格式
+
+    Args:
+        section: ANALYSIS_SECTIONS 中的字段名
+        indent: 缩进，与所在提示词对齐
+
+    Returns:
+        str: 多行文本
+    """
+    _, title, requirement = next(item for item in ANALYSIS_SECTIONS if item[0] == section)
+    lines = ["请从八字命理的角度只分析以下一项内容（其他方面另行分析，无需涉及）：", "",
+             f"{title}：{requirement}", "",
+             "请确保分析专业、全面且易于理解。将分析结果按以下格式返回：", "",
+             f"### {title}", "[分析内容]"]
+    return f"\n{indent}".join(lines)
+
 def format_prompt(bazi_data, gender, birth_time, focus_area):
     """
     格式化提示词
@@ -424,7 +586,8 @@ def format_prompt(bazi_data, gender, birth_time, focus_area):
         wood=wood,
         water=water,
         fire=fire,
-        earth=earth
+        earth=earth,
+        five_element_strength=format_five_element_strength(bazi_data)
     )
     
     # 添加流年信息
@@ -448,17 +611,17 @@ def call_openai_api(prompt):
         str: AI响应
     """
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        result = llm_client.get_client().post_json(OPENAI_API_URL, {
+            "model": "gpt-3.5-turbo",
+            "messages": [
                 {"role": "system", "content": "你是一位专业的命理分析师，精通八字命理理论。请根据用户提供的八字信息，给出专业、详细、实用的分析和建议。"},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
-            max_tokens=1500
-        )
+            "temperature": 0.7,
+            "max_tokens": 1500
+        }, api_key=OPENAI_API_KEY)
         
-        return response.choices[0].message.content
+        return result["choices"][0]["message"]["content"]
     
     except Exception as e:
         logger.exception(f"调用OpenAI API异常: {str(e)}")
@@ -492,12 +655,160 @@ def clean_markdown_symbols(text):
     
     return text
 
-def call_deepseek_api(prompt):
+def _build_deepseek_request(prompt, max_tokens=1500):
+    """
+    构造DeepSeek请求：从提示词中提取出生年份和流年，补充当前年份、年龄相关的系统提示
+    
+    Args:
+        prompt: 提示词
+        max_tokens: 生成的最大 token 数
+        
+    Returns:
+        tuple: (请求体, 提示词中的流年 [(年份, 天干, 地支)], 当前年份)
+    """
+    # 提取出生年份
+    birth_year = None
+    try:
+        # 尝试多种方式提取出生年份
+        # 使用正则表达式提取出生年份，更加可靠
+        import re
+        # 首先尝试匹配"阳历xxxx年"格式
+        year_match = re.search(r'阳历(\d{4})年', prompt)
+        if year_match:
+            birth_year = int(year_match.group(1))
+            logging.info(f"从'阳历xxxx年'格式提取出生年份: {birth_year}")
+        # 尝试匹配{birth_year}年或{solar_year}年格式
+        elif re.search(r'出生日期：(\d{4})年', prompt):
+            year_match = re.search(r'出生日期：(\d{4})年', prompt)
+            birth_year = int(year_match.group(1))
+            logging.info(f"从'出生日期：xxxx年'格式提取出生年份: {birth_year}")
+        # 尝试匹配其他格式的年份
+        elif "solar_year=" in prompt or "birth_year=" in prompt:
+            # 处理格式化字符串中的占位符
+            for prefix in ["solar_year=", "birth_year="]:
+                if prefix in prompt:
+                    start_index = prompt.index(prefix) + len(prefix)
+                    end_index = prompt.find(",", start_index)
+                    if end_index == -1:
+                        end_index = prompt.find("}", start_index)
+                    if end_index > start_index:
+                        birth_year = int(prompt[start_index:end_index])
+                        logging.info(f"从'{prefix}'格式提取出生年份: {birth_year}")
+                        break
+        # 最后尝试匹配任何4位数年份
+        elif re.search(r'\d{4}年', prompt):
+            year_matches = re.findall(r'(\d{4})年', prompt)
+            if year_matches:
+                # 假设第一个出现的年份是出生年份
+                birth_year = int(year_matches[0])
+                logging.info(f"从正则匹配提取可能的出生年份: {birth_year}")
+    except Exception as e:
+        logging.warning(f"无法提取出生年份: {e}")
+    
+    # 计算当前年龄
+    current_year = datetime.now().year
+    age = current_year - birth_year if birth_year else None
+    
+    # 记录年龄信息
+    if age is not None:
+        if birth_year > current_year:
+            logging.info(f"检测到未来出生年份: {birth_year}，当前年龄将为负数: {age}")
+        else:
+            logging.info(f"出生年份: {birth_year}, 当前年龄: {age}岁")
+    
+    # 提取流年信息
+    flowing_years = []
+    try:
+        if "流年信息：" in prompt:
+            import re
+            # 匹配格式如 "2025年: 乙巳"
+            flowing_year_pattern = r'(\d{4})年: ([甲乙丙丁戊己庚辛壬癸])([子丑寅卯辰巳午未申酉戌亥])'
+            flowing_years = re.findall(flowing_year_pattern, prompt)
+            logging.info(f"提取到流年信息: {flowing_years}")
+    except Exception as e:
+        logging.warning(f"提取流年信息失败: {e}")
+    
+    # 添加年龄相关上下文
+    system_prompt = "你是一位专业的命理分析师，精通八字命理理论。请根据用户提供的八字信息，给出专业、详细、实用的分析和建议。"
+    
+    # 添加当前年份信息
+    system_prompt += f"\n\n重要说明：当前年份是{current_year}年，请确保在分析中使用正确的年份信息。"
+    
+    # 添加明确的年份干支对照表
+    system_prompt += "\n\n年份与天干地支对照表（2020-2030）："
+    system_prompt += "\n2020年 - 庚子年"
+    system_prompt += "\n2021年 - 辛丑年"
+    system_prompt += "\n2022年 - 壬寅年"
+    system_prompt += "\n2023年 - 癸卯年"
+    system_prompt += "\n2024年 - 甲辰年"
+    system_prompt += "\n2025年 - 乙巳年（注意：2025年是乙巳年，不是乙丑年）"
+    system_prompt += "\n2026年 - 丙午年"
+    system_prompt += "\n2027年 - 丁未年"
+    system_prompt += "\n2028年 - 戊申年"
+    system_prompt += "\n2029年 - 己酉年"
+    system_prompt += "\n2030年 - 庚戌年"
+    system_prompt += "\n请在分析中严格遵循上述对照表。"
+    
+    # 添加流年提示
+    if flowing_years:
+        system_prompt += f"\n\n在分析中，请严格使用提示中提供的流年信息，不要自行计算流年。特别注意{current_year}年的天干地支。"
+    
+    # 明确添加年龄信息
+    if age is not None:
+        age_str = f"{age}岁" if age >= 0 else f"未出生，将于{birth_year}年出生"
+        system_prompt += f"\n\n重要提示：当事人当前年龄为{age_str}（出生年份{birth_year}年），请在分析时明确考虑这一点。"
+        
+        # 添加年龄相关指导
+        system_prompt += "\n\n分析时必须考虑当事人的实际年龄。"
+        
+        if birth_year > current_year:  # 未出生（未来出生日期）
+            system_prompt += f"当事人尚未出生，出生于未来的{birth_year}年。请只分析未来可能的性格特点、天赋才能和健康状况，不要分析婚姻感情、学业情况或职业发展等不适合婴幼儿的内容。"
+            logging.info(f"检测到未来出生日期: {birth_year}年，调整分析内容")
+        elif age < 6:  # 婴幼儿
+            system_prompt += f"当事人目前仅{age}岁，属于婴幼儿阶段。请重点分析性格特点、天赋才能和健康状况，不要分析婚姻感情、学业情况或职业发展等不适合婴幼儿的内容。如果需要提到这些方面，请明确指出这是未来特定年龄段（如20岁以后）的预测。"
+            logging.info(f"检测到婴幼儿: {age}岁，调整分析内容")
+        elif age < 18:  # 未成年
+            system_prompt += f"当事人目前{age}岁，尚未成年。请重点分析性格特点、天赋才能、健康状况和学业发展，避免过多讨论婚姻感情等不适合未成年人的内容。如果需要提到这些方面，请明确指出这是未来特定年龄段的预测。"
+            logging.info(f"检测到未成年人: {age}岁，调整分析内容")
+    
+    data = {
+        "model": "deepseek-chat",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": max_tokens
+    }
+    
+    # 记录API请求
+    logger.info(f"发送请求到DeepSeek API，系统提示长度: {len(system_prompt)} 字符")
+    logger.info(f"系统提示前100字符: {system_prompt[:100]}...")
+    return data, flowing_years, current_year
+
+def _correct_flowing_years(content, flowing_years, current_year):
+    """修正AI返回内容中当前年份的错误干支"""
+    if flowing_years and current_year:
+        for year_str, stem, branch in flowing_years:
+            year = int(year_str)
+            if year == current_year:
+                correct_ganzhi = f"{stem}{branch}"
+                wrong_patterns = [
+                    rf"{year}年[^{stem}{branch}]{{2}}",  # 2025年乙丑
+                    rf"{year}.*?[甲乙丙丁戊己庚辛壬癸][子丑寅卯辰巳午未申酉戌亥](?!{stem}{branch})"  # 2025...乙丑
+                ]
+                import re
+                for pattern in wrong_patterns:
+                    content = re.sub(pattern, f"{year}年{correct_ganzhi}", content)
+    return content
+
+def call_deepseek_api(prompt, max_tokens=1500):
     """
     调用DeepSeek API
     
     Args:
         prompt: 提示词
+        max_tokens: 生成的最大 token 数
         
     Returns:
         str: AI响应
@@ -508,142 +819,18 @@ def call_deepseek_api(prompt):
         logger.info(f"请求提示词长度: {len(prompt)} 字符")
         logger.info(f"提示词前100字符: {prompt[:100]}...")
         
-        # 提取出生年份
-        birth_year = None
-        try:
-            # 尝试多种方式提取出生年份
-            # 使用正则表达式提取出生年份，更加可靠
-            import re
-            # 首先尝试匹配"阳历xxxx年"格式
-            year_match = re.search(r'阳历(\d{4})年', prompt)
-            if year_match:
-                birth_year = int(year_match.group(1))
-                logging.info(f"从'阳历xxxx年'格式提取出生年份: {birth_year}")
-            # 尝试匹配{birth_year}年或{solar_year}年格式
-            elif re.search(r'出生日期：(\d{4})年', prompt):
-                year_match = re.search(r'出生日期：(\d{4})年', prompt)
-                birth_year = int(year_match.group(1))
-                logging.info(f"从'出生日期：xxxx年'格式提取出生年份: {birth_year}")
-            # 尝试匹配其他格式的年份
-            elif "solar_year=" in prompt or "birth_year=" in prompt:
-                # 处理格式化字符串中的占位符
-                for prefix in ["solar_year=", "birth_year="]:
-                    if prefix in prompt:
-                        start_index = prompt.index(prefix) + len(prefix)
-                        end_index = prompt.find(",", start_index)
-                        if end_index == -1:
-                            end_index = prompt.find("}", start_index)
-                        if end_index > start_index:
-                            birth_year = int(prompt[start_index:end_index])
-                            logging.info(f"从'{prefix}'格式提取出生年份: {birth_year}")
-                            break
-            # 最后尝试匹配任何4位数年份
-            elif re.search(r'\d{4}年', prompt):
-                year_matches = re.findall(r'(\d{4})年', prompt)
-                if year_matches:
-                    # 假设第一个出现的年份是出生年份
-                    birth_year = int(year_matches[0])
-                    logging.info(f"从正则匹配提取可能的出生年份: {birth_year}")
-        except Exception as e:
-            logging.warning(f"无法提取出生年份: {e}")
-        
-        # 计算当前年龄
-        current_year = datetime.now().year
-        age = current_year - birth_year if birth_year else None
-        
-        # 记录年龄信息
-        if age is not None:
-            if birth_year > current_year:
-                logging.info(f"检测到未来出生年份: {birth_year}，当前年龄将为负数: {age}")
-            else:
-                logging.info(f"出生年份: {birth_year}, 当前年龄: {age}岁")
-        
-        # 提取流年信息
-        flowing_years = []
-        try:
-            if "流年信息：" in prompt:
-                import re
-                # 匹配格式如 "2025年: 乙巳"
-                flowing_year_pattern = r'(\d{4})年: ([甲乙丙丁戊己庚辛壬癸])([子丑寅卯辰巳午未申酉戌亥])'
-                flowing_years = re.findall(flowing_year_pattern, prompt)
-                logging.info(f"提取到流年信息: {flowing_years}")
-        except Exception as e:
-            logging.warning(f"提取流年信息失败: {e}")
-        
-        # 添加年龄相关上下文
-        system_prompt = "你是一位专业的命理分析师，精通八字命理理论。请根据用户提供的八字信息，给出专业、详细、实用的分析和建议。"
-        
-        # 添加当前年份信息
-        system_prompt += f"\n\n重要说明：当前年份是{current_year}年，请确保在分析中使用正确的年份信息。"
-        
-        # 添加明确的年份干支对照表
-        system_prompt += "\n\n年份与天干地支对照表（2020-2030）："
-        system_prompt += "\n2020年 - 庚子年"
-        system_prompt += "\n2021年 - 辛丑年"
-        system_prompt += "\n2022年 - 壬寅年"
-        system_prompt += "\n2023年 - 癸卯年"
-        system_prompt += "\n2024年 - 甲辰年"
-        system_prompt += "\n2025年 - 乙巳年（注意：2025年是乙巳年，不是乙丑年）"
-        system_prompt += "\n2026年 - 丙午年"
-        system_prompt += "\n2027年 - 丁未年"
-        system_prompt += "\n2028年 - 戊申年"
-        system_prompt += "\n2029年 - 己酉年"
-        system_prompt += "\n2030年 - 庚戌年"
-        system_prompt += "\n请在分析中严格遵循上述对照表。"
-        
-        # 添加流年提示
-        if flowing_years:
-            system_prompt += f"\n\n在分析中，请严格使用提示中提供的流年信息，不要自行计算流年。特别注意{current_year}年的天干地支。"
-        
-        # 明确添加年龄信息
-        if age is not None:
-            age_str = f"{age}岁" if age >= 0 else f"未出生，将于{birth_year}年出生"
-            system_prompt += f"\n\n重要提示：当事人当前年龄为{age_str}（出生年份{birth_year}年），请在分析时明确考虑这一点。"
-            
-            # 添加年龄相关指导
-            system_prompt += "\n\n分析时必须考虑当事人的实际年龄。"
-            
-            if birth_year > current_year:  # 未出生（未来出生日期）
-                system_prompt += f"当事人尚未出生，出生于未来的{birth_year}年。请只分析未来可能的性格特点、天赋才能和健康状况，不要分析婚姻感情、学业情况或职业发展等不适合婴幼儿的内容。"
-                logging.info(f"检测到未来出生日期: {birth_year}年，调整分析内容")
-            elif age < 6:  # 婴幼儿
-                system_prompt += f"当事人目前仅{age}岁，属于婴幼儿阶段。请重点分析性格特点、天赋才能和健康状况，不要分析婚姻感情、学业情况或职业发展等不适合婴幼儿的内容。如果需要提到这些方面，请明确指出这是未来特定年龄段（如20岁以后）的预测。"
-                logging.info(f"检测到婴幼儿: {age}岁，调整分析内容")
-            elif age < 18:  # 未成年
-                system_prompt += f"当事人目前{age}岁，尚未成年。请重点分析性格特点、天赋才能、健康状况和学业发展，避免过多讨论婚姻感情等不适合未成年人的内容。如果需要提到这些方面，请明确指出这是未来特定年龄段的预测。"
-                logging.info(f"检测到未成年人: {age}岁，调整分析内容")
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1500
-        }
-        
-        # 记录API请求
-        logger.info(f"发送请求到DeepSeek API，系统提示长度: {len(system_prompt)} 字符")
-        logger.info(f"系统提示前100字符: {system_prompt[:100]}...")
+        data, flowing_years, current_year = _build_deepseek_request(prompt, max_tokens)
         
         # 发送请求并记录时间
         start_time = datetime.now()
         logger.info(f"开始API请求时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=data)
+        result = llm_client.get_client().post_json(DEEPSEEK_API_URL, data, api_key=DEEPSEEK_API_KEY)
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         logger.info(f"API请求完成，耗时: {duration:.2f}秒")
         
-        result = response.json()
-        
         # 记录API响应
         logger.info(f"收到DeepSeek API响应: {result}")
         
@@ -662,18 +849,7 @@ def call_deepseek_api(prompt):
                     logger.info(f"内容片段 {i+1}/{len(chunks)}: {chunk}")
             
             # 检查内容中是否有错误的流年信息，如果有则修正
-            if flowing_years and current_year:
-                for year_str, stem, branch in flowing_years:
-                    year = int(year_str)
-                    if year == current_year:
-                        correct_ganzhi = f"{stem}{branch}"
-                        wrong_patterns = [
-                            rf"{year}年[^{stem}{branch}]{{2}}",  # 2025年乙丑
-                            rf"{year}.*?[甲乙丙丁戊己庚辛壬癸][子丑寅卯辰巳午未申酉戌亥](?!{stem}{branch})"  # 2025...乙丑
-                        ]
-                        import re
-                        for pattern in wrong_patterns:
-                            content = re.sub(pattern, f"{year}年{correct_ganzhi}", content)
+            content = _correct_flowing_years(content, flowing_years, current_year)
             
             # 保留原始Markdown格式，不在此处清理，以便提取函数能正确识别标题
             logger.info("保留内容中的Markdown格式，用于后续分析提取")
@@ -687,68 +863,212 @@ def call_deepseek_api(prompt):
         logger.exception(f"调用DeepSeek API异常: {str(e)}")
         return None
 
-def generate_bazi_analysis(bazi_chart, gender):
+def cached_response(fingerprint, area, compute, **options):
     """
-    生成八字分析结果
+    经 analysis_cache 取大模型回答：命盘指纹相同的分析复用缓存，并发的相同请求只调用一次
     
     Args:
-        bazi_chart: 八字命盘数据
-        gender: 性别
+        fingerprint: analysis_fingerprint 的结果，为 None 时不缓存，直接调用
+        area: 分析范围，如 "full"、部分字段名列表 "children,lifePlan"
+        compute: 未命中时调用的无参函数，返回回答，失败时返回 None
+        options: 其他影响回答的请求参数（如 max_tokens），一并计入缓存键
         
     Returns:
-        dict: 分析结果
+        str: 回答，失败时返回 None
     """
-    try:
-        logger.info("开始生成八字分析")
-        
-        # 转换性别为中文
-        if gender == 'male' or gender == '男':
-            gender_cn = '男'
-        elif gender == 'female' or gender == '女':
-            gender_cn = '女'
-        else:
-            gender_cn = '男'  # 默认值
-            
-        logger.info(f"性别转换: {gender} -> {gender_cn}")
-        logger.info(f"输入数据: 性别={gender_cn}, 八字数据=四柱信息+五行分布")
-        
-        # 提取八字数据
-        year_pillar = bazi_chart['yearPillar']
-        month_pillar = bazi_chart['monthPillar']
-        day_pillar = bazi_chart['dayPillar']
-        hour_pillar = bazi_chart['hourPillar']
-        five_elements = bazi_chart['fiveElements']
-        
-        # 记录八字数据
-        logger.info(f"八字四柱: 年柱={year_pillar['heavenlyStem']}{year_pillar['earthlyBranch']}, "
-                  f"月柱={month_pillar['heavenlyStem']}{month_pillar['earthlyBranch']}, "
-                  f"日柱={day_pillar['heavenlyStem']}{day_pillar['earthlyBranch']}, "
-                  f"时柱={hour_pillar['heavenlyStem']}{hour_pillar['earthlyBranch']}")
-        logger.info(f"五行分布: 金={five_elements['metal']}, 木={five_elements['wood']}, "
-                  f"水={five_elements['water']}, 火={five_elements['fire']}, 土={five_elements['earth']}")
+    if fingerprint is None:
+        return compute()
+    key = analysis_cache.make_key(fingerprint, area, ANALYSIS_PROMPT_VERSION, **options)
+    return analysis_cache.get_or_compute(key, compute)
+
+class SectionStreamParser:
+    """
+    从流式返回的文本中逐个切出 ### 标题下的分析部分
+    
+    feed 传入新收到的文本片段，返回其中已经结束的部分（收到下一个 ### 标题即认为上一部分结束）；
+    finish 在流结束时返回最后一部分。内容按 extract_analysis_from_text 的方式整理：
+    去掉空行和整行的方括号，清理 Markdown 符号。
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._section = None
+        self._lines = []
+    
+    def _close(self):
+        section = None
+        if self._section and self._lines:
+            section = (self._section, clean_markdown_symbols('\n'.join(self._lines)))
+        self._section, self._lines = None, []
+        return section
+    
+    def _push_line(self, line):
+        line = line.strip()
+        if line.startswith('###'):
+            section = self._close()
+            self._section = map_section_name(line.lstrip('#').strip())
+            return section
+        if self._section and line:
+            if line.startswith('[') and line.endswith(']'):
+                line = line[1:-1]
+            self._lines.append(line)
+        return None
+    
+    def feed(self, text):
+        """
+        Returns:
+            list: 已结束的部分 [(字段名, 内容)]
+        """
+        *lines, self._buffer = (self._buffer + text).split('\n')
+        return [section for section in map(self._push_line, lines) if section]
+    
+    def finish(self):
+        """
+        Returns:
+            tuple: 最后一部分 (字段名, 内容)，没有时返回 None
+        """
+        section = self._push_line(self._buffer)
+        self._buffer = ""
+        return section or self._close()
+
+def stream_deepseek_api(prompt, on_section):
+    """
+    以流式（stream: true）调用DeepSeek API，每个 ### 部分一结束就回调 on_section
+    
+    Args:
+        prompt: 提示词
+        on_section: 回调 on_section(字段名, 内容)，回调出错只记录日志，不中断生成
         
-        # 获取神煞、大运、流年信息
-        shen_sha = bazi_chart.get('shenSha', {})
-        da_yun = bazi_chart.get('daYun', {})
-        flowing_years = bazi_chart.get('flowingYears', [])
+    Returns:
+        str: 完整响应，与 call_deepseek_api 的返回值相同；调用失败时返回 None
+    """
+    try:
+        logger.info(f"开始流式调用DeepSeek API，提示词长度: {len(prompt)} 字符")
+        data, flowing_years, current_year = _build_deepseek_request(prompt)
+        data["stream"] = True
         
-        # 获取出生日期信息
-        birth_date = bazi_chart.get('birthDate', '')
-        birth_time = bazi_chart.get('birthTime', '')
+        start_time = time.monotonic()
+        parser = SectionStreamParser()
+        chunks = []
         
-        # 计算年龄
-        current_year = 2025  # 当前年份
-        birth_year = int(birth_date.split('-')[0]) if birth_date and '-' in birth_date else 0
-        age = current_year - birth_year if birth_year > 0 else 0
+        def emit(section):
+            key, content = section
+            logger.info(f"流式分析部分完成: {key}，{time.monotonic() - start_time:.2f}秒，{len(content)} 字符")
+            try:
+                on_section(key, _correct_flowing_years(content, flowing_years, current_year))
+            except Exception as e:
+                logger.error(f"处理流式分析部分 {key} 失败: {str(e)}")
+        
+        for event in llm_client.get_client().stream_events(DEEPSEEK_API_URL, data, api_key=DEEPSEEK_API_KEY):
+            choices = event.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                chunks.append(delta)
+                for section in parser.feed(delta):
+                    emit(section)
+        last = parser.finish()
+        if last:
+            emit(last)
+        
+        content = "".join(chunks)
+        logger.info(f"流式响应完成，耗时: {time.monotonic() - start_time:.2f}秒，内容长度: {len(content)} 字符")
+        if not content:
+            logger.error("DeepSeek API流式响应为空")
+            return None
+        return _correct_flowing_years(content, flowing_years, current_year)
+    
+    except Exception as e:
+        logger.exception(f"流式调用DeepSeek API异常: {str(e)}")
+        return None
+
+def analysis_birth_year(bazi_chart):
+    """
+    命盘的出生年份：优先取 birthDate，calculate_bazi 的结果中没有时由起运年份减起运年龄得出
+    
+    Returns:
+        int: 出生年份，无法得出时返回 None
+    """
+    try:
+        return parse_birth_datetime(bazi_chart.get('birthDate') or '', require_time=False).year
+    except BirthDateTimeError:
+        pass
+    da_yun = bazi_chart.get('daYun') or {}
+    if isinstance(da_yun.get('startYear'), int) and isinstance(da_yun.get('startAge'), int):
+        return da_yun['startYear'] - da_yun['startAge']
+    return None
+
+def age_bracket(age):
+    """年龄段，与 DeepSeek 系统提示中按年龄调整分析内容的划分一致"""
+    if age < 0:
+        return "unborn"
+    if age < 6:
+        return "infant"
+    if age < 18:
+        return "minor"
+    return "adult"
+
+def analysis_fingerprint(bazi_chart, gender_cn):
+    """
+    完整分析的命盘指纹，analysis_cache 的缓存键由它和分析范围、模板版本、当前年份组成
+    
+    format_analysis_prompt 的提示词完全由指纹决定：四柱（五行、神煞随之确定）、出生年份
+    （流年年龄）、起运年龄和顺逆、性别和年龄段。出生日期、分钟、出生地不同而指纹相同的命盘共用回答。
+    
+    Returns:
+        str: 如 "1990:四柱编码:7+:男:adult"，四柱不完整时返回 None
+    """
+    code = chart_code_from_dict(bazi_chart)
+    if code is None:
+        return None
+    birth_year = analysis_birth_year(bazi_chart)
+    age = datetime.now().year - birth_year if birth_year else 0
+    da_yun = bazi_chart.get('daYun') or {}
+    direction = "+" if da_yun.get('isForward', True) else "-"
+    return f"{birth_year}:{code}:{da_yun.get('startAge')}{direction}:{gender_cn}:{age_bracket(age)}"
+
+def format_analysis_prompt(bazi_chart, gender_cn, analysis_request):
+    """
+    完整分析的提示词：命盘数据加上要求分析的内容
+    
+    Args:
+        bazi_chart: 八字命盘数据
+        gender_cn: 性别（'男'或'女'）
+        analysis_request: format_analysis_request 或 format_section_request 的结果
         
-        # 构建提示词
-        prompt = f"""
+    Returns:
+        str: 提示词
+    """
+    # 提取八字数据
+    year_pillar = bazi_chart['yearPillar']
+    month_pillar = bazi_chart['monthPillar']
+    day_pillar = bazi_chart['dayPillar']
+    hour_pillar = bazi_chart['hourPillar']
+    five_elements = bazi_chart['fiveElements']
+    
+    # 记录八字数据
+    logger.info(f"八字四柱: 年柱={year_pillar['heavenlyStem']}{year_pillar['earthlyBranch']}, "
+              f"月柱={month_pillar['heavenlyStem']}{month_pillar['earthlyBranch']}, "
+              f"日柱={day_pillar['heavenlyStem']}{day_pillar['earthlyBranch']}, "
+              f"时柱={hour_pillar['heavenlyStem']}{hour_pillar['earthlyBranch']}")
+    logger.info(f"五行分布: 金={five_elements['metal']}, 木={five_elements['wood']}, "
+              f"水={five_elements['water']}, 火={five_elements['fire']}, 土={five_elements['earth']}")
+    
+    # 获取神煞、大运、流年信息
+    shen_sha = bazi_chart.get('shenSha', {})
+    da_yun = bazi_chart.get('daYun', {})
+    flowing_years = bazi_chart.get('flowingYears', [])
+    
+    # 出生年份和年龄；不写入具体的出生日期和时间（四柱已包含），提示词只由命盘指纹决定，可以缓存复用
+    birth_year = analysis_birth_year(bazi_chart)
+    age = datetime.now().year - birth_year if birth_year else 0
+    
+    # 构建提示词
+    prompt = f"""
         请作为一名专业的命理师，基于以下八字命盘数据，进行全面的人生分析和指导。
         
         八字基本信息：
         性别：{gender_cn}
-        出生日期：{birth_date}
-        出生时间：{birth_time}
+        出生年份：{birth_year or '未知'}年
         当前年龄：{age}岁
         
         八字命盘：
@@ -764,6 +1084,9 @@ def generate_bazi_analysis(bazi_chart, gender):
         火：{five_elements['fire']}
         土：{five_elements['earth']}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）：
+        {format_five_element_strength(bazi_chart)}
+        
         神煞信息：
         日冲：{shen_sha.get('dayChong', '无')}
         值神：{shen_sha.get('zhiShen', '无')}
@@ -781,74 +1104,114 @@ def generate_bazi_analysis(bazi_chart, gender):
         流年信息：
         {', '.join([f"{year.get('year', '')}年({year.get('age', '')}岁) {year.get('heavenlyStem', '')}{year.get('earthlyBranch', '')}" for year in flowing_years[:5]]) if flowing_years else '无'}
         
-        请从八字命理的角度进行全面专业的分析，包括以下内容：
-        
-        一、八字命局核心分析
-        分析八字四柱的组合特点、日主旺衰、格局类型、命局核心特征，以及对人生的整体影响。
-        
-        二、五行旺衰与用神
-        详细分析五行的旺衰状态，确定用神、忌神，并解释它们对人生各方面的影响。
-        
-        三、神煞解析
-        解读命盘中的重要神煞，分析其对命主各方面运势的具体影响。
-        
-        四、大运与流年关键节点
-        分析当前及未来大运、流年的特点，指出人生关键转折点和需要注意的时期。
-        
-        五、人生规划建议
-        结合以上分析，为命主提供具体的人生规划建议。
-        
-        六、八个核心领域分析
-        1. 婚姻感情：分析感情特点、婚姻状况、配偶特征，以及相关吉凶。
-        2. 事业财运：分析适合的事业方向、财富来源、发展机遇与挑战。
-        3. 子女情况：分析子女缘分、教育方式、亲子关系等。
-        4. 父母情况：分析与父母的关系、对父母的影响等。
-        5. 身体健康：分析体质特点、易患疾病、保健养生建议。
-        6. 学业：分析学习能力、适合的学习领域、学业发展建议。
-        7. 人际关系：分析社交特点、人际关系模式、贵人特征等。
-        8. 近五年运势：详细分析未来五年的运势变化、机遇与挑战。
-        
-        请确保分析专业、全面且易于理解。将分析结果按以下格式返回：
-        
-        ### 八字命局核心分析
-        [分析内容]
-        
-        ### 五行旺衰与用神
-        [分析内容]
-        
-        ### 神煞解析
-        [分析内容]
-        
-        ### 大运与流年关键节点
-        [分析内容]
-        
-        ### 婚姻感情
-        [分析内容]
-        
-        ### 事业财运
-        [分析内容]
-        
-        ### 子女情况
-        [分析内容]
-        
-        ### 父母情况
-        [分析内容]
+        {analysis_request}
+        """
+    return prompt
+
+def _extract_section(section, response):
+    """从单个部分的响应中取出内容；模型没有按要求写标题时整段作为该部分"""
+    parser = SectionStreamParser()
+    parsed = dict(parser.feed(response))
+    last = parser.finish()
+    if last:
+        parsed[last[0]] = last[1]
+    if section in parsed:
+        return parsed[section]
+    if len(parsed) == 1:
+        return next(iter(parsed.values()))
+    return clean_markdown_symbols(response.strip().strip('[]'))
+
+def generate_analysis_sections(bazi_chart, gender_cn, sections=None, on_section=None):
+    """
+    每个部分单独一个提示词，并发生成
+    
+    各部分互不等待，整体耗时接近最慢的一个部分，也不再受整篇 1500 token 的限制而被截断。
+    并发数不超过 ANALYSIS_PARALLEL_WORKERS，所有进程内调用还共同受 llm_client 的并发上限约束。
+    
+    Args:
+        bazi_chart: 八字命盘数据
+        gender_cn: 性别（'男'或'女'）
+        sections: 只生成这些部分，为 None 时生成全部
+        on_section: 每个部分生成完就回调 on_section(字段名, 内容)，回调在调用线程中依次执行
         
-        ### 身体健康
-        [分析内容]
+    Returns:
+        tuple: (分析结果 {字段名: 内容}，只含生成成功的部分；
+                各部分状态 {字段名: 'completed' 或 'failed'})，均按 ANALYSIS_SECTIONS 的顺序
+    """
+    keys = [key for key, _, _ in ANALYSIS_SECTIONS if sections is None or key in sections]
+    fingerprint = analysis_fingerprint(bazi_chart, gender_cn)
+    
+    def generate(key):
+        prompt = format_analysis_prompt(bazi_chart, gender_cn, format_section_request(key))
+        response = cached_response(fingerprint, key,
+                                   lambda: call_deepseek_api(prompt, max_tokens=ANALYSIS_SECTION_MAX_TOKENS),
+                                   max_tokens=ANALYSIS_SECTION_MAX_TOKENS)
+        return _extract_section(key, response) if response else None
+    
+    start_time = time.monotonic()
+    generated = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(ANALYSIS_PARALLEL_WORKERS, len(keys))),
+                            thread_name_prefix="analysis-section") as executor:
+        futures = {executor.submit(generate, key): key for key in keys}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                content = future.result()
+            except Exception as e:
+                logger.error(f"生成分析部分 {key} 失败: {str(e)}")
+                content = None
+            if not content:
+                logger.warning(f"分析部分 {key} 生成失败")
+                continue
+            logger.info(f"分析部分完成: {key}，{time.monotonic() - start_time:.2f}秒，{len(content)} 字符")
+            generated[key] = content
+            if on_section is not None:
+                try:
+                    on_section(key, content)
+                except Exception as e:
+                    logger.error(f"处理分析部分 {key} 失败: {str(e)}")
+    
+    logger.info(f"并发分析完成，{len(generated)}/{len(keys)} 个部分成功，耗时: {time.monotonic() - start_time:.2f}秒")
+    analysis = {key: generated[key] for key in keys if key in generated}
+    return analysis, {key: 'completed' if key in generated else 'failed' for key in keys}
+
+def generate_bazi_analysis(bazi_chart, gender, sections=None, on_section=None, parallel=None):
+    """
+    生成八字分析结果
+    
+    Args:
+        bazi_chart: 八字命盘数据
+        gender: 性别
+        sections: 只生成这些部分（ANALYSIS_SECTIONS 中的字段名），为 None 时生成完整分析
+        on_section: 给出且 DEEPSEEK_STREAM 开启时流式调用，每个部分生成完就回调
+            on_section(字段名, 内容)，调用方可以先保存已完成的部分
+        parallel: 是否按部分并发生成（generate_analysis_sections），为 None 时取 ANALYSIS_PARALLEL；
+            并发生成时 on_section 同样逐个回调，生成失败的部分不在结果中
         
-        ### 学业
-        [分析内容]
+    Returns:
+        dict: 分析结果；指定 sections 时只包含这些字段
+    """
+    try:
+        logger.info("开始生成八字分析")
         
-        ### 人际关系
-        [分析内容]
+        # 转换性别为中文
+        if gender == 'male' or gender == '男':
+            gender_cn = '男'
+        elif gender == 'female' or gender == '女':
+            gender_cn = '女'
+        else:
+            gender_cn = '男'  # 默认值
+            
+        logger.info(f"性别转换: {gender} -> {gender_cn}")
+        logger.info(f"输入数据: 性别={gender_cn}, 八字数据=四柱信息+五行分布")
         
-        ### 近五年运势
-        [分析内容]
+        if parallel is None:
+            parallel = ANALYSIS_PARALLEL
+        if parallel:
+            analysis, _ = generate_analysis_sections(bazi_chart, gender_cn, sections, on_section)
+            return analysis
         
-        ### 人生规划建议
-        [分析内容]
-        """
+        prompt = format_analysis_prompt(bazi_chart, gender_cn, format_analysis_request(sections))
         
         # 记录完整提示词
         logger.info(f"生成八字分析的完整提示词:\n{prompt}")
@@ -856,7 +1219,26 @@ def generate_bazi_analysis(bazi_chart, gender):
         # 调用AI接口
         logger.info("开始调用DeepSeek API生成分析...")
         start_time = datetime.now()
-        response = call_deepseek_api(prompt)
+        area = "full" if sections is None else ",".join(sections)
+        fingerprint = analysis_fingerprint(bazi_chart, gender_cn)
+        if on_section is not None and DEEPSEEK_STREAM:
+            def save_section(key, content):
+                if sections is None or key in sections:
+                    on_section(key, content)
+            streamed = []
+            
+            def stream():
+                streamed.append(True)
+                return stream_deepseek_api(prompt, save_section)
+            response = cached_response(fingerprint, area, stream)
+            if response and not streamed:
+                # 命中缓存或等到了相同请求的结果，逐个部分补发回调
+                parser = SectionStreamParser()
+                for section in parser.feed(response) + [parser.finish()]:
+                    if section:
+                        save_section(*section)
+        else:
+            response = cached_response(fingerprint, area, lambda: call_deepseek_api(prompt))
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
@@ -874,6 +1256,8 @@ def generate_bazi_analysis(bazi_chart, gender):
         
         # 解析返回的文本
         analysis = extract_analysis_from_text(response)
+        if sections is not None:
+            analysis = {key: analysis[key] for key in sections if key in analysis}
         
         # 记录提取结果
         logger.info("分析结果提取完成")
@@ -931,26 +1315,9 @@ def generate_followup_analysis(bazi_chart, area, gender, previous_analysis=None)
         # 从birthDate中提取年月日
         if 'birthDate' in bazi_chart and bazi_chart['birthDate']:
             try:
-                birth_date = bazi_chart['birthDate']
-                if isinstance(birth_date, str):
-                    # 尝试解析不同的日期格式
-                    if "-" in birth_date:
-                        parts = birth_date.split("-")
-                        if len(parts) >= 3:
-                            birth_year = int(parts[0])
-                            birth_month = int(parts[1])
-                            birth_day = int(parts[2])
-                    elif "/" in birth_date:
-                        parts = birth_date.split("/")
-                        if len(parts) >= 3:
-                            birth_year = int(parts[0])
-                            birth_month = int(parts[1])
-                            birth_day = int(parts[2])
-                    elif len(birth_date) >= 8:  # 可能是YYYYMMDD格式
-                        birth_year = int(birth_date[:4])
-                        birth_month = int(birth_date[4:6])
-                        birth_day = int(birth_date[6:8])
-            except Exception as e:
+                birth = parse_birth_datetime(bazi_chart['birthDate'], require_time=False)
+                birth_year, birth_month, birth_day = birth.year, birth.month, birth.day
+            except BirthDateTimeError as e:
                 logger.warning(f"从birthDate提取日期失败: {e}")
         
         # 从birthTime中提取时辰
@@ -1051,6 +1418,7 @@ def generate_followup_analysis(bazi_chart, area, gender, previous_analysis=None)
             water=five_elements['water'],
             fire=five_elements['fire'],
             earth=five_elements['earth'],
+            five_element_strength=format_five_element_strength(bazi_chart),
             birth_year=birth_year,
             birth_month=birth_month,
             birth_day=birth_day,
@@ -1064,6 +1432,7 @@ def generate_followup_analysis(bazi_chart, area, gender, previous_analysis=None)
         prompt += f"\n\n请专注于{area}领域的深入分析，提供更具体、实用的建议。请确保分析内容符合被测人的年龄和实际情况。"
         
         # 调用AI接口
+        # 追问提示词含具体出生日期和此前的分析内容，不能按命盘指纹共用回答，不缓存
         response = call_deepseek_api(prompt)
         
         # 检查并格式化返回结果
@@ -1111,6 +1480,9 @@ def analyze_bazi_with_ai(bazi_data):
         火: {bazi_data['fiveElements']['fire']}
         土: {bazi_data['fiveElements']['earth']}
         
+        五行强弱（含藏干，按月令旺相休囚死加权）:
+        {format_five_element_strength(bazi_data)}
+        
         神煞信息:
         日冲: {bazi_data['shenSha']['dayChong']}
         值神: {bazi_data['shenSha']['zhiShen']}
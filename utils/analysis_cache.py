@@ -0,0 +1,227 @@
+"""
+AI 分析响应缓存
+
+命盘指纹相同（出生年份、四柱、起运、性别和年龄段，见 ai_service.analysis_fingerprint）
+且分析范围相同时，完整分析的提示词完全一样，大模型的回答可以直接复用。ai_service 在调用
+大模型前用 make_key 由命盘指纹、分析范围、提示词模板版本和当前年份求出缓存键，
+再经 get_or_compute 取回答：
+
+1. 进程内 LRU（ANALYSIS_CACHE_SIZE 条，0 表示不用）；
+2. 可选的 MongoDB 共享缓存（ANALYSIS_CACHE_MONGO=1 启用），多个进程共用，
+   记录带 expireAt 字段，由 TTL 索引到期自动删除；
+3. 都未命中时调用大模型。同一个键同时只有一个调用在进行（single-flight），
+   并发的相同请求等待这一个调用的结果，不再各自请求一遍。
+
+通过环境变量配置：
+
+- ANALYSIS_CACHE_SIZE：进程内缓存条目上限（默认 512）
+- ANALYSIS_CACHE_TTL：缓存有效秒数（默认 30 天），进程内和 MongoDB 中相同
+- ANALYSIS_CACHE_MONGO：是否启用 MongoDB 共享缓存（默认 0）
+- ANALYSIS_CACHE_COLLECTION：共享缓存集合名（默认 ai_analysis_cache）
+- ANALYSIS_CACHE_WAIT：等待同键调用结果的最长秒数（默认 300），超时后自行调用
+
+调用失败（返回 None 或抛出异常）的结果不缓存。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', '512'))
+ANALYSIS_CACHE_TTL = float(os.getenv('ANALYSIS_CACHE_TTL', str(30 * 24 * 3600)))
+ANALYSIS_CACHE_MONGO = os.getenv('ANALYSIS_CACHE_MONGO', '0') == '1'
+ANALYSIS_CACHE_COLLECTION = os.getenv('ANALYSIS_CACHE_COLLECTION', 'ai_analysis_cache')
+ANALYSIS_CACHE_WAIT = float(os.getenv('ANALYSIS_CACHE_WAIT', '300'))
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_inflight = {}
+_stats = {"hits": 0, "mongoHits": 0, "shared": 0, "misses": 0}
+_collection = None
+
+
+class _Flight:
+    """进行中的一次调用，同键的其他请求等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def make_key(fingerprint, area, version, year=None, **options):
+    """
+    缓存键
+
+    Args:
+        fingerprint: 命盘指纹
+        area: 分析范围（完整分析或部分列表、单个部分）
+        version: 提示词模板版本，修改模板时递增，旧回答随之失效
+        year: 当前年份，为 None 时取今年；跨年后流年、年龄都会变化
+        options: 其他影响回答的请求参数（如 max_tokens）
+
+    Returns:
+        str: 十六进制摘要
+    """
+    payload = json.dumps({
+        "fingerprint": fingerprint,
+        "area": area,
+        "version": version,
+        "year": year or datetime.now().year,
+        "options": options
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_collection():
+    """获取 MongoDB 共享缓存集合，未启用或连接失败时返回 None"""
+    global _collection, ANALYSIS_CACHE_MONGO
+    if not ANALYSIS_CACHE_MONGO:
+        return None
+    if _collection is None:
+        try:
+            from pymongo import MongoClient
+            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/bazi_system')
+            client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+            collection = client.get_database()[ANALYSIS_CACHE_COLLECTION]
+            collection.create_index("expireAt", expireAfterSeconds=0)
+            _collection = collection
+        except Exception as e:
+            logger.error(f"连接AI分析共享缓存失败，已停用共享缓存: {str(e)}")
+            ANALYSIS_CACHE_MONGO = False
+            return None
+    return _collection
+
+
+def _mongo_get(key):
+    collection = _get_collection()
+    if collection is None:
+        return None
+    try:
+        # TTL 索引每分钟才清理一次，过期但未删除的记录不用
+        doc = collection.find_one({"_id": key, "expireAt": {"$gt": datetime.utcnow()}})
+        return doc["response"] if doc else None
+    except Exception as e:
+        logger.warning(f"读取AI分析共享缓存失败: {str(e)}")
+        return None
+
+
+def _mongo_put(key, response):
+    collection = _get_collection()
+    if collection is None:
+        return
+    try:
+        collection.replace_one({"_id": key}, {
+            "_id": key,
+            "response": response,
+            "expireAt": datetime.utcnow() + timedelta(seconds=ANALYSIS_CACHE_TTL)
+        }, upsert=True)
+    except Exception as e:
+        logger.warning(f"写入AI分析共享缓存失败: {str(e)}")
+
+
+def _lookup(key):
+    """进程内缓存查找，调用方持有 _lock"""
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires, response = entry
+    if expires <= time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return response
+
+
+def _remember(key, response):
+    if ANALYSIS_CACHE_SIZE <= 0:
+        return
+    with _lock:
+        _cache[key] = (time.monotonic() + ANALYSIS_CACHE_TTL, response)
+        _cache.move_to_end(key)
+        while len(_cache) > ANALYSIS_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_or_compute(key, compute):
+    """
+    取缓存的回答，未命中时调用 compute() 并缓存
+
+    Args:
+        key: make_key 求出的缓存键
+        compute: 无参函数，返回可 JSON 序列化的回答；返回 None 表示失败，不缓存
+
+    Returns:
+        compute() 的结果（或缓存的回答）
+    """
+    with _lock:
+        response = _lookup(key)
+        if response is not None:
+            _stats["hits"] += 1
+            return response
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(ANALYSIS_CACHE_WAIT):
+            with _lock:
+                _stats["shared"] += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        logger.warning(f"等待相同的AI分析请求超时（{ANALYSIS_CACHE_WAIT}秒），单独调用")
+        return compute()
+
+    try:
+        response = _mongo_get(key)
+        if response is not None:
+            with _lock:
+                _stats["mongoHits"] += 1
+        else:
+            with _lock:
+                _stats["misses"] += 1
+            response = compute()
+            if response is not None:
+                _mongo_put(key, response)
+        if response is not None:
+            _remember(key, response)
+        flight.value = response
+        return response
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+        flight.done.set()
+
+
+def get_cache_stats():
+    """
+    获取缓存命中统计
+
+    Returns:
+        dict: hits（进程内命中）、mongoHits（共享缓存命中）、shared（等待同键调用的结果）、
+              misses（调用大模型）、size（进程内条目数）
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_cache)
+    return stats
+
+
+def clear_cache():
+    """清空进程内缓存并重置命中统计"""
+    with _lock:
+        _cache.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,226 @@
+"""
+分析进度事件
+
+AI 分析在后台线程中逐个部分生成（见 ai_service.generate_bazi_analysis 的 on_section），
+生成线程每完成一个部分就 publish 一个事件；/api/bazi/events/<result_id> 的 SSE 或长轮询
+连接用 wait_events 等待新事件，不再反复调用 /result 轮询 MongoDB。
+
+事件保存在进程内的频道中，每个频道保留最近 ANALYSIS_EVENTS_HISTORY 条，带递增的 id，
+断线重连时按 Last-Event-ID 补发。分析结束（completed / failed）后频道保留
+ANALYSIS_EVENTS_TTL 秒供迟到的连接读取，之后清理。
+
+多个 gunicorn worker 时，分析可能在另一个进程中进行，本进程没有对应的频道。
+这时由 DocumentWatcher 监视结果记录：MongoDB 为副本集时使用 change stream，
+单机部署不支持 change stream 时退回按 ANALYSIS_EVENTS_POLL_INTERVAL 秒查询状态字段
+（只取少数字段的投影查询，不经过 find_by_id 的修复写入），再用 diff_status 推算出事件。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_EVENTS_HISTORY = int(os.getenv('ANALYSIS_EVENTS_HISTORY', '200'))
+ANALYSIS_EVENTS_TTL = float(os.getenv('ANALYSIS_EVENTS_TTL', '600'))
+ANALYSIS_EVENTS_POLL_INTERVAL = float(os.getenv('ANALYSIS_EVENTS_POLL_INTERVAL', '2'))
+
+# 分析结束的事件，收到后连接可以关闭
+TERMINAL_EVENTS = frozenset(("completed", "failed"))
+
+# DocumentWatcher 读取的结果字段
+STATUS_PROJECTION = {"analysisStatus": 1, "analysisProgress": 1, "analysisSections": 1, "aiAnalysis": 1}
+
+_lock = threading.Lock()
+_channels = {}
+
+
+class _Channel:
+    """一个分析结果的事件频道"""
+
+    def __init__(self):
+        self.condition = threading.Condition(_lock)
+        self.events = deque(maxlen=ANALYSIS_EVENTS_HISTORY)
+        self.last_id = 0
+        self.done = False
+        self.updated = time.monotonic()
+
+
+def _expire_channels(now):
+    """清理结束超过 TTL 或长时间没有新事件的频道，调用方持有 _lock"""
+    expired = [result_id for result_id, channel in _channels.items()
+               if now - channel.updated > ANALYSIS_EVENTS_TTL]
+    for result_id in expired:
+        del _channels[result_id]
+
+
+def publish(result_id, event, data=None):
+    """
+    发布事件
+
+    Args:
+        result_id: 结果ID
+        event: 事件类型：progress、section、completed、failed
+        data: 事件数据（可 JSON 序列化的 dict）
+
+    Returns:
+        int: 事件 id
+    """
+    now = time.monotonic()
+    with _lock:
+        _expire_channels(now)
+        channel = _channels.get(result_id)
+        # 重新分析时从新的频道开始，旧连接读完已结束的频道后自行关闭
+        if channel is None or channel.done:
+            channel = _channels[result_id] = _Channel()
+        channel.last_id += 1
+        channel.events.append({"id": channel.last_id, "event": event, "data": data or {}})
+        channel.done = event in TERMINAL_EVENTS
+        channel.updated = now
+        channel.condition.notify_all()
+        return channel.last_id
+
+
+def has_channel(result_id):
+    """本进程中是否有这个结果的事件（即分析在本进程中进行或刚结束）"""
+    with _lock:
+        return result_id in _channels
+
+
+def wait_events(result_id, after_id=0, timeout=None):
+    """
+    等待 after_id 之后的事件
+
+    Args:
+        result_id: 结果ID
+        after_id: 已收到的最后一个事件 id
+        timeout: 最长等待秒数，为 None 时不等待
+
+    Returns:
+        tuple: (事件列表 [{"id", "event", "data"}], 分析是否已结束)；
+               本进程没有这个结果的频道时返回 ([], False)
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _lock:
+        while True:
+            channel = _channels.get(result_id)
+            if channel is not None:
+                # 频道重建（重新分析）后 id 从头开始，按新频道全部返回
+                if after_id > channel.last_id:
+                    after_id = 0
+                events = [event for event in channel.events if event["id"] > after_id]
+                if events or channel.done:
+                    return events, channel.done
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is None or remaining <= 0:
+                return [], False
+            if channel is None:
+                # 频道尚未创建，不能在条件变量上等待，短暂释放锁后重试
+                _lock.release()
+                try:
+                    time.sleep(min(remaining, 0.2))
+                finally:
+                    _lock.acquire()
+            else:
+                channel.condition.wait(remaining)
+
+
+def snapshot(document):
+    """由结果记录生成 snapshot 事件数据"""
+    document = document or {}
+    return {
+        "analysisStatus": document.get("analysisStatus", "pending"),
+        "analysisProgress": document.get("analysisProgress", 0),
+        "analysisSections": document.get("analysisSections") or {},
+        "aiAnalysis": document.get("aiAnalysis") or {}
+    }
+
+
+def diff_status(before, after):
+    """
+    比较结果记录的两个状态，推算期间发生的事件（用于其他进程中进行的分析）
+
+    Args:
+        before, after: 含 STATUS_PROJECTION 字段的结果记录
+
+    Returns:
+        list: [(事件类型, 数据)]
+    """
+    before, after = snapshot(before), snapshot(after)
+    events = []
+    for section, status in after["analysisSections"].items():
+        if status == "completed" and before["analysisSections"].get(section) != "completed":
+            events.append(("section", {"section": section, "content": after["aiAnalysis"].get(section, ""),
+                                       "progress": after["analysisProgress"]}))
+    if not events and after["analysisProgress"] != before["analysisProgress"]:
+        events.append(("progress", {"progress": after["analysisProgress"]}))
+    if after["analysisStatus"] != before["analysisStatus"] and after["analysisStatus"] in TERMINAL_EVENTS:
+        events.append((after["analysisStatus"], {"progress": after["analysisProgress"]}))
+    return events
+
+
+class DocumentWatcher:
+    """
+    监视一条结果记录的变化
+
+    Args:
+        collection: 结果集合
+        query: 定位记录的查询条件，必须按 _id 查询
+    """
+
+    def __init__(self, collection, query):
+        self.collection = collection
+        self.query = query
+        self._stream = None
+        self._use_change_stream = True
+
+    def current(self):
+        """读取记录当前的状态字段"""
+        return self.collection.find_one(self.query, STATUS_PROJECTION)
+
+    def _open_stream(self):
+        try:
+            pipeline = [{"$match": {"documentKey._id": self.query["_id"],
+                                    "operationType": {"$in": ["update", "replace"]}}}]
+            self._stream = self.collection.watch(pipeline, full_document="updateLookup",
+                                                 max_await_time_ms=int(ANALYSIS_EVENTS_POLL_INTERVAL * 1000))
+        except PyMongoError as e:
+            # 单机 MongoDB 不支持 change stream
+            logger.info(f"无法使用change stream，改为定时查询: {str(e)}")
+            self._use_change_stream = False
+
+    def wait_change(self, timeout):
+        """
+        等待记录变化
+
+        Returns:
+            dict: 变化后的状态字段；timeout 秒内没有变化时返回 None
+        """
+        if self._use_change_stream and self._stream is None:
+            self._open_stream()
+        if self._stream is not None:
+            deadline = time.monotonic() + timeout
+            try:
+                while time.monotonic() < deadline:
+                    change = self._stream.try_next()
+                    if change is not None and change.get("fullDocument"):
+                        return {key: change["fullDocument"].get(key) for key in STATUS_PROJECTION}
+                return None
+            except PyMongoError as e:
+                logger.warning(f"change stream中断，改为定时查询: {str(e)}")
+                self.close()
+                self._use_change_stream = False
+        time.sleep(min(timeout, ANALYSIS_EVENTS_POLL_INTERVAL))
+        return self.current()
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except PyMongoError:
+                pass
+            self._stream = None
@@ -1,44 +1,67 @@
+"""
+八字排盘核心
+
+导入时只定义下面的只读查找表，不配置日志、不加载第三方历法库：lunar_python、sxtwl
+只在速查表范围之外或旧接口中用到，numpy 只在批量计算时用到，都在首次使用时才导入，
+以缩短 gunicorn worker 的冷启动时间（见 test/test_import_time.py）。日志由应用入口配置。
+"""
+
 import os
-import json
 import logging
 import traceback
 from datetime import datetime, timedelta
-import math
-import re
-import sxtwl
-from lunar_python import Solar, Lunar
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import threading
+from functools import lru_cache
+from itertools import count, islice
+from types import MappingProxyType
+from utils import bazi_calendar, chart_cache, shen_sha as shen_sha_rules, solar_time
+from utils.birth_datetime import BirthDateTimeError, parse_birth_datetime
 
 logger = logging.getLogger(__name__)
 
+# 命盘中保存的流年窗口：当前年份之前、之后各保留多少年，更早或更晚的流年通过 bazi_timeline 分页获取
+BAZI_FLOWING_YEARS_BEFORE = int(os.getenv('BAZI_FLOWING_YEARS_BEFORE', '10'))
+BAZI_FLOWING_YEARS_AFTER = int(os.getenv('BAZI_FLOWING_YEARS_AFTER', '10'))
+
+# calculate_bazi 返回的大运步数
+DA_YUN_COUNT = 8
+
 # 天干
-HEAVENLY_STEMS = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
+TIAN_GAN = ("甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸")
 # 地支
-EARTHLY_BRANCHES = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
-# 五行
-FIVE_ELEMENTS = {
-    # 天干五行
+DI_ZHI = ("子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥")
+# 旧名称
+HEAVENLY_STEMS = TIAN_GAN
+EARTHLY_BRANCHES = DI_ZHI
+
+# 天干五行
+FIVE_ELEMENTS = MappingProxyType({
     "甲": "wood", "乙": "wood",
     "丙": "fire", "丁": "fire",
     "戊": "earth", "己": "earth",
     "庚": "metal", "辛": "metal",
-    "壬": "water", "癸": "water",
-    # 地支五行
+    "壬": "water", "癸": "water"
+})
+WU_XING = FIVE_ELEMENTS
+
+# 地支五行
+ZHI_WU_XING = MappingProxyType({
     "子": "water", "丑": "earth",
     "寅": "wood", "卯": "wood",
     "辰": "earth", "巳": "fire",
     "午": "fire", "未": "earth",
     "申": "metal", "酉": "metal",
     "戌": "earth", "亥": "water"
-}
+})
+
+# 天干地支五行
+GAN_ZHI_WU_XING = MappingProxyType({**FIVE_ELEMENTS, **ZHI_WU_XING})
+
+# 五行分布统计的键顺序（天干序号 // 2 即为五行序号）
+FIVE_ELEMENT_KEYS = ("wood", "fire", "earth", "metal", "water")
 
 # 阴阳
-YIN_YANG = {
+YIN_YANG = MappingProxyType({
     "甲": "阳", "乙": "阴",
     "丙": "阳", "丁": "阴",
     "戊": "阳", "己": "阴",
@@ -50,10 +73,10 @@ YIN_YANG = {
     "午": "阳", "未": "阴",
     "申": "阳", "酉": "阴",
     "戌": "阳", "亥": "阴"
-}
+})
 
 # 月支和节气对应表
-SOLAR_TERMS = {
+SOLAR_TERMS = MappingProxyType({
     1: {"name": "立春", "day": 4},
     2: {"name": "惊蛰", "day": 6},
     3: {"name": "清明", "day": 5},
@@ -66,24 +89,13 @@ SOLAR_TERMS = {
     10: {"name": "立冬", "day": 7},
     11: {"name": "大雪", "day": 7},
     12: {"name": "小寒", "day": 6}
-}
+})
 
-# 天干列表
-TIAN_GAN = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
-# 地支列表
-DI_ZHI = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
-# 十神列表
-SHI_SHEN = ["比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"]
+# 十神，五行关系（同我、我生、我克、克我、生我）两个一组，组内先偏后正（阴阳相同为偏），
+# 下标为 五行关系 * 2 + 阴阳是否不同，见 SHI_SHEN_TABLE
+SHI_SHEN = ("比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印")
 # 十二长生
-CHANG_SHENG = ["长生", "沐浴", "冠带", "临官", "帝旺", "衰", "病", "死", "墓", "绝", "胎", "养"]
-# 五行
-WU_XING = {
-    "甲": "wood", "乙": "wood",
-    "丙": "fire", "丁": "fire",
-    "戊": "earth", "己": "earth",
-    "庚": "metal", "辛": "metal",
-    "壬": "water", "癸": "water"
-}
+CHANG_SHENG = ("长生", "沐浴", "冠带", "临官", "帝旺", "衰", "病", "死", "墓", "绝", "胎", "养")
 
 # 神煞对应表（简化版，实际可能需要更复杂的规则）
 SHEN_SHA = {
@@ -116,49 +128,195 @@ SHENG_KE = {
     "water": {"生": "wood", "克": "fire", "被生": "metal", "被克": "earth"}
 }
 
-# 在文件开头添加配置
-import traceback
-import logging
+# 地支相冲
+CHONG = MappingProxyType({
+    '子': '午', '丑': '未', '寅': '申', '卯': '酉',
+    '辰': '戌', '巳': '亥', '午': '子', '未': '丑',
+    '申': '寅', '酉': '卯', '戌': '辰', '亥': '巳'
+})
 
-# 配置lunar-python支持
-USING_LUNAR_PYTHON = True  # 由于代码中已经使用了lunar库的功能，所以这里设置为True
+# 值神
+ZHI_SHEN = MappingProxyType({
+    '甲': '寅', '乙': '卯', '丙': '巳', '丁': '午',
+    '戊': '巳', '己': '午', '庚': '申', '辛': '酉',
+    '壬': '亥', '癸': '子'
+})
 
-# 天干地支常量定义
-TIAN_GAN = "甲乙丙丁戊己庚辛壬癸"
-DI_ZHI = "子丑寅卯辰巳午未申酉戌亥"
+# 彭祖百忌
+PENG_ZU_GAN = MappingProxyType({
+    '甲': '沐浴', '乙': '冠带', '丙': '修造', '丁': '斋醮', '戊': '经络',
+    '己': '开光', '庚': '出行', '辛': '疗病', '壬': '祈福', '癸': '求嗣'
+})
+PENG_ZU_ZHI = MappingProxyType({
+    '子': '祭祀', '丑': '会客', '寅': '安葬', '卯': '求财', '辰': '启钻', '巳': '赴任',
+    '午': '修造', '未': '开市', '申': '安床', '酉': '入宅', '戌': '破土', '亥': '嫁娶'
+})
 
-# 五行属性
-FIVE_ELEMENTS = {
-    "甲": "wood", "乙": "wood",
-    "丙": "fire", "丁": "fire",
-    "戊": "earth", "己": "earth",
-    "庚": "metal", "辛": "metal",
-    "壬": "water", "癸": "water"
-}
+# 喜神、福神、财神方位
+XI_SHEN = MappingProxyType({
+    "甲": "艮", "乙": "艮",
+    "丙": "离", "丁": "离",
+    "戊": "坤", "己": "坤",
+    "庚": "兑", "辛": "兑",
+    "壬": "坎", "癸": "坎"
+})
+FU_SHEN = MappingProxyType({
+    "甲": "坤", "乙": "坤",
+    "丙": "艮", "丁": "艮",
+    "戊": "巽", "己": "巽",
+    "庚": "乾", "辛": "乾",
+    "壬": "坤", "癸": "坤"
+})
+CAI_SHEN = MappingProxyType({
+    "甲": "艮", "乙": "巽",
+    "丙": "坤", "丁": "乾",
+    "戊": "坎", "己": "离",
+    "庚": "艮", "辛": "巽",
+    "壬": "坤", "癸": "乾"
+})
+
+# 旺衰（简化版，按地支所在季节）
+WANG_SHUAI = MappingProxyType({
+    "寅": "旺", "卯": "旺", "辰": "旺",  # 春季旺
+    "巳": "相", "午": "相", "未": "相",  # 夏季旺
+    "申": "平", "酉": "平", "戌": "平",  # 秋季旺
+    "亥": "衰", "子": "衰", "丑": "衰"   # 冬季旺
+})
+
+# 阳干
+YANG_GAN = frozenset(("甲", "丙", "戊", "庚", "壬"))
+YIN_GAN = frozenset(("乙", "丁", "己", "辛", "癸"))
 
+# 天干五合（干 + 日干）、地支三合局、地支六合
+GAN_HE = frozenset(("甲己", "乙庚", "丙辛", "丁壬", "戊癸"))
+SAN_HE = (
+    frozenset(("寅", "午", "戌")),
+    frozenset(("巳", "酉", "丑")),
+    frozenset(("申", "子", "辰")),
+    frozenset(("亥", "卯", "未"))
+)
+LIU_HE = MappingProxyType({
+    "子": "丑", "丑": "子",
+    "寅": "亥", "亥": "寅",
+    "卯": "戌", "戌": "卯",
+    "辰": "酉", "酉": "辰",
+    "巳": "申", "申": "巳",
+    "午": "未", "未": "午"
+})
+
+# 地支藏干及权重（百分比）：本气、中气、余气
+CANG_GAN = MappingProxyType({
+    "子": (("癸", 100),),
+    "丑": (("己", 60), ("癸", 30), ("辛", 10)),
+    "寅": (("甲", 60), ("丙", 30), ("戊", 10)),
+    "卯": (("乙", 100),),
+    "辰": (("戊", 60), ("乙", 30), ("癸", 10)),
+    "巳": (("丙", 60), ("庚", 30), ("戊", 10)),
+    "午": (("丁", 70), ("己", 30)),
+    "未": (("己", 60), ("丁", 30), ("乙", 10)),
+    "申": (("庚", 60), ("壬", 30), ("戊", 10)),
+    "酉": (("辛", 100),),
+    "戌": (("戊", 60), ("辛", 30), ("丁", 10)),
+    "亥": (("壬", 70), ("甲", 30))
+})
+
+# 月令旺相休囚死的五行力量倍数（百分比）
+WANG_XIANG_MULTIPLIERS = MappingProxyType({"旺": 150, "相": 120, "休": 100, "囚": 80, "死": 60})
+
+# 日主同党（比劫、印枭）占五行总力量的比例达到 STRONG 为身强，不超过 WEAK 为身弱，其间为中和
+DAY_MASTER_STRONG_RATIO = float(os.getenv('BAZI_DAY_MASTER_STRONG_RATIO', '0.55'))
+DAY_MASTER_WEAK_RATIO = float(os.getenv('BAZI_DAY_MASTER_WEAK_RATIO', '0.45'))
+
+# lunar-python 一直是唯一启用的历法实现，sxtwl 分支只保留给旧接口
+USING_LUNAR_PYTHON = True
+
+# 纳音五行，六十甲子每两个一组
+NA_YIN_NAMES = (
+    "海中金", "炉中火", "大林木", "路旁土", "剑锋金", "山头火",
+    "涧下水", "城头土", "白蜡金", "杨柳木", "泉中水", "屋上土",
+    "霹雳火", "松柏木", "长流水", "砂中金", "山下火", "平地木",
+    "壁上土", "金箔金", "覆灯火", "天河水", "大驿土", "钗钏金",
+    "桑柘木", "大溪水", "沙中土", "天上火", "石榴木", "大海水"
+)
+
+# 以下速查表按序号取值，排盘时不拼接字符串、不查找序号
+# 纳音、吉凶按六十甲子序号（0=甲子，同 bazi_calendar.gan_zhi_index）
+NA_YIN_TABLE = tuple(NA_YIN_NAMES[i // 2] for i in range(60))
 # 纳音五行对照表
-NA_YIN = {
-    "甲子": "海中金", "乙丑": "海中金", 
-    "丙寅": "炉中火", "丁卯": "炉中火",
-    "戊辰": "大林木", "己巳": "大林木",
-    "庚午": "路旁土", "辛未": "路旁土",
-    "壬申": "剑锋金", "癸酉": "剑锋金",
-    "甲戌": "山头火", "乙亥": "山头火",
-    "丙子": "涧下水", "丁丑": "涧下水",
-    "戊寅": "城头土", "己卯": "城头土",
-    "庚辰": "白蜡金", "辛巳": "白蜡金",
-    "壬午": "杨柳木", "癸未": "杨柳木",
-    "甲申": "泉中水", "乙酉": "泉中水",
-    "丙戌": "屋上土", "丁亥": "屋上土",
-    "戊子": "霹雳火", "己丑": "霹雳火",
-    "庚寅": "松柏木", "辛卯": "松柏木",
-    "壬辰": "长流水", "癸巳": "长流水"
-}
+NA_YIN = MappingProxyType({TIAN_GAN[i % 10] + DI_ZHI[i % 12]: NA_YIN_TABLE[i] for i in range(60)})
+# 十神 SHI_SHEN_TABLE[日干序号][天干序号]：天干序号 // 2 为五行（木火土金水，按相生顺序），
+# 五行关系（同我、我生、我克、克我、生我）定两个一组，再按阴阳同异取偏或正
+SHI_SHEN_TABLE = tuple(
+    tuple(SHI_SHEN[(gan // 2 - day_gan // 2) % 5 * 2 + (gan % 2 != day_gan % 2)] for gan in range(10))
+    for day_gan in range(10)
+)
+# 旺衰按地支序号
+WANG_SHUAI_TABLE = tuple(WANG_SHUAI[zhi] for zhi in DI_ZHI)
+# 干支文字到序号
+TIAN_GAN_INDEX = MappingProxyType({gan: i for i, gan in enumerate(TIAN_GAN)})
+DI_ZHI_INDEX = MappingProxyType({zhi: i for i, zhi in enumerate(DI_ZHI)})
+
+def na_yin_at(gan_index, zhi_index):
+    """由天干、地支序号取纳音（干支须同为阳或同为阴）"""
+    return NA_YIN_TABLE[(6 * gan_index - 5 * zhi_index) % 60]
+
+def shi_shen_at(day_gan_index, gan_index):
+    """由日干、天干序号取十神"""
+    return SHI_SHEN_TABLE[day_gan_index][gan_index]
+
+def wang_shuai_at(zhi_index):
+    """由地支序号取旺衰"""
+    return WANG_SHUAI_TABLE[zhi_index]
 
 def get_na_yin(gan_zhi):
     """获取纳音五行"""
     return NA_YIN.get(gan_zhi, "未知")
 
+def get_ymd_gan_zhi(year, month, day):
+    """
+    获取年、月、日三柱干支
+
+    1900-2100 年范围内直接查 bazi_calendar 速查表，超出范围时回退到 lunar_python。
+    取值与 lunar.getYearGan()/getMonthGan()/getDayGan() 等方法一致。
+
+    Args:
+        year: 公历年
+        month: 公历月
+        day: 公历日
+
+    Returns:
+        tuple: (年干, 年支, 月干, 月支, 日干, 日支)
+    """
+    if bazi_calendar.in_range(year, month, day):
+        year_index, month_index, day_index = bazi_calendar.lookup(year, month, day)
+        return (bazi_calendar.gan_zhi(year_index) +
+                bazi_calendar.gan_zhi(month_index) +
+                bazi_calendar.gan_zhi(day_index))
+
+    from lunar_python import Solar
+    
+    lunar = Solar.fromYmd(year, month, day).getLunar()
+    return (lunar.getYearGan(), lunar.getYearZhi(),
+            lunar.getMonthGan(), lunar.getMonthZhi(),
+            lunar.getDayGan(), lunar.getDayZhi())
+
+def get_next_jie_qi_date(year, month, day, hour):
+    """
+    获取出生时刻之后第一个节气的日期（与 lunar.getNextJieQi() 一致）
+
+    Returns:
+        datetime: 节气当天 0 点
+    """
+    if bazi_calendar.in_range(year, month, day):
+        _, jie_qi_time = bazi_calendar.next_jie_qi(year, month, day, hour)
+        return datetime(jie_qi_time.year, jie_qi_time.month, jie_qi_time.day)
+
+    from lunar_python import Solar
+    
+    lunar = Solar.fromYmdHms(year, month, day, hour, 0, 0).getLunar()
+    jie_qi_solar = lunar.getNextJieQi().getSolar()
+    return datetime(jie_qi_solar.getYear(), jie_qi_solar.getMonth(), jie_qi_solar.getDay())
+
 def parse_birth_date_time(birth_date, birth_time):
     """
     解析出生日期和时间
@@ -170,96 +328,7 @@ def parse_birth_date_time(birth_date, birth_time):
     Returns:
         dict: 包含年、月、日、时的字典
     """
-    logging.info(f"解析日期和时间: {birth_date}, {birth_time}")
-    
-    # 解析日期
-    try:
-        if not birth_date:
-            raise ValueError("出生日期不能为空")
-            
-        # 验证日期格式
-        if not isinstance(birth_date, str) or not birth_date.count('-') == 2:
-            raise ValueError(f"日期格式错误: {birth_date}，应为 YYYY-MM-DD 格式")
-            
-        year, month, day = map(int, birth_date.split('-'))
-        
-        # 验证日期范围
-        if not (1900 <= year <= 2100):
-            raise ValueError(f"年份 {year} 超出范围 (1900-2100)")
-        if not (1 <= month <= 12):
-            raise ValueError(f"月份 {month} 超出范围 (1-12)")
-        if not (1 <= day <= 31):
-            raise ValueError(f"日期 {day} 超出范围 (1-31)")
-            
-        # 验证日期是否有效
-        try:
-            datetime(year, month, day)
-        except ValueError as e:
-            raise ValueError(f"无效的日期: {birth_date}, {str(e)}")
-            
-    except Exception as e:
-        logging.error(f"解析日期出错: {str(e)}")
-        raise ValueError(f"日期解析失败: {str(e)}")
-    
-    # 解析时间
-    hour = 0
-    
-    # 时辰映射表
-    hour_map = {
-        '子时': 0, '丑时': 2, '寅时': 4, '卯时': 6,
-        '辰时': 8, '巳时': 10, '午时': 12, '未时': 14,
-        '申时': 16, '酉时': 18, '戌时': 20, '亥时': 22,
-        '子': 0, '丑': 2, '寅': 4, '卯': 6, 
-        '辰': 8, '巳': 10, '午': 12, '未': 14, 
-        '申': 16, '酉': 18, '戌': 20, '亥': 22
-    }
-    
-    try:
-        if not birth_time:
-            raise ValueError("出生时辰不能为空")
-            
-        # 先检查是否是带括号的中文时辰格式
-        if '(' in birth_time and ')' in birth_time:
-            # 获取括号前的部分
-            time_name = birth_time.split('(')[0].strip()
-            logging.info(f"提取时辰名称: {time_name}")
-            
-            # 查找对应的时辰
-            for key, value in hour_map.items():
-                if key in time_name:
-                    hour = value
-                    logging.info(f"识别到带括号的时辰: {key}, 对应小时: {hour}")
-                    break
-            else:
-                raise ValueError(f"无法识别的时辰格式: {birth_time}")
-        # 尝试解析 HH:MM 格式
-        elif ':' in birth_time:
-            parts = birth_time.split(':')
-            if len(parts) >= 1:
-                hour = int(parts[0])
-                if not (0 <= hour <= 23):
-                    raise ValueError(f"小时数 {hour} 超出范围 (0-23)")
-                logging.info(f"识别到时分格式，小时: {hour}")
-        # 尝试解析纯中文时辰格式
-        else:
-            # 查找中文时辰
-            for key, value in hour_map.items():
-                if key in birth_time:
-                    hour = value
-                    logging.info(f"识别到中文时辰: {key}, 对应小时: {hour}")
-                    break
-            else:
-                raise ValueError(f"无法识别的时辰格式: {birth_time}")
-    except Exception as e:
-        logging.error(f"解析时间出错: {str(e)}")
-        raise ValueError(f"时间解析失败: {str(e)}")
-    
-    return {
-        'year': year,
-        'month': month,
-        'day': day,
-        'hour': hour
-    }
+    return parse_birth_datetime(birth_date, birth_time, year_range=(1900, 2100)).to_dict()
 
 def convert_lunar_to_solar(year, month, day):
     """
@@ -277,11 +346,13 @@ def convert_lunar_to_solar(year, month, day):
     """
     if USING_LUNAR_PYTHON:
         # 使用lunar-python库转换
+        from lunar_python import Lunar
         lunar = Lunar.fromYmd(year, month, day)
         solar = lunar.getSolar()
         return (solar.getYear(), solar.getMonth(), solar.getDay())
     else:
         # 使用sxtwl库转换
+        import sxtwl
         lunar = sxtwl.Lunar()
         day_obj = lunar.getDayBySolar(year, month, day)
         return (day_obj.y, day_obj.m, day_obj.d)
@@ -297,11 +368,8 @@ def get_year_pillar(year):
         dict: 年柱信息
     """
     if USING_LUNAR_PYTHON:
-        # 使用lunar-python库计算
-        solar = Solar.fromYmd(year, 5, 1)  # 使用5月1日作为参考日期
-        lunar = solar.getLunar()
-        year_gan = lunar.getYearGan()
-        year_zhi = lunar.getYearZhi()
+        # 使用lunar-python口径（速查表）计算
+        year_gan, year_zhi = get_ymd_gan_zhi(year, 5, 1)[:2]  # 使用5月1日作为参考日期
         
         logging.info(f"使用lunar-python计算{year}年的年柱: {year_gan}{year_zhi}")
         
@@ -337,11 +405,8 @@ def get_month_pillar(year, month, day):
         dict: 月柱信息
     """
     if USING_LUNAR_PYTHON:
-        # 使用lunar-python库计算
-        solar = Solar.fromYmd(year, month, day)
-        lunar = solar.getLunar()
-        month_gan = lunar.getMonthGan()
-        month_zhi = lunar.getMonthZhi()
+        # 使用lunar-python口径（速查表）计算
+        month_gan, month_zhi = get_ymd_gan_zhi(year, month, day)[2:4]
         
         heavenly_stem = month_gan
         earthly_branch = month_zhi
@@ -387,11 +452,8 @@ def get_day_pillar(year, month, day):
         dict: 日柱信息
     """
     if USING_LUNAR_PYTHON:
-        # 使用lunar-python库计算
-        solar = Solar.fromYmd(year, month, day)
-        lunar = solar.getLunar()
-        day_gan = lunar.getDayGan()
-        day_zhi = lunar.getDayZhi()
+        # 使用lunar-python口径（速查表）计算
+        day_gan, day_zhi = get_ymd_gan_zhi(year, month, day)[4:]
         
         heavenly_stem = day_gan
         earthly_branch = day_zhi
@@ -431,6 +493,7 @@ def get_hour_pillar(year, month, day, hour):
     """
     if USING_LUNAR_PYTHON:
         # 使用lunar-python库计算
+        from lunar_python import Solar
         solar = Solar.fromYmdHms(year, month, day, hour, 0, 0)
         lunar = solar.getLunar()
         hour_gan = lunar.getTimeGan()
@@ -580,34 +643,12 @@ def calculate_flowing_years(gender, bazi_data):
             year = start_year + i
             
             if USING_LUNAR_PYTHON:
-                # 使用lunar-python库计算
-                solar = Solar.fromYmd(year, 5, 1)  # 使用5月1日作为参考日期
-                lunar = solar.getLunar()
-                year_gan = lunar.getYearGan()
-                year_zhi = lunar.getYearZhi()
-                
-                logging.info(f"流年计算(lunar-python): {year}年 - {year_gan}{year_zhi}")
-                
-                # 天干地支五行映射字典
-                element_map = {
-                    # 天干五行
-                    "甲": "wood", "乙": "wood", 
-                    "丙": "fire", "丁": "fire",
-                    "戊": "earth", "己": "earth",
-                    "庚": "metal", "辛": "metal",
-                    "壬": "water", "癸": "water",
-                    # 地支五行
-                    "子": "water", "丑": "earth",
-                    "寅": "wood", "卯": "wood",
-                    "辰": "earth", "巳": "fire",
-                    "午": "fire", "未": "earth",
-                    "申": "metal", "酉": "metal",
-                    "戌": "earth", "亥": "water"
-                }
-                
-                # 计算流年五行
-                gan_element = element_map.get(year_gan, "unknown")
-                zhi_element = element_map.get(year_zhi, "unknown")
+                # 从流年缓存获取干支和五行
+                base = _get_flowing_year_base(year)
+                year_gan = base["heavenlyStem"]
+                year_zhi = base["earthlyBranch"]
+                gan_element = base["ganElement"]
+                zhi_element = base["zhiElement"]
                 
                 # 计算流年十神
                 gan_index = TIAN_GAN.index(year_gan) if year_gan in TIAN_GAN else 0
@@ -622,8 +663,8 @@ def calculate_flowing_years(gender, bazi_data):
                 # 计算流年神煞
                 liu_nian_shen_sha = []
                 
-                # 计算流年吉凶 - 使用适当的函数版本
-                ji_xiong = calculate_ji_xiong(year_gan + year_zhi)  # 使用接受单个gan_zhi参数的版本
+                # 计算流年吉凶
+                ji_xiong = base["jiXiong"]
                 
                 # 计算与出生年的年龄差
                 age = year - birth_year   # 虚岁 改为周岁 去掉+1
@@ -663,9 +704,9 @@ def calculate_flowing_years(gender, bazi_data):
     
     return flowing_years
 
-def calculate_ji_xiong(gan, zhi, day_gan, day_zhi):
+def calculate_ji_xiong_by_day_pillar(gan, zhi, day_gan, day_zhi):
     """
-    计算干支组合的吉凶
+    计算干支相对命主日柱的吉凶（流月、流日使用）
     
     Args:
         gan: 天干
@@ -679,30 +720,14 @@ def calculate_ji_xiong(gan, zhi, day_gan, day_zhi):
     score = 0
     
     # 天干合化
-    if (gan + day_gan) in ["甲己", "乙庚", "丙辛", "丁壬", "戊癸"]:
+    if (gan + day_gan) in GAN_HE:
         score += 2
     
     # 地支三合
-    SAN_HE = {
-        "寅": ["寅", "午", "戌"],
-        "巳": ["巳", "酉", "丑"],
-        "申": ["申", "子", "辰"],
-        "亥": ["亥", "卯", "未"]
-    }
-    for key, value in SAN_HE.items():
-        if zhi in value and day_zhi in value:
-            score += 2
-            break
+    if any(zhi in group and day_zhi in group for group in SAN_HE):
+        score += 2
     
     # 地支六合
-    LIU_HE = {
-        "子": "丑", "丑": "子",
-        "寅": "亥", "亥": "寅",
-        "卯": "戌", "戌": "卯",
-        "辰": "酉", "酉": "辰",
-        "巳": "申", "申": "巳",
-        "午": "未", "未": "午"
-    }
     if LIU_HE.get(zhi) == day_zhi:
         score += 1
     
@@ -735,11 +760,9 @@ def get_hour_gan_zhi(hour, day_gan):
         hour_branch_index = 0
     
     # 时支
-    DI_ZHI = "子丑寅卯辰巳午未申酉戌亥"
     hour_zhi = DI_ZHI[hour_branch_index]
     
     # 根据日干确定时干
-    TIAN_GAN = "甲乙丙丁戊己庚辛壬癸"
     day_gan_index = TIAN_GAN.index(day_gan)
     
     # 计算时干的起始位置
@@ -767,6 +790,7 @@ def calculate_shen_sha(year, month, day, hour, gender):
     """
     try:
         # 创建农历对象
+        from lunar_python import Solar
         solar = Solar.fromYmdHms(year, month, day, hour, 0, 0)
         lunar = solar.getLunar()
         
@@ -866,22 +890,7 @@ def calculate_shen_sha(year, month, day, hour, gender):
 
 def get_five_element(gan_or_zhi):
     """根据天干或地支获取五行属性"""
-    FIVE_ELEMENTS = {
-        # 天干五行
-        "甲": "wood", "乙": "wood",
-        "丙": "fire", "丁": "fire",
-        "戊": "earth", "己": "earth",
-        "庚": "metal", "辛": "metal",
-        "壬": "water", "癸": "water",
-        # 地支五行
-        "子": "water", "丑": "earth",
-        "寅": "wood", "卯": "wood",
-        "辰": "earth", "巳": "fire",
-        "午": "fire", "未": "earth",
-        "申": "metal", "酉": "metal",
-        "戌": "earth", "亥": "water"
-    }
-    return FIVE_ELEMENTS.get(gan_or_zhi, "未知")
+    return GAN_ZHI_WU_XING.get(gan_or_zhi, "未知")
 
 # 方位定义
 POSITIONS = {
@@ -904,252 +913,131 @@ POSITIONS = {
 
 def get_chong(zhi):
     """获取地支相冲"""
-    chong_map = {
-        '子': '午', '丑': '未', '寅': '申', '卯': '酉',
-        '辰': '戌', '巳': '亥', '午': '子', '未': '丑',
-        '申': '寅', '酉': '卯', '戌': '辰', '亥': '巳'
-    }
-    return chong_map.get(zhi, '未知')
+    return CHONG.get(zhi, '未知')
 
 def get_zhi_shen(gan):
     """获取值神"""
-    zhi_shen_map = {
-        '甲': '寅', '乙': '卯', '丙': '巳', '丁': '午',
-        '戊': '巳', '己': '午', '庚': '申', '辛': '酉',
-        '壬': '亥', '癸': '子'
-    }
-    return zhi_shen_map.get(gan, '未知')
+    return ZHI_SHEN.get(gan, '未知')
 
 def get_peng_zu_gan(gan):
     """获取彭祖干忌"""
-    peng_zu_gan_map = {
-        '甲': '沐浴',
-        '乙': '冠带',
-        '丙': '修造',
-        '丁': '斋醮',
-        '戊': '经络',
-        '己': '开光',
-        '庚': '出行',
-        '辛': '疗病',
-        '壬': '祈福',
-        '癸': '求嗣'
-    }
-    return peng_zu_gan_map.get(gan, '未知')
+    return PENG_ZU_GAN.get(gan, '未知')
 
 def get_peng_zu_zhi(zhi):
     """获取彭祖支忌"""
-    peng_zu_zhi_map = {
-        '子': '祭祀',
-        '丑': '会客',
-        '寅': '安葬',
-        '卯': '求财',
-        '辰': '启钻',
-        '巳': '赴任',
-        '午': '修造',
-        '未': '开市',
-        '申': '安床',
-        '酉': '入宅',
-        '戌': '破土',
-        '亥': '嫁娶'
-    }
-    return peng_zu_zhi_map.get(zhi, '未知')
+    return PENG_ZU_ZHI.get(zhi, '未知')
 
 def calculate_ben_ming_shen_sha(year_gan, year_zhi, day_gan, day_zhi):
     """计算本命神煞"""
-    try:
-        shen_sha = []
-        
-        # 天乙贵人
-        if year_gan in ["甲", "戊", "庚"] and year_zhi in ["子", "寅", "辰", "午", "申", "戌"]:
-            shen_sha.append("天乙贵人")
-        
-        # 文昌贵人
-        if day_gan in ["乙", "丙"] and day_zhi in ["巳", "午"]:
-            shen_sha.append("文昌贵人")
-        
-        # 金舆
-        if year_gan in ["丁", "己"] and year_zhi in ["丑", "未"]:
-            shen_sha.append("金舆")
-        
-        # 天德
-        if year_gan in ["丙", "丁"] and year_zhi in ["寅", "卯"]:
-            shen_sha.append("天德")
-            
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算本命神煞失败: {str(e)}")
-        return []
+    return shen_sha_rules.lookup_pillars("benMing", (year_gan, year_zhi), (day_gan, day_zhi))
 
 def calculate_year_gan_shen_sha(gan):
     """计算年干神煞"""
-    try:
-        shen_sha = []
-        
-        # 天乙贵人
-        if gan in ["甲", "戊", "庚"]:
-            shen_sha.append("天乙贵人")
-        
-        # 文昌贵人
-        if gan in ["乙", "丙"]:
-            shen_sha.append("文昌贵人")
-        
-        # 金舆
-        if gan in ["丁", "己"]:
-            shen_sha.append("金舆")
-        
-        # 天德
-        if gan in ["丙", "丁"]:
-            shen_sha.append("天德")
-            
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算年干神煞失败: {str(e)}")
-        return []
+    return shen_sha_rules.lookup("yearGan", gan=gan)
 
 def calculate_year_zhi_shen_sha(zhi):
     """计算年支神煞"""
-    try:
-        shen_sha = []
-        
-        # 华盖
-        if zhi in ["辰", "戌", "丑", "未"]:
-            shen_sha.append("华盖")
-        
-        # 驿马
-        if zhi in ["寅", "巳", "申", "亥"]:
-            shen_sha.append("驿马")
-        
-        # 劫煞
-        if zhi in ["巳", "酉", "丑"]:
-            shen_sha.append("劫煞")
-            
-        # 灾煞
-        if zhi in ["午", "子", "卯", "酉"]:
-            shen_sha.append("灾煞")
-            
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算年支神煞失败: {str(e)}")
-        return []
+    return shen_sha_rules.lookup("yearZhi", zhi=zhi)
 
 def calculate_day_gan_shen_sha(gan):
     """计算日干神煞"""
-    try:
-        shen_sha = []
-        
-        # 日贵
-        if gan in ["甲", "丙", "戊", "庚", "壬"]:
-            shen_sha.append("日贵")
-        
-        # 天喜
-        if gan in ["乙", "丁"]:
-            shen_sha.append("天喜")
-        
-        # 天医
-        if gan in ["甲", "丙"]:
-            shen_sha.append("天医")
-            
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算日干神煞失败: {str(e)}")
-        return []
+    return shen_sha_rules.lookup("dayGan", gan=gan)
 
 def calculate_day_zhi_shen_sha(zhi):
     """计算日支神煞"""
-    try:
-        shen_sha = []
-        
-        # 青龙
-        if zhi in ["寅", "卯"]:
-            shen_sha.append("青龙")
-        
-        # 朱雀
-        if zhi in ["巳", "午"]:
-            shen_sha.append("朱雀")
+    return shen_sha_rules.lookup("dayZhi", zhi=zhi)
+
+def is_da_yun_forward(year_gan, gender):
+    """
+    判断大运是否顺行（阳男阴女顺行，阴男阳女逆行）
+    
+    Args:
+        year_gan: 年干
+        gender: 性别（'male'/'female' 或 '男'/'女'）
         
-        # 白虎
-        if zhi in ["申", "酉"]:
-            shen_sha.append("白虎")
+    Returns:
+        bool: 顺行返回True
+    """
+    is_male = gender in ('male', '男')
+    return (year_gan in YANG_GAN) == is_male
+
+def calculate_da_yun_start(year, month, day, hour, gender, minute=0):
+    """
+    计算起运年龄和大运顺逆
+    
+    起运年龄取 calculate_qi_yun 精确起运时间的整年数：顺行数到下一个节、逆行数到上一个节，
+    按分钟计算，大运列表的年龄、年份与 daYun.qiYun 一致。
+    
+    Returns:
+        tuple: (起运年龄, 是否顺行)
+    """
+    year_gan = get_ymd_gan_zhi(year, month, day)[0]
+    is_forward = is_da_yun_forward(year_gan, gender)
+    return calculate_qi_yun(year, month, day, hour, minute, is_forward)["years"], is_forward
+
+def _qi_yun_detail(minutes, jie_name, jie_time):
+    """
+    把出生时刻与节的间隔分钟数换算为起运时间
+    
+    三天折一年：4320 分钟为一年，360 分钟为一月，12 分钟为一天，余下每分钟折两小时
+    """
+    years, minutes = divmod(minutes, 4320)
+    months, minutes = divmod(minutes, 360)
+    days, minutes = divmod(minutes, 12)
+    return {
+        "years": years,
+        "months": months,
+        "days": days,
+        "hours": minutes * 2,
+        "jieQi": jie_name,
+        "jieQiTime": jie_time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+def calculate_qi_yun(year, month, day, hour, minute, is_forward):
+    """
+    精确计算起运时间（几年几月几天几小时）
+    
+    顺行数到出生后的下一个节，逆行数到出生前的上一个节，按分钟计算间隔
+    （与 lunar_python 的 getYun(gender, 2) 相同）。速查表范围内二分查找节的数组，
+    超出范围时回退到 lunar_python。
+    
+    Args:
+        year, month, day, hour, minute: 出生时刻
+        is_forward: 大运是否顺行
         
-        # 玄武
-        if zhi in ["子", "亥"]:
-            shen_sha.append("玄武")
-            
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算日支神煞失败: {str(e)}")
-        return []
+    Returns:
+        dict: years、months、days、hours 以及所数到的节 jieQi 和交节时刻 jieQiTime
+    """
+    if bazi_calendar.in_range(year, month, day):
+        if is_forward:
+            jie_name, jie_time = bazi_calendar.next_jie(year, month, day, hour, minute)
+        else:
+            jie_name, jie_time = bazi_calendar.previous_jie(year, month, day, hour, minute)
+    else:
+        from lunar_python import Solar
+        lunar = Solar.fromYmdHms(year, month, day, hour, minute, 0).getLunar()
+        jie = lunar.getNextJie() if is_forward else lunar.getPrevJie()
+        jie_solar = jie.getSolar()
+        jie_name = jie.getName()
+        jie_time = datetime(jie_solar.getYear(), jie_solar.getMonth(), jie_solar.getDay(),
+                            jie_solar.getHour(), jie_solar.getMinute(), jie_solar.getSecond())
+    
+    # 秒数不参与计算，两端都截到整分钟
+    interval = jie_time.replace(second=0) - datetime(year, month, day, hour, minute)
+    minutes = interval // timedelta(minutes=1)
+    if not is_forward:
+        minutes = -minutes
+    return _qi_yun_detail(max(0, minutes), jie_name, jie_time)
 
 def calculate_da_yun(year, month, day, hour, gender):
     """计算大运"""
     try:
-        # 转换性别为中文
-        gender_cn = '男' if gender == 'male' else '女'
-        
-        # 创建农历对象
-        solar = Solar.fromYmdHms(year, month, day, hour, 0, 0)
-        lunar = solar.getLunar()
-        
-        # 获取下一个节气日期
-        next_jie_qi = lunar.getNextJieQi()
-        next_jie_qi_solar = next_jie_qi.getSolar()
-        next_jie_qi_date = datetime(
-            next_jie_qi_solar.getYear(),
-            next_jie_qi_solar.getMonth(),
-            next_jie_qi_solar.getDay()
-        )
-        
-        # 计算起运年龄
-        birth_date = datetime(year, month, day)
-        days_diff = (next_jie_qi_date - birth_date).days
-        start_age = max(0, days_diff // 3)  # 每3天为1岁 改为从0开始
-        
-        # 确定大运顺序（阳男阴女顺行，阴男阳女逆行）
-        year_gan = lunar.getYearGan()
-        is_yang = year_gan in ['甲', '丙', '戊', '庚', '壬']
-        is_forward = (is_yang and gender_cn == '男') or (not is_yang and gender_cn == '女')
-        
-        # 生成大运列表
-        da_yun_list = []
-        current_month_gan_index = TIAN_GAN.index(lunar.getMonthGan())
-        current_month_zhi_index = DI_ZHI.index(lunar.getMonthZhi())
-        
-        for i in range(8):  # 计算8个大运
-            age_start = start_age + i * 10
-            age_end = age_start + 9
-            year_start = year + age_start
-            year_end = year_start + 9
-            
-            # 计算大运干支
-            if is_forward:
-                gan_index = (current_month_gan_index + i) % 10
-                zhi_index = (current_month_zhi_index + i) % 12
-            else:
-                gan_index = (current_month_gan_index - i) % 10
-                zhi_index = (current_month_zhi_index - i) % 12
-            
-            gan = TIAN_GAN[gan_index]
-            zhi = DI_ZHI[zhi_index]
-            
-            # 组装大运信息
-            da_yun_list.append({
-                'index': i + 1,
-                'startAge': age_start,
-                'endAge': age_end,
-                'startYear': year_start,
-                'endYear': year_end,
-                'heavenlyStem': gan,
-                'earthlyBranch': zhi,
-                'naYin': get_na_yin(gan + zhi),
-                'jiXiong': calculate_ji_xiong(gan + zhi)
-            })
+        # 获取月柱干支
+        _, _, month_gan, month_zhi, _, _ = get_ymd_gan_zhi(year, month, day)
+        start_age, is_forward = calculate_da_yun_start(year, month, day, hour, gender)
         
-        return {
-            'startAge': start_age,
-            'startYear': year + start_age,
-            'isForward': is_forward,
-            'daYunList': da_yun_list
-        }
+        return build_da_yun(year, start_age, is_forward,
+                            TIAN_GAN.index(month_gan), DI_ZHI.index(month_zhi))
     except Exception as e:
         logging.error(f"计算大运时出错: {str(e)}")
         logging.error(traceback.format_exc())
@@ -1160,35 +1048,62 @@ def calculate_da_yun(year, month, day, hour, gender):
             'daYunList': []
         }
 
+def build_da_yun(year, start_age, is_forward, month_gan_index, month_zhi_index):
+    """
+    根据起运年龄和顺逆生成大运数据
+    
+    Args:
+        year: 出生年份
+        start_age: 起运年龄
+        is_forward: 是否顺行
+        month_gan_index: 月干索引
+        month_zhi_index: 月支索引
+        
+    Returns:
+        dict: 大运信息
+    """
+    return {
+        'startAge': start_age,
+        'startYear': year + start_age,
+        'isForward': is_forward,
+        'daYunList': list(islice(iter_da_yun(year, start_age, is_forward, month_gan_index, month_zhi_index),
+                                 DA_YUN_COUNT))
+    }
+
+def iter_da_yun(year, start_age, is_forward, month_gan_index, month_zhi_index):
+    """
+    逐步生成大运，不限步数
+    
+    参数同 build_da_yun，调用方用 islice 等方式决定取多少步。
+    
+    Yields:
+        dict: 大运信息，格式与 daYunList 中的元素相同
+    """
+    step = 1 if is_forward else -1
+    for i in count():
+        age_start = start_age + i * 10
+        year_start = year + age_start
+        
+        # 大运干支从月柱起顺排或逆排
+        gan_index = (month_gan_index + step * i) % 10
+        zhi_index = (month_zhi_index + step * i) % 12
+        index60 = (6 * gan_index - 5 * zhi_index) % 60
+        
+        yield {
+            'index': i + 1,
+            'startAge': age_start,
+            'endAge': age_start + 9,
+            'startYear': year_start,
+            'endYear': year_start + 9,
+            'heavenlyStem': TIAN_GAN[gan_index],
+            'earthlyBranch': DI_ZHI[zhi_index],
+            'naYin': NA_YIN_TABLE[index60],
+            'jiXiong': JI_XIONG_TABLE[index60]
+        }
+
 def calculate_liu_nian_shen_sha(gan, zhi):
     """计算流年神煞（简化版）"""
-    try:
-        shen_sha = []
-        
-        # 太岁合
-        if gan + zhi == "甲子" or gan + zhi == "乙丑" or gan + zhi == "丙寅":
-            shen_sha.append("太岁合")
-            
-        # 驿马
-        if zhi in ["寅", "巳", "申", "亥"]:
-            shen_sha.append("驿马")
-            
-        # 华盖
-        if zhi in ["辰", "戌", "丑", "未"]:
-            shen_sha.append("华盖")
-            
-        # 金神
-        if gan in ["庚", "辛"] and zhi in ["申", "酉"]:
-            shen_sha.append("金神")
-            
-        # 天德
-        if gan in ["丙", "丁"] and zhi in ["巳", "午"]:
-            shen_sha.append("天德")
-        
-        return shen_sha
-    except Exception as e:
-        logging.error(f"计算流年神煞失败: {str(e)}")
-        return []
+    return shen_sha_rules.lookup("liuNian", gan=gan, zhi=zhi)
 
 def calculate_ji_xiong(gan_zhi):
     """计算吉凶（简化版）"""
@@ -1201,15 +1116,15 @@ def calculate_ji_xiong(gan_zhi):
         zhi = gan_zhi[1]
         
         # 简单的吉凶判断规则
-        if gan in ["甲", "丙", "戊", "庚", "壬"] and zhi in ["寅", "午", "戌"]:
+        if gan in YANG_GAN and zhi in SAN_HE[0]:
             return "大吉"
-        elif gan in ["乙", "丁", "己", "辛", "癸"] and zhi in ["巳", "酉", "丑"]:
+        elif gan in YIN_GAN and zhi in SAN_HE[1]:
             return "吉"
-        elif gan in ["乙", "丁", "己", "辛", "癸"] and zhi in ["寅", "午", "戌"]:
+        elif gan in YIN_GAN and zhi in SAN_HE[0]:
             return "小吉"
-        elif gan in ["甲", "丙", "戊", "庚", "壬"] and zhi in ["巳", "酉", "丑"]:
+        elif gan in YANG_GAN and zhi in SAN_HE[1]:
             return "小凶"
-        elif zhi in ["子", "卯", "未"]:
+        elif zhi in ("子", "卯", "未"):
             return "凶"
         else:
             return "中平"
@@ -1217,6 +1132,9 @@ def calculate_ji_xiong(gan_zhi):
         logging.error(f"计算吉凶失败: {str(e)}")
         return "中平"
 
+# 吉凶按六十甲子序号
+JI_XIONG_TABLE = tuple(calculate_ji_xiong(TIAN_GAN[i % 10] + DI_ZHI[i % 12]) for i in range(60))
+
 def get_hour_gan(day_gan, hour_zhi):
     """根据日干和时支计算时干"""
     try:
@@ -1245,211 +1163,425 @@ def get_hour_gan(day_gan, hour_zhi):
         logging.error(f"计算时干失败: {str(e)}")
         return "未知"
 
-def calculate_bazi(birth_datetime, gender):
+def parse_bazi_datetime(birth_datetime):
     """
-    计算八字
+    解析排盘使用的出生日期时间
     
     Args:
         birth_datetime: 出生日期时间字符串，格式为"YYYY-MM-DD HH:mm"或"YYYY-MM-DD 时辰 (HH:mm-HH:mm)"
-        gender: 性别（'male'或'female'）
         
     Returns:
-        dict: 八字信息
+        tuple: (年, 月, 日, 小时)
     """
-    try:
-        logging.info(f"计算八字，输入参数: birth_datetime={birth_datetime}, gender={gender}")
-        
-        # 转换性别为中文
-        gender_cn = '男' if gender == 'male' else '女'
-        
-        # 解析日期时间
-        if "时" in birth_datetime:
-            # 处理带时辰格式的日期时间
-            # 首先提取日期部分 (YYYY-MM-DD)
-            date_pattern = r"(\d{4}-\d{1,2}-\d{1,2})"
-            date_match = re.search(date_pattern, birth_datetime)
-            if not date_match:
-                raise ValueError(f"无法从字符串中提取日期: {birth_datetime}")
-                
-            date_str = date_match.group(1)
-            
-            # 提取时辰部分
-            time_pattern = r"([子丑寅卯辰巳午未申酉戌亥]时)"
-            time_match = re.search(time_pattern, birth_datetime)
-            if not time_match:
-                raise ValueError(f"无法从字符串中提取时辰: {birth_datetime}")
-                
-            time_str = time_match.group(1)
-            
-            year, month, day = map(int, date_str.split("-"))
-            
-            # 将时辰转换为小时
-            HOUR_MAPPING = {
-                "子时": 0, "丑时": 2, "寅时": 4, "卯时": 6,
-                "辰时": 8, "巳时": 10, "午时": 12, "未时": 14,
-                "申时": 16, "酉时": 18, "戌时": 20, "亥时": 22
-            }
-            hour = HOUR_MAPPING.get(time_str, 0)
-            logging.info(f"解析时辰: {time_str} -> {hour}点")
-        else:
-            # 处理标准时间格式
-            parts = birth_datetime.split(" ")
-            if len(parts) < 2:
-                raise ValueError(f"时间格式错误: {birth_datetime}，应为 'YYYY-MM-DD HH:mm' 格式")
-                
-            date_str = parts[0]
-            time_str = parts[1]
-            year, month, day = map(int, date_str.split("-"))
-            hour, minute = map(int, time_str.split(":"))
-            
-        logging.info(f"解析后的时间: {year}年{month}月{day}日 {hour}时")
+    parsed = parse_birth_datetime(birth_datetime)
+    return parsed.year, parsed.month, parsed.day, parsed.hour
+
+def resolve_birth_moment(birth_datetime, longitude=None):
+    """
+    解析出生时间，给出经度时校正为真太阳时
+    
+    Args:
+        birth_datetime: 出生日期时间字符串，格式同 parse_bazi_datetime
+        longitude: 出生地经度（东经为正），为 None 时不校正，按钟表时间排盘
         
-        # 创建农历对象
-        solar = Solar.fromYmdHms(year, month, day, hour, 0, 0)
-        lunar = solar.getLunar()
+    Returns:
+        tuple: (排盘使用的时刻 datetime, 校正信息 dict 或 None)
         
-        # 获取四柱干支
-        year_gan = lunar.getYearGan()
-        year_zhi = lunar.getYearZhi()
-        month_gan = lunar.getMonthGan()
-        month_zhi = lunar.getMonthZhi()
-        day_gan = lunar.getDayGan()
-        day_zhi = lunar.getDayZhi()
+    Raises:
+        BirthDateTimeError: 出生时间无法解析
+        ValueError: 经度超出范围
+    """
+    parsed = parse_birth_datetime(birth_datetime)
+    return correct_birth_moment(datetime(parsed.year, parsed.month, parsed.day, parsed.hour, parsed.minute),
+                                longitude)
+
+def correct_birth_moment(moment, longitude=None):
+    """
+    把钟表时间的出生时刻校正为真太阳时（扣除中国夏令时、经度时差和均时差）
+    
+    Args:
+        moment: 钟表时间 datetime
+        longitude: 出生地经度，为 None 时原样返回
         
-        # 获取时辰地支 - 修复方法
-        # lunar-python库没有getHourZhi方法，我们使用hour_zhi = DI_ZHI[hour // 2 % 12]
-        hour_index = hour // 2 % 12
-        hour_zhi = DI_ZHI[hour_index]
-        
-        # 使用自定义函数计算时干
-        hour_gan = get_hour_gan(day_gan, hour_zhi)
-        
-        # 计算年柱信息
-        year_pillar = {
-            "heavenlyStem": year_gan,
-            "earthlyBranch": year_zhi,
-            "naYin": get_na_yin(year_gan + year_zhi),
-            "shiShen": get_shi_shen_name(day_gan, year_gan),
-            "wangShuai": calculate_wang_shuai(year_zhi)
-        }
+    Returns:
+        tuple: (校正后的时刻, 校正信息 dict 或 None)
+    """
+    if longitude is None:
+        return moment, None
+    
+    solar, detail = solar_time.to_true_solar_time(moment, float(longitude))
+    return solar, {
+        "longitude": float(longitude),
+        "clockTime": moment.strftime("%Y-%m-%d %H:%M"),
+        "solarTime": solar.strftime("%Y-%m-%d %H:%M"),
+        **detail
+    }
+
+# 五行力量的权重表，五行按 FIVE_ELEMENT_KEYS 顺序（天干序号 // 2 即五行序号）
+# 前 10 行为天干（各计 100），后 12 行为地支（按藏干权重分到各五行），一柱一行相加即为 1×22 乘 22×5
+_STRENGTH_WEIGHTS = tuple(
+    tuple(100 if gan_index // 2 == element else 0 for element in range(5)) for gan_index in range(10)
+) + tuple(
+    tuple(sum(weight for gan, weight in CANG_GAN[zhi] if TIAN_GAN.index(gan) // 2 == element)
+          for element in range(5))
+    for zhi in DI_ZHI
+)
+# 按月支的旺相休囚死：与月令同五行为旺，月令所生为相，月令所克为死，克月令为囚，生月令为休
+_SEASON_STATE_ORDER = ("旺", "相", "死", "囚", "休")
+_SEASON_STATES = tuple(
+    tuple(_SEASON_STATE_ORDER[(element - _month_element) % 5] for element in range(5))
+    for _month_element in (FIVE_ELEMENT_KEYS.index(ZHI_WU_XING[zhi]) for zhi in DI_ZHI)
+)
+_SEASON_MULTIPLIERS = tuple(
+    tuple(WANG_XIANG_MULTIPLIERS[state] for state in states) for states in _SEASON_STATES
+)
+
+def weigh_five_elements(stems, branches):
+    """
+    五行力量：天干各计 1，地支按藏干权重分配，再乘以月令旺相休囚死倍数
+    
+    Args:
+        stems: 四柱天干索引
+        branches: 四柱地支索引
         
-        # 计算月柱信息
-        month_pillar = {
-            "heavenlyStem": month_gan,
-            "earthlyBranch": month_zhi,
-            "naYin": get_na_yin(month_gan + month_zhi),
-            "shiShen": get_shi_shen_name(day_gan, month_gan),
-            "wangShuai": calculate_wang_shuai(month_zhi)
-        }
+    Returns:
+        tuple: 按 FIVE_ELEMENT_KEYS 顺序的五行力量，整数，单位为 1/10000
+    """
+    raw = [0, 0, 0, 0, 0]
+    for row in (_STRENGTH_WEIGHTS[gan_index] for gan_index in stems):
+        for element, weight in enumerate(row):
+            raw[element] += weight
+    for row in (_STRENGTH_WEIGHTS[10 + zhi_index] for zhi_index in branches):
+        for element, weight in enumerate(row):
+            raw[element] += weight
+    return tuple(value * multiplier for value, multiplier in zip(raw, _SEASON_MULTIPLIERS[branches[1]]))
+
+def get_five_element_strength(stems, branches, scores=None):
+    """
+    五行强弱和日主旺衰
+    
+    Args:
+        stems: 四柱天干索引
+        branches: 四柱地支索引
+        scores: 已算好的 weigh_five_elements 结果，为 None 时现算
         
-        # 计算日柱信息
-        day_pillar = {
-            "heavenlyStem": day_gan,
-            "earthlyBranch": day_zhi,
-            "naYin": get_na_yin(day_gan + day_zhi),
-            "shiShen": "日主",
-            "wangShuai": calculate_wang_shuai(day_zhi)
+    Returns:
+        dict: scores（五行力量）、percentages（占比%）、seasonStates（月令旺相休囚死）、
+              dayMaster（日主五行、同党比例 supportRatio 和 strength 身强/中和/身弱）
+    """
+    if scores is None:
+        scores = weigh_five_elements(stems, branches)
+    total = sum(scores)
+    day_element = stems[2] // 2
+    # 同党：与日主同五行（比劫）和生日主的五行（印枭）
+    support_ratio = (scores[day_element] + scores[(day_element - 1) % 5]) / total
+    if support_ratio >= DAY_MASTER_STRONG_RATIO:
+        strength = "身强"
+    elif support_ratio <= DAY_MASTER_WEAK_RATIO:
+        strength = "身弱"
+    else:
+        strength = "中和"
+    return {
+        "scores": {key: round(value / 10000, 2) for key, value in zip(FIVE_ELEMENT_KEYS, scores)},
+        "percentages": {key: round(value * 100 / total, 1) for key, value in zip(FIVE_ELEMENT_KEYS, scores)},
+        "seasonStates": dict(zip(FIVE_ELEMENT_KEYS, _SEASON_STATES[branches[1]])),
+        "dayMaster": {
+            "stem": TIAN_GAN[stems[2]],
+            "element": FIVE_ELEMENT_KEYS[day_element],
+            "supportRatio": round(support_ratio, 3),
+            "strength": strength
         }
+    }
+
+def count_five_elements(stems, branches):
+    """
+    统计四柱天干地支的五行分布
+    
+    Args:
+        stems: 四柱天干索引
+        branches: 四柱地支索引
         
-        # 计算时柱信息
-        hour_pillar = {
-            "heavenlyStem": hour_gan,
-            "earthlyBranch": hour_zhi,
-            "naYin": get_na_yin(hour_gan + hour_zhi),
-            "shiShen": get_shi_shen_name(day_gan, hour_gan),
-            "wangShuai": calculate_wang_shuai(hour_zhi)
-        }
+    Returns:
+        tuple: 按 FIVE_ELEMENT_KEYS 顺序的五行个数
+    """
+    counts = [0, 0, 0, 0, 0]
+    for gan_index in stems:
+        counts[gan_index // 2] += 1
+    for zhi_index in branches:
+        counts[FIVE_ELEMENT_KEYS.index(ZHI_WU_XING[DI_ZHI[zhi_index]])] += 1
+    return tuple(counts)
+
+class BaziChart:
+    """
+    八字命盘的紧凑表示
+    
+    四柱干支以整数索引保存（TIAN_GAN / DI_ZHI 下标），只在 to_dict() 时才展开成
+    calculate_bazi 返回的 JSON 结构，可直接哈希和比较。
+    
+    Attributes:
+        birth_year: 出生公历年
+        stems: 年、月、日、时四柱天干索引
+        branches: 年、月、日、时四柱地支索引
+        da_yun_start_age: 起运年龄，计算失败时为 None
+        da_yun_forward: 大运是否顺行
+        flowing_end_year: 流年截止年份
+        five_elements: 按 FIVE_ELEMENT_KEYS 顺序的五行个数
+        flowing_start_year: 流年起始年份
+        element_scores: 按 FIVE_ELEMENT_KEYS 顺序的五行力量（weigh_five_elements）
+    
+    命盘只保存 flowing_start_year 到 flowing_end_year 这一段流年，默认是当前年份前后
+    BAZI_FLOWING_YEARS_BEFORE / BAZI_FLOWING_YEARS_AFTER 年（不早于出生次年）；
+    完整的大运流年时间线由 bazi_timeline 按需生成。
+    """
+    
+    __slots__ = ("birth_year", "stems", "branches", "da_yun_start_age",
+                 "da_yun_forward", "flowing_end_year", "five_elements", "flowing_start_year",
+                 "element_scores")
+    
+    def __init__(self, birth_year, stems, branches, da_yun_start_age, da_yun_forward,
+                 flowing_end_year=None, five_elements=None, flowing_start_year=None, element_scores=None):
+        self.birth_year = birth_year
+        self.stems = tuple(stems)
+        self.branches = tuple(branches)
+        self.da_yun_start_age = da_yun_start_age
+        self.da_yun_forward = da_yun_forward
+        current_year = datetime.now().year
+        if flowing_end_year is None:
+            flowing_end_year = current_year + BAZI_FLOWING_YEARS_AFTER
+        if flowing_start_year is None:
+            flowing_start_year = max(birth_year + 1, current_year - BAZI_FLOWING_YEARS_BEFORE)
+        self.flowing_end_year = flowing_end_year
+        self.flowing_start_year = flowing_start_year
+        if five_elements is None:
+            five_elements = count_five_elements(self.stems, self.branches)
+        self.five_elements = tuple(five_elements)
+        if element_scores is None:
+            element_scores = weigh_five_elements(self.stems, self.branches)
+        self.element_scores = tuple(element_scores)
+    
+    def _key(self):
+        return (self.birth_year, self.stems, self.branches, self.da_yun_start_age,
+                self.da_yun_forward, self.flowing_start_year, self.flowing_end_year)
+    
+    def __eq__(self, other):
+        if not isinstance(other, BaziChart):
+            return NotImplemented
+        return self._key() == other._key()
+    
+    def __hash__(self):
+        return hash(self._key())
+    
+    def key(self):
+        """
+        命盘的规范键：出生年、四柱、起运参数（已包含性别带来的顺逆）和流年窗口
+        
+        两个 BaziChart 的 key() 相同时，to_dict() 的结果完全相同。
+        
+        Returns:
+            str: 如 "1990:庚午辛巳庚辰癸未:7:-:2015-2035"
+        """
+        direction = "+" if self.da_yun_forward else "-"
+        return (f"{self.birth_year}:{''.join(self.pillars)}:"
+                f"{self.da_yun_start_age}:{direction}:{self.flowing_start_year}-{self.flowing_end_year}")
+    
+    def __repr__(self):
+        return f"BaziChart({self.birth_year}, {' '.join(self.pillars)})"
+    
+    def __reduce__(self):
+        return (BaziChart, (self.birth_year, self.stems, self.branches, self.da_yun_start_age,
+                            self.da_yun_forward, self.flowing_end_year, self.five_elements,
+                            self.flowing_start_year, self.element_scores))
+    
+    @property
+    def pillars(self):
+        """四柱干支字符串，如 ["庚午", "辛巳", "庚辰", "癸未"]"""
+        return [TIAN_GAN[gan] + DI_ZHI[zhi] for gan, zhi in zip(self.stems, self.branches)]
+    
+    @property
+    def day_master(self):
+        """日主（日干）"""
+        return TIAN_GAN[self.stems[2]]
+    
+    def code(self):
+        """
+        四柱的整数编码，合婚批量排序用
+        
+        每柱编为 天干序号 * 12 + 地支序号（0-119），年、月、日、时柱依次占 8 位。
+        """
+        return encode_pillars(self.stems, self.branches)
+    
+    def five_element_counts(self):
+        """五行分布统计，键为 wood/fire/earth/metal/water"""
+        return dict(zip(FIVE_ELEMENT_KEYS, self.five_elements))
+    
+    def five_element_strength(self):
+        """五行强弱和日主旺衰，见 get_five_element_strength"""
+        return get_five_element_strength(self.stems, self.branches, self.element_scores)
+    
+    def to_dict(self):
+        """
+        展开为 calculate_bazi 的返回结构
+        
+        修改返回结构时需递增 chart_cache.CHART_FORMAT_VERSION，使 MongoDB 中旧格式的缓存失效
+        
+        Returns:
+            dict: 八字信息
+        """
+        day_gan_index, day_zhi_index = self.stems[2], self.branches[2]
+        day_gan, day_zhi = TIAN_GAN[day_gan_index], DI_ZHI[day_zhi_index]
+        shi_shen_row = SHI_SHEN_TABLE[day_gan_index]
+        
+        def build_pillar(i):
+            gan_index, zhi_index = self.stems[i], self.branches[i]
+            return {
+                "heavenlyStem": TIAN_GAN[gan_index],
+                "earthlyBranch": DI_ZHI[zhi_index],
+                "naYin": NA_YIN_TABLE[(6 * gan_index - 5 * zhi_index) % 60],
+                "shiShen": "日主" if i == 2 else shi_shen_row[gan_index],
+                "wangShuai": WANG_SHUAI_TABLE[zhi_index]
+            }
         
-        # 组装结果
-        result = {
-            "yearPillar": year_pillar,
-            "monthPillar": month_pillar,
-            "dayPillar": day_pillar,
-            "hourPillar": hour_pillar,
+        if self.da_yun_start_age is None:
+            da_yun = {
+                'startAge': 1,
+                'startYear': self.birth_year + 1,
+                'isForward': True,
+                'daYunList': []
+            }
+        else:
+            da_yun = build_da_yun(self.birth_year, self.da_yun_start_age, self.da_yun_forward,
+                                  self.stems[1], self.branches[1])
+        
+        return {
+            "yearPillar": build_pillar(0),
+            "monthPillar": build_pillar(1),
+            "dayPillar": build_pillar(2),
+            "hourPillar": build_pillar(3),
             "shenSha": {
                 "dayChong": get_chong(day_zhi),
                 "zhiShen": get_zhi_shen(day_gan),
                 "xiShen": calculate_xi_shen(day_gan),
                 "fuShen": calculate_fu_shen(day_gan),
                 "caiShen": calculate_cai_shen(day_gan),
-                "benMing": calculate_ben_ming_shen_sha(year_gan, year_zhi, day_gan, day_zhi),
-                "yearGan": calculate_year_gan_shen_sha(year_gan),
-                "yearZhi": calculate_year_zhi_shen_sha(year_zhi),
-                "dayGan": calculate_day_gan_shen_sha(day_gan),
-                "dayZhi": calculate_day_zhi_shen_sha(day_zhi)
+                # 本命、年干、年支、日干、日支神煞一次查表取出
+                **shen_sha_rules.resolve_chart(self.stems[0], self.branches[0],
+                                               self.stems[2], self.branches[2])
             },
-            "daYun": calculate_da_yun(year, month, day, hour, gender_cn),
-            "flowingYears": []
-        }
-        
-        # 计算流年
-        current_year = datetime.now().year
-        start_year = year + 1
-        end_year = current_year + 10  # 往后推算10年
-        
-        for y in range(start_year, end_year + 1):
-            liu_nian = get_liu_nian(y, start_year)
-            if liu_nian:
-                liu_nian_info = {
-                    "year": y,
-                    "age": y - year,
-                    "heavenlyStem": liu_nian["gan"],
-                    "earthlyBranch": liu_nian["zhi"],
-                    "ganElement": liu_nian["ganElement"],
-                    "zhiElement": liu_nian["zhiElement"],
-                    "shenSha": calculate_liu_nian_shen_sha(liu_nian["gan"], liu_nian["zhi"]),
-                    "jiXiong": calculate_ji_xiong(liu_nian["gan"] + liu_nian["zhi"])
-                }
-                result["flowingYears"].append(liu_nian_info)
-        
-        # 添加五行分布统计
-        result["fiveElements"] = {
-            "wood": 0,
-            "fire": 0,
-            "earth": 0,
-            "metal": 0,
-            "water": 0
+            "daYun": da_yun,
+            # 流年从进程内共享的流年缓存中截取，只保留界面展示的窗口
+            "flowingYears": get_flowing_years(self.birth_year, self.flowing_start_year, self.flowing_end_year),
+            "fiveElements": self.five_element_counts(),
+            "fiveElementStrength": self.five_element_strength()
         }
+
+def calculate_bazi_chart(birth_datetime, gender, longitude=None, engine=None):
+    """
+    计算八字，返回紧凑的 BaziChart
+    
+    Args:
+        birth_datetime: 出生日期时间字符串，格式为"YYYY-MM-DD HH:mm"或"YYYY-MM-DD 时辰 (HH:mm-HH:mm)"
+        gender: 性别（'male'或'female'）
+        longitude: 出生地经度，给出时按真太阳时排盘
+        engine: 排盘引擎名，默认为 BAZI_ENGINE（见 bazi_engine）
         
-        # 统计天干五行
-        for gan in [year_gan, month_gan, day_gan, hour_gan]:
-            element = WU_XING.get(gan)
-            if element:
-                result["fiveElements"][element] += 1
-        
-        # 统计地支五行
-        for zhi in [year_zhi, month_zhi, day_zhi, hour_zhi]:
-            element_map = {
-                "子": "water", "丑": "earth",
-                "寅": "wood", "卯": "wood",
-                "辰": "earth", "巳": "fire",
-                "午": "fire", "未": "earth",
-                "申": "metal", "酉": "metal",
-                "戌": "earth", "亥": "water"
-            }
-            element = element_map.get(zhi)
-            if element:
-                result["fiveElements"][element] += 1
-        
+    Returns:
+        BaziChart: 八字命盘
+    """
+    logging.info(f"计算八字，输入参数: birth_datetime={birth_datetime}, gender={gender}, longitude={longitude}")
+    try:
+        moment, _ = resolve_birth_moment(birth_datetime, longitude)
+    except Exception as e:
+        logging.error(f"计算八字失败: {str(e)}")
+        raise
+    return _chart_at(moment, gender, engine)
+
+def _chart_at(moment, gender, engine=None):
+    """用排盘引擎按（已校正的）出生时刻排盘"""
+    # bazi_engine 依赖本模块，只能在调用时导入
+    from utils import bazi_engine
+    
+    try:
+        logging.info(f"解析后的时间: {moment.year}年{moment.month}月{moment.day}日 {moment.hour}时")
+        chart = bazi_engine.get_engine(engine).chart_at(moment.year, moment.month, moment.day,
+                                                        moment.hour, moment.minute, gender)
         logging.info("八字计算完成")
-        return result
-        
+        return chart
     except Exception as e:
         logging.error(f"计算八字失败: {str(e)}")
         logging.error(traceback.format_exc())
         raise
 
+def calculate_bazi(birth_datetime, gender, longitude=None, engine=None):
+    """
+    计算八字
+    
+    所有路由共用的排盘入口：四柱和起运由排盘引擎（bazi_engine）给出，其余字段在这里统一展开，
+    不同引擎返回的结构相同。
+    
+    Args:
+        birth_datetime: 出生日期时间字符串，格式为"YYYY-MM-DD HH:mm"或"YYYY-MM-DD 时辰 (HH:mm-HH:mm)"
+        gender: 性别（'male'或'female'）
+        longitude: 出生地经度，给出时按真太阳时排盘，结果中附带 trueSolarTime 校正信息
+        engine: 排盘引擎名，默认为 BAZI_ENGINE
+        
+    Returns:
+        dict: 八字信息
+    """
+    try:
+        moment, correction = resolve_birth_moment(birth_datetime, longitude)
+    except Exception as e:
+        logging.error(f"计算八字失败: {str(e)}")
+        raise
+    
+    # 相同命盘直接取缓存中已展开的结果
+    chart = _chart_at(moment, gender, engine)
+    result = chart_cache.get_chart_dict(chart)
+    
+    # 精确起运时间与出生分钟有关，真太阳时校正与出生地有关，都不进入命盘缓存，取出缓存后再补上
+    if chart.da_yun_start_age is not None:
+        try:
+            result["daYun"]["qiYun"] = calculate_qi_yun(moment.year, moment.month, moment.day,
+                                                        moment.hour, moment.minute, chart.da_yun_forward)
+        except Exception as e:
+            logging.error(f"计算起运时间失败: {str(e)}")
+    if correction is not None:
+        result["trueSolarTime"] = correction
+    return result
+
+# calculate_bazi 结果中参与比较的部件，trueSolarTime 只在给出经度时存在
+CHART_COMPONENTS = ("yearPillar", "monthPillar", "dayPillar", "hourPillar", "shenSha", "daYun",
+                    "flowingYears", "fiveElements", "fiveElementStrength", "trueSolarTime")
+
+def diff_bazi_charts(before, after):
+    """
+    比较两份排盘结果，列出发生变化的部件
+
+    修改出生信息后用来只更新有变化的部件，例如只改出生时辰时通常只有时柱、五行和起运相关部件变化。
+
+    Args:
+        before: 原排盘结果（calculate_bazi 的返回结构，可以为 None）
+        after: 新排盘结果
+
+    Returns:
+        dict: {部件名: {"fields": 有变化的字段（部件为 dict 时）, "before": 原值, "after": 新值}}，
+              没有变化时为空 dict；部件被移除时 after 为 None
+    """
+    before = before or {}
+    diff = {}
+    for component in CHART_COMPONENTS:
+        old, new = before.get(component), after.get(component)
+        if old == new:
+            continue
+        change = {"before": old, "after": new}
+        if isinstance(old, dict) and isinstance(new, dict):
+            change["fields"] = sorted(key for key in old.keys() | new.keys() if old.get(key) != new.get(key))
+        diff[component] = change
+    return diff
+
 def calculate_xi_shen(gan):
     """计算喜神方位"""
     try:
-        XI_SHEN_MAP = {
-            "甲": "艮", "乙": "艮",
-            "丙": "离", "丁": "离",
-            "戊": "坤", "己": "坤",
-            "庚": "兑", "辛": "兑",
-            "壬": "坎", "癸": "坎"
-        }
-        return XI_SHEN_MAP.get(gan, "未知")
+        return XI_SHEN.get(gan, "未知")
     except Exception as e:
         logging.error(f"计算喜神失败: {str(e)}")
         return "未知"
@@ -1457,14 +1589,7 @@ def calculate_xi_shen(gan):
 def calculate_fu_shen(gan):
     """计算福神方位"""
     try:
-        FU_SHEN_MAP = {
-            "甲": "坤", "乙": "坤",
-            "丙": "艮", "丁": "艮",
-            "戊": "巽", "己": "巽",
-            "庚": "乾", "辛": "乾",
-            "壬": "坤", "癸": "坤"
-        }
-        return FU_SHEN_MAP.get(gan, "未知")
+        return FU_SHEN.get(gan, "未知")
     except Exception as e:
         logging.error(f"计算福神失败: {str(e)}")
         return "未知"
@@ -1472,63 +1597,23 @@ def calculate_fu_shen(gan):
 def calculate_cai_shen(gan):
     """计算财神方位"""
     try:
-        CAI_SHEN_MAP = {
-            "甲": "艮", "乙": "巽",
-            "丙": "坤", "丁": "乾",
-            "戊": "坎", "己": "离",
-            "庚": "艮", "辛": "巽",
-            "壬": "坤", "癸": "乾"
-        }
-        return CAI_SHEN_MAP.get(gan, "未知")
+        return CAI_SHEN.get(gan, "未知")
     except Exception as e:
         logging.error(f"计算财神失败: {str(e)}")
         return "未知"
 
 def calculate_wang_shuai(zhi):
     """计算旺衰"""
-    try:
-        # 简化版旺衰判断
-        WANG = ["寅", "卯", "辰"]  # 春季旺
-        XIANG = ["巳", "午", "未"]  # 夏季旺
-        PING = ["申", "酉", "戌"]  # 秋季旺
-        SHUAI = ["亥", "子", "丑"]  # 冬季旺
-        
-        if zhi in WANG:
-            return "旺"
-        elif zhi in XIANG:
-            return "相"
-        elif zhi in PING:
-            return "平"
-        elif zhi in SHUAI:
-            return "衰"
-        else:
-            return "未知"
-    except Exception as e:
-        logging.error(f"计算旺衰失败: {str(e)}")
-        return "未知"
+    # 简化版旺衰判断
+    return WANG_SHUAI.get(zhi, "未知")
 
 def get_shi_shen_name(day_gan, target_gan):
-    """计算十神名称"""
-    try:
-        # 十神: 比肩、劫财、食神、伤官、偏财、正财、七杀、正官、偏印、正印
-        if not day_gan or not target_gan:
-            return "未知"
-            
-        day_index = TIAN_GAN.index(day_gan)
-        target_index = TIAN_GAN.index(target_gan)
-        
-        # 计算五行生克关系的索引
-        diff = (target_index - day_index) % 10
-        
-        SHI_SHEN_NAMES = [
-            "比肩", "劫财", "食神", "伤官", "偏财", 
-            "正财", "七杀", "正官", "偏印", "正印"
-        ]
-        
-        return SHI_SHEN_NAMES[diff]
-    except Exception as e:
-        logging.error(f"计算十神名称失败: {str(e)}")
+    """计算十神名称（比肩、劫财、食神、伤官、偏财、正财、七杀、正官、偏印、正印）"""
+    day_index = TIAN_GAN_INDEX.get(day_gan)
+    target_index = TIAN_GAN_INDEX.get(target_gan)
+    if day_index is None or target_index is None:
         return "未知"
+    return SHI_SHEN_TABLE[day_index][target_index]
 
 def get_liu_nian(year, birth_year):
     """
@@ -1542,36 +1627,12 @@ def get_liu_nian(year, birth_year):
         dict: 流年信息 
     """
     try:
-        # 创建公历对象
-        solar = Solar.fromYmd(year, 5, 1)  # 使用5月1日作为参考日期
-        lunar = solar.getLunar()
-        
         # 获取干支
-        gan = lunar.getYearGan()
-        zhi = lunar.getYearZhi()
-        
-        # 天干五行对应
-        gan_wu_xing = {
-            "甲": "wood", "乙": "wood",
-            "丙": "fire", "丁": "fire",
-            "戊": "earth", "己": "earth",
-            "庚": "metal", "辛": "metal",
-            "壬": "water", "癸": "water"
-        }
-        
-        # 地支五行对应
-        zhi_wu_xing = {
-            "子": "water", "丑": "earth",
-            "寅": "wood", "卯": "wood",
-            "辰": "earth", "巳": "fire",
-            "午": "fire", "未": "earth",
-            "申": "metal", "酉": "metal",
-            "戌": "earth", "亥": "water"
-        }
+        gan, zhi = get_ymd_gan_zhi(year, 5, 1)[:2]  # 使用5月1日作为参考日期
         
         # 计算五行
-        gan_element = gan_wu_xing.get(gan, "unknown")
-        zhi_element = zhi_wu_xing.get(zhi, "unknown")
+        gan_element = FIVE_ELEMENTS.get(gan, "unknown")
+        zhi_element = ZHI_WU_XING.get(zhi, "unknown")
         
         return {
             "year": year,
@@ -1585,8 +1646,379 @@ def get_liu_nian(year, birth_year):
         logging.error(f"获取流年信息失败: {str(e)}")
         return None
 
+# 流年缓存：流年的干支、五行、神煞、吉凶与出生信息无关，按年份计算一次后在进程内共享
+_flowing_year_table = None
+_flowing_year_lock = threading.Lock()
+
+@lru_cache(maxsize=512)
+def _get_flowing_year_base(year):
+    """
+    计算单个流年中与出生信息无关的字段
+    
+    结果按年份缓存，调用方不能修改返回的字典
+    
+    Args:
+        year: 流年年份
+        
+    Returns:
+        dict: 流年公共字段，计算失败时返回 None
+    """
+    liu_nian = get_liu_nian(year, year)
+    if not liu_nian:
+        return None
+    return {
+        "heavenlyStem": liu_nian["gan"],
+        "earthlyBranch": liu_nian["zhi"],
+        "ganElement": liu_nian["ganElement"],
+        "zhiElement": liu_nian["zhiElement"],
+        "shenSha": calculate_liu_nian_shen_sha(liu_nian["gan"], liu_nian["zhi"]),
+        "jiXiong": calculate_ji_xiong(liu_nian["gan"] + liu_nian["zhi"])
+    }
+
+def _get_flowing_year_table():
+    """获取覆盖速查表年份范围的预生成流年列表，首次调用时生成"""
+    global _flowing_year_table
+    if _flowing_year_table is None:
+        with _flowing_year_lock:
+            if _flowing_year_table is None:
+                _flowing_year_table = [
+                    _get_flowing_year_base(year)
+                    for year in range(bazi_calendar.TABLE_START.year, bazi_calendar.TABLE_END.year + 1)
+                ]
+                logging.info(f"流年缓存生成完成，共{len(_flowing_year_table)}年")
+    return _flowing_year_table
+
+def get_flowing_years(birth_year, start_year, end_year):
+    """
+    获取流年列表
+    
+    在速查表年份范围内直接截取预生成的流年列表，超出范围的年份逐年计算（带LRU缓存）。
+    每次返回新的字典，调用方可以自由修改。
+    
+    Args:
+        birth_year: 出生年份，用于计算年龄
+        start_year: 起始年份（包含）
+        end_year: 结束年份（包含）
+        
+    Returns:
+        list: 流年信息列表，格式与 calculate_bazi 返回的 flowingYears 相同
+    """
+    table = _get_flowing_year_table()
+    first_year = bazi_calendar.TABLE_START.year
+    if first_year <= start_year and end_year < first_year + len(table):
+        bases = table[start_year - first_year:end_year - first_year + 1]
+    else:
+        bases = [_get_flowing_year_base(year) for year in range(start_year, end_year + 1)]
+    
+    flowing_years = []
+    for year, base in zip(range(start_year, end_year + 1), bases):
+        if base:
+            flowing_years.append({
+                "year": year,
+                "age": year - birth_year,
+                "heavenlyStem": base["heavenlyStem"],
+                "earthlyBranch": base["earthlyBranch"],
+                "ganElement": base["ganElement"],
+                "zhiElement": base["zhiElement"],
+                "shenSha": list(base["shenSha"]),
+                "jiXiong": base["jiXiong"]
+            })
+    return flowing_years
+
+# 天干序号 // 2 即为五行序号；地支按下表取五行序号
+# 地支的五行序号（按 FIVE_ELEMENT_KEYS），批量计算时转成 numpy 数组
+_ZHI_ELEMENT_INDEX = tuple(FIVE_ELEMENT_KEYS.index(ZHI_WU_XING[zhi]) for zhi in DI_ZHI)
+
+def calculate_bazi_many(records):
+    """
+    批量计算八字
+    
+    先逐条解析出生时间，再用 numpy 对整批记录一次性完成速查表取柱、时柱推算、
+    五行统计和起运节气查找，最后逐条组装成与 calculate_bazi 相同结构的结果。
+    超出速查表范围的记录，以及当前排盘引擎不是速查表引擎时的全部记录，退回 calculate_bazi 单独计算。
+    
+    Args:
+        records: 出生信息列表，每项为包含 birthDate、birthTime、gender 的字典，
+                 可选 longitude（出生地经度，按真太阳时排盘）
+        
+    Returns:
+        list: 与输入顺序一致的八字信息列表，计算失败的记录为 {"error": 错误信息}
+    """
+    from utils import bazi_engine
+    
+    start_time = datetime.now()
+    results = [None] * len(records)
+    vectorized = bazi_engine.get_engine().vectorized
+    
+    # 解析出生时间，速查表范围内的记录进入向量化计算
+    batch_positions = []
+    batch_fields = []
+    for position, record in enumerate(records):
+        try:
+            parsed = parse_birth_datetime(record.get('birthDate'), record.get('birthTime') or '12:00')
+            gender = record.get('gender', 'male')
+            moment, correction = correct_birth_moment(
+                datetime(parsed.year, parsed.month, parsed.day, parsed.hour, parsed.minute),
+                record.get('longitude'))
+            if not vectorized or not bazi_calendar.in_range(moment.year, moment.month, moment.day):
+                results[position] = calculate_bazi(f"{parsed.date_text} {parsed.time_text}", gender,
+                                                   record.get('longitude'))
+                continue
+            offset = (moment.date() - bazi_calendar.TABLE_START).days
+            batch_positions.append(position)
+            batch_fields.append((moment.year, offset, moment.hour, moment.minute,
+                                 '男' if gender == 'male' else '女', correction))
+        except BirthDateTimeError as e:
+            logging.error(f"批量计算八字时解析记录 {position} 失败: {str(e)}")
+            results[position] = {"error": str(e), "code": e.code, "field": e.field}
+        except Exception as e:
+            logging.error(f"批量计算八字时计算记录 {position} 失败: {str(e)}")
+            results[position] = {"error": str(e)}
+    
+    if batch_positions:
+        import numpy as np
+        
+        table = bazi_calendar.get_table()
+        offsets = np.array([fields[1] for fields in batch_fields], dtype=np.int64)
+        hours = np.array([fields[2] for fields in batch_fields], dtype=np.int64)
+        minutes = np.array([fields[3] for fields in batch_fields], dtype=np.int64)
+        
+        # 年、月、日柱：速查表下标访问
+        year_index = np.frombuffer(table.year_index, dtype=np.uint8)[offsets].astype(np.int64)
+        month_index = np.frombuffer(table.month_index, dtype=np.uint8)[offsets].astype(np.int64)
+        day_index = np.frombuffer(table.day_index, dtype=np.uint8)[offsets].astype(np.int64)
+        
+        # 时柱：时支 = 小时 // 2，时干按五鼠遁由日干推出
+        hour_zhi = hours // 2 % 12
+        hour_gan = ((day_index % 10) % 5 * 2 + hour_zhi) % 10
+        
+        gans = np.stack([year_index % 10, month_index % 10, day_index % 10, hour_gan], axis=1)
+        zhis = np.stack([year_index % 12, month_index % 12, day_index % 12, hour_zhi], axis=1)
+        
+        # 五行分布统计
+        elements = np.concatenate([gans // 2, np.array(_ZHI_ELEMENT_INDEX, dtype=np.int64)[zhis]], axis=1)
+        counts = np.zeros((len(batch_positions), len(FIVE_ELEMENT_KEYS)), dtype=np.int64)
+        rows = np.repeat(np.arange(len(batch_positions)), elements.shape[1])
+        np.add.at(counts, (rows, elements.ravel()), 1)
+        
+        # 五行力量：每条记录 22 个干支的出现次数乘以权重表，再乘以月令旺相休囚死倍数
+        occurrences = np.zeros((len(batch_positions), len(_STRENGTH_WEIGHTS)), dtype=np.int64)
+        rows = np.repeat(np.arange(len(batch_positions)), 8)
+        np.add.at(occurrences, (rows, np.concatenate([gans, zhis + 10], axis=1).ravel()), 1)
+        element_scores = (occurrences @ np.array(_STRENGTH_WEIGHTS, dtype=np.int64)) * \
+            np.array(_SEASON_MULTIPLIERS, dtype=np.int64)[zhis[:, 1]]
+        
+        # 起运：按分钟查出生前后的节，顺逆行再逐条选取（同 calculate_qi_yun），起运年龄取其整年数
+        birth_seconds = offsets * 86400 + hours * 3600
+        jie_seconds = np.frombuffer(table.jie_seconds, dtype=np.int64)
+        birth_minute_seconds = birth_seconds + minutes * 60
+        next_jie = np.searchsorted(jie_seconds, birth_minute_seconds, side='right')
+        previous_jie = next_jie - 1
+        jie_minutes = jie_seconds // 60
+        birth_minutes = birth_minute_seconds // 60
+        next_minutes = (jie_minutes[np.minimum(next_jie, len(jie_seconds) - 1)] - birth_minutes).tolist()
+        previous_minutes = (birth_minutes - jie_minutes[np.maximum(previous_jie, 0)]).tolist()
+        next_jie = next_jie.tolist()
+        previous_jie = previous_jie.tolist()
+        
+        gans = gans.tolist()
+        zhis = zhis.tolist()
+        counts = counts.tolist()
+        element_scores = element_scores.tolist()
+        for i, position in enumerate(batch_positions):
+            try:
+                year, _, _, _, gender_cn, correction = batch_fields[i]
+                is_forward = is_da_yun_forward(TIAN_GAN[gans[i][0]], gender_cn)
+                jie = next_jie[i] if is_forward else previous_jie[i]
+                qi_yun = None
+                if 0 <= jie < len(jie_seconds):
+                    qi_yun = _qi_yun_detail(max(0, next_minutes[i] if is_forward else previous_minutes[i]),
+                                            bazi_calendar.JIE_QI_NAMES[table.jie_names[jie]],
+                                            bazi_calendar.from_seconds(table.jie_seconds[jie]))
+                chart = BaziChart(year, gans[i], zhis[i], qi_yun["years"] if qi_yun else None, is_forward,
+                                  five_elements=counts[i], element_scores=element_scores[i])
+                result = chart_cache.get_chart_dict(chart)
+                if qi_yun:
+                    result["daYun"]["qiYun"] = qi_yun
+                if correction is not None:
+                    result["trueSolarTime"] = correction
+                results[position] = result
+            except Exception as e:
+                logging.error(f"批量计算八字时组装记录 {position} 失败: {str(e)}")
+                results[position] = {"error": str(e)}
+    
+    duration = (datetime.now() - start_time).total_seconds()
+    logging.info(f"批量计算八字完成: {len(records)}条，耗时: {duration:.3f}秒")
+    return results
+
+# 合婚评分
+# 同一柱位上两人的天干五合、地支六合、三合加分，地支相冲减分，按柱位权重（日柱最重）累加到基础分上
+MATCH_BASE_SCORE = 60
+MATCH_PILLARS = ("year", "month", "day", "hour")
+MATCH_PILLAR_WEIGHTS = (2, 1, 3, 1)
+MATCH_RELATION_POINTS = MappingProxyType({"天干五合": 8, "六合": 6, "三合": 4, "相冲": -8})
+
+def _gan_relations(gan_a, gan_b):
+    """两个天干之间的合婚关系"""
+    if gan_a + gan_b in GAN_HE or gan_b + gan_a in GAN_HE:
+        return ("天干五合",)
+    return ()
+
+def _zhi_relations(zhi_a, zhi_b):
+    """两个地支之间的合婚关系，同一地支不算三合"""
+    if LIU_HE.get(zhi_a) == zhi_b:
+        return ("六合",)
+    if CHONG.get(zhi_a) == zhi_b:
+        return ("相冲",)
+    if zhi_a != zhi_b and any(zhi_a in group and zhi_b in group for group in SAN_HE):
+        return ("三合",)
+    return ()
+
+def _build_match_points():
+    """
+    预先算好每个柱位上 (甲方柱编码, 乙方柱编码) 的加权分值
+    
+    Returns:
+        tuple: 每个柱位一张 120 * 120 的分值表，下标为 甲方编码 * 120 + 乙方编码
+    """
+    pair_points = []
+    for code_a in range(120):
+        gan_a, zhi_a = TIAN_GAN[code_a // 12], DI_ZHI[code_a % 12]
+        for code_b in range(120):
+            gan_b, zhi_b = TIAN_GAN[code_b // 12], DI_ZHI[code_b % 12]
+            relations = _gan_relations(gan_a, gan_b) + _zhi_relations(zhi_a, zhi_b)
+            pair_points.append(sum(MATCH_RELATION_POINTS[relation] for relation in relations))
+    return tuple(tuple(weight * points for points in pair_points) for weight in MATCH_PILLAR_WEIGHTS)
+
+_MATCH_POINTS = None
+
+def _get_match_points():
+    """首次合婚时生成分值表"""
+    global _MATCH_POINTS
+    if _MATCH_POINTS is None:
+        _MATCH_POINTS = _build_match_points()
+    return _MATCH_POINTS
+
+def encode_pillars(stems, branches):
+    """
+    四柱天干、地支序号编码为一个整数（见 BaziChart.code）
+    
+    Args:
+        stems: 年、月、日、时柱天干序号
+        branches: 年、月、日、时柱地支序号
+        
+    Returns:
+        int: 四柱编码
+    """
+    code = 0
+    for i, (gan_index, zhi_index) in enumerate(zip(stems, branches)):
+        code |= (gan_index * 12 + zhi_index) << (8 * i)
+    return code
+
+def chart_code_from_dict(bazi_chart):
+    """
+    由 calculate_bazi 返回（或数据库中保存）的八字结构求四柱编码
+    
+    Args:
+        bazi_chart: 含 yearPillar、monthPillar、dayPillar、hourPillar 的字典
+        
+    Returns:
+        int: 四柱编码，四柱不完整时返回 None
+    """
+    try:
+        pillars = [bazi_chart[f"{name}Pillar"] for name in MATCH_PILLARS]
+        return encode_pillars([TIAN_GAN.index(pillar["heavenlyStem"]) for pillar in pillars],
+                              [DI_ZHI.index(pillar["earthlyBranch"]) for pillar in pillars])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def get_match_level(score):
+    """合婚分数对应的等级"""
+    if score >= 85:
+        return "上吉"
+    elif score >= 70:
+        return "吉"
+    elif score >= 55:
+        return "平"
+    return "凶"
+
+def compare_charts(a, b):
+    """
+    合婚：比较两个命盘
+    
+    逐柱比较两人同一柱位的干支：天干五合、地支六合、三合加分，地支相冲减分，
+    分值按 MATCH_PILLAR_WEIGHTS 加权后累加到 MATCH_BASE_SCORE 上，结果限制在 0-100。
+    
+    Args:
+        a: BaziChart
+        b: BaziChart
+        
+    Returns:
+        dict: score（0-100）、level（上吉/吉/平/凶）和逐柱的 details
+    """
+    points_tables = _get_match_points()
+    total = MATCH_BASE_SCORE
+    details = []
+    for i, name in enumerate(MATCH_PILLARS):
+        code_a = a.stems[i] * 12 + a.branches[i]
+        code_b = b.stems[i] * 12 + b.branches[i]
+        points = points_tables[i][code_a * 120 + code_b]
+        total += points
+        details.append({
+            "pillar": name,
+            "a": TIAN_GAN[a.stems[i]] + DI_ZHI[a.branches[i]],
+            "b": TIAN_GAN[b.stems[i]] + DI_ZHI[b.branches[i]],
+            "relations": list(_gan_relations(TIAN_GAN[a.stems[i]], TIAN_GAN[b.stems[i]]) +
+                              _zhi_relations(DI_ZHI[a.branches[i]], DI_ZHI[b.branches[i]])),
+            "points": points
+        })
+    score = max(0, min(100, total))
+    return {"score": score, "level": get_match_level(score), "details": details}
+
+def rank_charts(target, codes, limit=None):
+    """
+    合婚批量排序：用整数编码一次性给大量命盘打分
+    
+    分值与 compare_charts(target, 候选命盘) 完全一致，用 numpy 按柱位查分值表后求和。
+    
+    Args:
+        target: BaziChart
+        codes: 候选命盘的四柱编码序列（BaziChart.code() 或 chart_code_from_dict）
+        limit: 只返回分数最高的前 limit 个，为 None 时全部返回
+        
+    Returns:
+        list: [{"index": 候选在 codes 中的下标, "score", "level"}]，按分数从高到低、下标从小到大排序
+    """
+    import numpy as np
+    
+    codes = np.asarray(codes, dtype=np.int64)
+    if codes.size == 0:
+        return []
+    
+    points_tables = _get_match_points()
+    target_code = target.code()
+    totals = np.full(codes.shape, MATCH_BASE_SCORE, dtype=np.int64)
+    for i in range(len(MATCH_PILLARS)):
+        # 甲方这一柱固定，取出分值表中对应的一行，再按候选的柱编码取值
+        target_pillar = (target_code >> (8 * i)) & 0xFF
+        row = np.array(points_tables[i][target_pillar * 120:(target_pillar + 1) * 120], dtype=np.int64)
+        totals += row[(codes >> (8 * i)) & 0xFF]
+    scores = np.clip(totals, 0, 100)
+    
+    # 稳定排序：同分时保持原顺序
+    order = np.argsort(-scores, kind="stable")
+    if limit is not None:
+        order = order[:max(0, limit)]
+    return [{"index": int(index), "score": int(scores[index]), "level": get_match_level(int(scores[index]))}
+            for index in order]
+
 # 使用示例
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     # 测试
     test_date = "2025-05-27"
     test_time = "12:00"
@@ -1598,4 +2030,4 @@ if __name__ == "__main__":
     print(f"日柱: {result['dayPillar']['heavenlyStem']}{result['dayPillar']['earthlyBranch']}")
     print(f"时柱: {result['hourPillar']['heavenlyStem']}{result['hourPillar']['earthlyBranch']}")
     print(f"五行: {result['fiveElements']}")
-    print(f"流年: {[(y['year'], y['heavenlyStem'] + y['earthlyBranch']) for y in result['flowingYears']]}") 
\ No newline at end of file
+    print(f"流年: {[(y['year'], y['heavenlyStem'] + y['earthlyBranch']) for y in result['flowingYears']]}")
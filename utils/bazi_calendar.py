@@ -0,0 +1,314 @@
+"""
+八字历法速查表
+
+预先计算 1900-2100 年每一天的年柱、月柱、日柱（六十甲子序号），以及这段时间内
+全部节气的交接时刻，排盘时用数组下标代替 lunar_python 的对象构造。
+
+速查表随代码打包为 utils/data/bazi_calendar.bin（zlib 压缩的数组），进程内首次
+使用时加载；文件缺失或损坏时改为逐年向 lunar_python 取正月初一和节气表，再按天
+线性扫描填充数组。之后的查询都是 O(1) 的下标访问。重新生成数据文件：
+
+    python -m utils.bazi_calendar
+
+各柱的取法与 bazi_calculator 现有的 lunar_python 调用保持一致：
+
+- 年柱：getYearGan/getYearZhi，以正月初一换年
+- 月柱：getMonthGan/getMonthZhi，以节气（节）当天换月
+- 日柱：getDayGan/getDayZhi，按公历日期
+"""
+
+import bisect
+import logging
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# 天干地支
+TIAN_GAN = "甲乙丙丁戊己庚辛壬癸"
+DI_ZHI = "子丑寅卯辰巳午未申酉戌亥"
+
+# 速查表覆盖范围（与 parse_birth_date_time 允许的年份一致）
+TABLE_START = date(1900, 1, 1)
+TABLE_END = date(2100, 12, 31)
+
+# 节气时刻以相对该时刻的秒数保存（北京时间，与 lunar_python 一致）
+EPOCH = datetime(1900, 1, 1)
+
+# 二十四节气，按一年中的先后顺序
+JIE_QI_NAMES = (
+    "小寒", "大寒", "立春", "雨水", "惊蛰", "春分", "清明", "谷雨",
+    "立夏", "小满", "芒种", "夏至", "小暑", "大暑", "立秋", "处暑",
+    "白露", "秋分", "寒露", "霜降", "立冬", "小雪", "大雪", "冬至"
+)
+
+# 每个"节"开始的月份地支
+JIE_MONTH_ZHI = {
+    "小寒": 1, "立春": 2, "惊蛰": 3, "清明": 4, "立夏": 5, "芒种": 6,
+    "小暑": 7, "立秋": 8, "白露": 9, "寒露": 10, "立冬": 11, "大雪": 0
+}
+
+# lunar_python 节气表中跨年节气使用的键名
+_JIE_QI_ALIASES = {
+    "DA_XUE": "大雪", "DONG_ZHI": "冬至", "XIAO_HAN": "小寒", "DA_HAN": "大寒",
+    "LI_CHUN": "立春", "YU_SHUI": "雨水", "JING_ZHE": "惊蛰"
+}
+
+# 打包的速查表文件
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bazi_calendar.bin')
+_FILE_MAGIC = b"BZCAL1"
+_FILE_HEADER = struct.Struct("<6sIII")
+
+_lock = threading.Lock()
+_table = None
+
+
+class _CalendarTable:
+    """
+    速查表的数组存储，由 _build_table 构建或 load_table 从文件读取
+
+    jie_seconds / jie_names 是从全部节气中挑出的十二个"节"，加载时生成，不写入文件。
+    """
+
+    __slots__ = ("year_index", "month_index", "day_index",
+                 "jie_qi_seconds", "jie_qi_names", "jie_seconds", "jie_names")
+
+    def __init__(self, year_index, month_index, day_index, jie_qi_seconds, jie_qi_names):
+        self.year_index = year_index
+        self.month_index = month_index
+        self.day_index = day_index
+        self.jie_qi_seconds = jie_qi_seconds
+        self.jie_qi_names = jie_qi_names
+        # JIE_QI_NAMES 中偶数位为节，奇数位为中气
+        self.jie_seconds = array("q", (seconds for seconds, name in zip(jie_qi_seconds, jie_qi_names)
+                                       if name % 2 == 0))
+        self.jie_names = array("B", (name for name in jie_qi_names if name % 2 == 0))
+
+
+def gan_zhi_index(gan_index, zhi_index):
+    """由天干、地支序号求六十甲子序号"""
+    return (6 * gan_index - 5 * zhi_index) % 60
+
+
+def gan_zhi(index60):
+    """
+    由六十甲子序号求干支
+
+    Args:
+        index60: 六十甲子序号 (0=甲子)
+
+    Returns:
+        tuple: (天干, 地支)
+    """
+    return TIAN_GAN[index60 % 10], DI_ZHI[index60 % 12]
+
+
+def to_seconds(year, month, day, hour=0, minute=0, second=0):
+    """把北京时间转换为速查表使用的秒数"""
+    delta = datetime(year, month, day, hour, minute, second) - EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def from_seconds(seconds):
+    """把速查表秒数转换回 datetime"""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def in_range(year, month, day):
+    """判断日期是否在速查表覆盖范围内"""
+    return TABLE_START.year <= year <= TABLE_END.year
+
+
+def _solar_seconds(solar):
+    return to_seconds(solar.getYear(), solar.getMonth(), solar.getDay(),
+                      solar.getHour(), solar.getMinute(), solar.getSecond())
+
+
+def _jie_month_index(name, solar_year):
+    """求某个"节"开始的月柱序号（五虎遁）"""
+    zhi = JIE_MONTH_ZHI[name]
+    li_chun_year = solar_year - 1 if name == "小寒" else solar_year
+    year_gan = (li_chun_year - 4) % 10
+    gan = ((year_gan % 5 + 1) * 2 + (zhi - 2) % 12) % 10
+    return gan_zhi_index(gan, zhi)
+
+
+def _build_table():
+    from lunar_python import Lunar
+
+    # 逐年收集正月初一和节气时刻（多取前后各一年，保证首尾两端的查询完整）
+    new_years = {}
+    jie_qi = {}
+    for year in range(TABLE_START.year - 1, TABLE_END.year + 2):
+        lunar = Lunar.fromYmd(year, 1, 1)
+        solar = lunar.getSolar()
+        new_years[year] = date(solar.getYear(), solar.getMonth(), solar.getDay())
+        for key, jq_solar in lunar.getJieQiTable().items():
+            jie_qi[_solar_seconds(jq_solar)] = _JIE_QI_ALIASES.get(key, key)
+
+    jie_qi_seconds = array("q", sorted(jie_qi))
+    jie_qi_names = array("B", (JIE_QI_NAMES.index(jie_qi[s]) for s in jie_qi_seconds))
+
+    # 月柱在"节"当天切换：按日期整理出每个节的起始日和对应月柱
+    jie_days = []
+    for seconds, name_index in zip(jie_qi_seconds, jie_qi_names):
+        name = JIE_QI_NAMES[name_index]
+        if name in JIE_MONTH_ZHI:
+            day = from_seconds(seconds).date()
+            jie_days.append((day, _jie_month_index(name, day.year)))
+
+    days = (TABLE_END - TABLE_START).days + 1
+    year_index = array("B", bytes(days))
+    month_index = array("B", bytes(days))
+    day_index = array("B", bytes(days))
+
+    jie_pos = bisect.bisect_right(jie_days, (TABLE_START, 60)) - 1
+    current = TABLE_START
+    for i in range(days):
+        while jie_pos + 1 < len(jie_days) and jie_days[jie_pos + 1][0] <= current:
+            jie_pos += 1
+        lunar_year = current.year if current >= new_years[current.year] else current.year - 1
+        year_index[i] = (lunar_year - 4) % 60
+        month_index[i] = jie_days[jie_pos][1]
+        # 1900-01-01 为甲戌日
+        day_index[i] = (10 + i) % 60
+        current += timedelta(days=1)
+
+    return _CalendarTable(year_index, month_index, day_index, jie_qi_seconds, jie_qi_names)
+
+
+def save_table(table, path=TABLE_FILE):
+    """把速查表写入二进制文件"""
+    seconds = array("q", table.jie_qi_seconds)
+    if sys.byteorder != "little":
+        seconds.byteswap()
+    header = _FILE_HEADER.pack(_FILE_MAGIC, TABLE_START.toordinal(),
+                               len(table.day_index), len(seconds))
+    payload = (table.year_index.tobytes() + table.month_index.tobytes() +
+               table.day_index.tobytes() + seconds.tobytes() + table.jie_qi_names.tobytes())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header + zlib.compress(payload, 9))
+
+
+def load_table(path=TABLE_FILE):
+    """
+    从二进制文件加载速查表
+
+    Returns:
+        _CalendarTable: 文件不存在、损坏或覆盖范围不一致时返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, start, days, jie_qi_count = _FILE_HEADER.unpack_from(raw)
+        if (magic != _FILE_MAGIC or start != TABLE_START.toordinal() or
+                days != (TABLE_END - TABLE_START).days + 1):
+            logger.warning(f"八字历法速查表文件版本不匹配: {path}")
+            return None
+        payload = zlib.decompress(raw[_FILE_HEADER.size:])
+
+        arrays = []
+        offset = 0
+        for typecode, count in (("B", days), ("B", days), ("B", days),
+                                ("q", jie_qi_count), ("B", jie_qi_count)):
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(payload[offset:offset + size])
+            offset += size
+            arrays.append(values)
+        if sys.byteorder != "little":
+            arrays[3].byteswap()
+        return _CalendarTable(*arrays)
+    except FileNotFoundError:
+        logger.warning(f"未找到八字历法速查表文件: {path}")
+    except (struct.error, zlib.error, ValueError) as e:
+        logger.warning(f"读取八字历法速查表文件失败: {str(e)}")
+    return None
+
+
+def get_table():
+    """获取速查表，首次调用时加载打包文件，失败时现场构建"""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                start = datetime.now()
+                table = load_table()
+                if table is None:
+                    table = _build_table()
+                _table = table
+                duration = (datetime.now() - start).total_seconds()
+                logger.info(f"八字历法速查表就绪，耗时: {duration:.3f}秒")
+    return _table
+
+
+def lookup(year, month, day):
+    """
+    查询某天的年、月、日柱
+
+    Args:
+        year: 公历年
+        month: 公历月
+        day: 公历日
+
+    Returns:
+        tuple: (年柱序号, 月柱序号, 日柱序号)，均为六十甲子序号
+    """
+    if not in_range(year, month, day):
+        raise ValueError(f"日期 {year}-{month}-{day} 超出速查表范围 ({TABLE_START} ~ {TABLE_END})")
+    i = (date(year, month, day) - TABLE_START).days
+    table = get_table()
+    return table.year_index[i], table.month_index[i], table.day_index[i]
+
+
+def next_jie_qi(year, month, day, hour=0, minute=0, second=0):
+    """
+    获取给定时刻之后的第一个节气（与 lunar.getNextJieQi() 相同，包含节和中气）
+
+    Returns:
+        tuple: (节气名称, 交接时刻 datetime)
+    """
+    table = get_table()
+    pos = bisect.bisect_right(table.jie_qi_seconds, to_seconds(year, month, day, hour, minute, second))
+    if pos >= len(table.jie_qi_seconds):
+        raise ValueError(f"时刻 {year}-{month}-{day} {hour}:{minute} 超出节气表范围")
+    return JIE_QI_NAMES[table.jie_qi_names[pos]], from_seconds(table.jie_qi_seconds[pos])
+
+
+def next_jie(year, month, day, hour=0, minute=0, second=0):
+    """
+    获取给定时刻之后的第一个"节"（与 lunar.getNextJie() 相同）
+
+    Returns:
+        tuple: (节名称, 交接时刻 datetime)
+    """
+    table = get_table()
+    pos = bisect.bisect_right(table.jie_seconds, to_seconds(year, month, day, hour, minute, second))
+    if pos >= len(table.jie_seconds):
+        raise ValueError(f"时刻 {year}-{month}-{day} {hour}:{minute} 超出节气表范围")
+    return JIE_QI_NAMES[table.jie_names[pos]], from_seconds(table.jie_seconds[pos])
+
+
+def previous_jie(year, month, day, hour=0, minute=0, second=0):
+    """
+    获取给定时刻之前（含当时）的最后一个"节"（与 lunar.getPrevJie() 相同）
+
+    Returns:
+        tuple: (节名称, 交接时刻 datetime)
+    """
+    table = get_table()
+    pos = bisect.bisect_right(table.jie_seconds, to_seconds(year, month, day, hour, minute, second)) - 1
+    if pos < 0:
+        raise ValueError(f"时刻 {year}-{month}-{day} {hour}:{minute} 超出节气表范围")
+    return JIE_QI_NAMES[table.jie_names[pos]], from_seconds(table.jie_seconds[pos])
+
+
+if __name__ == "__main__":
+    save_table(_build_table())
+    print(f"已生成八字历法速查表: {TABLE_FILE}")
@@ -0,0 +1,143 @@
+"""
+排盘引擎
+
+排盘只有一个入口 bazi_calculator.calculate_bazi（路由经 chart_pool 调用）。引擎只负责
+由出生时刻求出 BaziChart（四柱索引、起运年龄和大运顺逆）；展开成 JSON、命盘缓存、
+精确起运和真太阳时校正都在 calculate_bazi 中统一处理，换引擎不会改变结果的结构。
+
+内置两个引擎，由环境变量 BAZI_ENGINE 选择：
+
+- table（默认）：bazi_calendar 逐日速查表，超出 1900-2100 年时回退到 lunar_python；
+  calculate_bazi_many 的向量化批量计算也基于速查表
+- lunar：每次都用 lunar_python 现算，作为参考实现核对速查表，速度慢得多
+
+时柱两者都按排盘的约定由小时推出（小时 // 2 为时支，时干按五鼠遁），不采用
+lunar_python 23 点换日的子时划分。新引擎继承 BaziEngine 并用 register_engine 注册。
+"""
+
+import logging
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from utils.bazi_calculator import (
+    DI_ZHI, TIAN_GAN, BaziChart, calculate_da_yun_start, get_ymd_gan_zhi, is_da_yun_forward
+)
+
+logger = logging.getLogger(__name__)
+
+BAZI_ENGINE = os.getenv('BAZI_ENGINE', 'table')
+
+_lock = threading.Lock()
+_engines = {}
+
+
+class BaziEngine:
+    """
+    排盘引擎接口
+
+    Attributes:
+        name: 引擎名，BAZI_ENGINE 中使用
+        vectorized: 是否可以使用 calculate_bazi_many 的速查表向量化计算
+    """
+
+    name = None
+    vectorized = False
+
+    def chart_at(self, year, month, day, hour, minute, gender):
+        """
+        排盘
+
+        Args:
+            year, month, day, hour, minute: 排盘使用的出生时刻（已做真太阳时校正）
+            gender: 性别（'male'或'female'）
+
+        Returns:
+            BaziChart: 八字命盘
+        """
+        raise NotImplementedError
+
+
+def _hour_pillar(day_gan_index, hour):
+    """时支 = 小时 // 2，时干按五鼠遁由日干推出"""
+    hour_zhi_index = hour // 2 % 12
+    return (day_gan_index % 5 * 2 + hour_zhi_index) % 10, hour_zhi_index
+
+
+class TableEngine(BaziEngine):
+    """速查表引擎（默认）"""
+
+    name = "table"
+    vectorized = True
+
+    def chart_at(self, year, month, day, hour, minute, gender):
+        gender_cn = '男' if gender == 'male' else '女'
+        year_gan, year_zhi, month_gan, month_zhi, day_gan, day_zhi = get_ymd_gan_zhi(year, month, day)
+        stems = [TIAN_GAN.index(year_gan), TIAN_GAN.index(month_gan), TIAN_GAN.index(day_gan)]
+        branches = [DI_ZHI.index(year_zhi), DI_ZHI.index(month_zhi), DI_ZHI.index(day_zhi)]
+        hour_gan_index, hour_zhi_index = _hour_pillar(stems[2], hour)
+        stems.append(hour_gan_index)
+        branches.append(hour_zhi_index)
+
+        try:
+            start_age, is_forward = calculate_da_yun_start(year, month, day, hour, gender_cn, minute)
+        except Exception as e:
+            logger.error(f"计算大运时出错: {str(e)}")
+            logger.error(traceback.format_exc())
+            start_age, is_forward = None, True
+        return BaziChart(year, stems, branches, start_age, is_forward)
+
+
+class LunarEngine(BaziEngine):
+    """lunar_python 参考引擎"""
+
+    name = "lunar"
+
+    def chart_at(self, year, month, day, hour, minute, gender):
+        from lunar_python import Solar
+
+        gender_cn = '男' if gender == 'male' else '女'
+        lunar = Solar.fromYmdHms(year, month, day, hour, minute, 0).getLunar()
+        stems = [TIAN_GAN.index(lunar.getYearGan()), TIAN_GAN.index(lunar.getMonthGan()),
+                 TIAN_GAN.index(lunar.getDayGan())]
+        branches = [DI_ZHI.index(lunar.getYearZhi()), DI_ZHI.index(lunar.getMonthZhi()),
+                    DI_ZHI.index(lunar.getDayZhi())]
+        hour_gan_index, hour_zhi_index = _hour_pillar(stems[2], hour)
+        stems.append(hour_gan_index)
+        branches.append(hour_zhi_index)
+
+        # 起运：按分钟数到下一个（顺行）或上一个（逆行）节，4320 分钟折 1 岁，取整年数（同 calculate_da_yun_start）
+        is_forward = is_da_yun_forward(lunar.getYearGan(), gender_cn)
+        jie = (lunar.getNextJie() if is_forward else lunar.getPrevJie()).getSolar()
+        interval = datetime(jie.getYear(), jie.getMonth(), jie.getDay(), jie.getHour(), jie.getMinute()) - \
+            datetime(year, month, day, hour, minute)
+        minutes = abs(interval // timedelta(minutes=1))
+        return BaziChart(year, stems, branches, minutes // 4320, is_forward)
+
+
+def register_engine(engine):
+    """注册引擎，同名引擎会被替换"""
+    with _lock:
+        _engines[engine.name] = engine
+
+
+def get_engine(name=None):
+    """
+    获取引擎
+
+    Args:
+        name: 引擎名，为 None 时使用 BAZI_ENGINE
+
+    Raises:
+        ValueError: 引擎不存在
+    """
+    name = name or BAZI_ENGINE
+    engine = _engines.get(name)
+    if engine is None:
+        raise ValueError(f"未知的排盘引擎: {name}（可用: {', '.join(sorted(_engines))}）")
+    return engine
+
+
+register_engine(TableEngine())
+register_engine(LunarEngine())
@@ -0,0 +1,232 @@
+"""
+八字反查索引：由四柱找出生时间
+
+把 bazi_calendar 速查表中 1900-2100 年每一天的 (年柱, 月柱, 日柱) 编成一个整数键
+（年柱序号 * 3600 + 月柱序号 * 60 + 日柱序号），和当天相对 TABLE_START 的天数一起
+按键排序，得到两个等长的 uint32 数组。查询时二分查找键的区间，再由日干和时柱推出
+时辰，不需要逐日正向排盘。
+
+索引写入 utils/data/bazi_reverse_index.bin（可用 BAZI_REVERSE_INDEX_FILE 指定），
+不压缩，进程内用 mmap 映射后直接二分查找，多个 worker 共享同一份页缓存。文件缺失或
+与当前速查表不一致时，从速查表重新生成（约几十毫秒）并尝试写回。重新生成索引文件：
+
+    python -m utils.bazi_reverse_index
+
+时辰按排盘的口径换算（小时 // 2 为时支序号，子时为 0-1 点）。
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from datetime import timedelta
+
+from utils import bazi_calendar
+
+logger = logging.getLogger(__name__)
+
+TIAN_GAN = bazi_calendar.TIAN_GAN
+DI_ZHI = bazi_calendar.DI_ZHI
+
+INDEX_FILE = os.getenv(
+    'BAZI_REVERSE_INDEX_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bazi_reverse_index.bin')
+)
+_FILE_MAGIC = b"BZREV1"
+# 魔数、速查表起始日、条目数、速查表校验和
+_FILE_HEADER = struct.Struct("<6sxxIII")
+
+_lock = threading.Lock()
+_index = None
+
+
+class _ReverseIndex:
+    """排好序的键数组和对应的天数数组（array 或 mmap 上的 memoryview）"""
+
+    __slots__ = ("keys", "offsets", "_mmap")
+
+    def __init__(self, keys, offsets, mapped=None):
+        self.keys = keys
+        self.offsets = offsets
+        self._mmap = mapped
+
+
+def _pillar_key(year_index, month_index, day_index):
+    return year_index * 3600 + month_index * 60 + day_index
+
+
+def _table_checksum(table):
+    """速查表年、月、日柱数组的校验和，速查表重新生成后索引随之失效"""
+    checksum = zlib.crc32(table.year_index.tobytes())
+    checksum = zlib.crc32(table.month_index.tobytes(), checksum)
+    return zlib.crc32(table.day_index.tobytes(), checksum)
+
+
+def build_index(table=None):
+    """
+    由速查表生成反查索引
+
+    Returns:
+        _ReverseIndex: 内存中的索引
+    """
+    table = table or bazi_calendar.get_table()
+    keys = [_pillar_key(y, m, d) for y, m, d in zip(table.year_index, table.month_index, table.day_index)]
+    # 稳定排序：同一个键下的日期保持先后顺序
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return _ReverseIndex(array("I", (keys[i] for i in order)), array("I", order))
+
+
+def save_index(index, checksum, path=INDEX_FILE):
+    """把索引写入文件（先写临时文件再改名，避免其他进程读到半个文件）"""
+    keys = array("I", index.keys)
+    offsets = array("I", index.offsets)
+    if sys.byteorder != "little":
+        keys.byteswap()
+        offsets.byteswap()
+    header = _FILE_HEADER.pack(_FILE_MAGIC, bazi_calendar.TABLE_START.toordinal(), len(keys), checksum)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header + keys.tobytes() + offsets.tobytes())
+    os.replace(temp_path, path)
+
+
+def load_index(checksum, path=INDEX_FILE):
+    """
+    用 mmap 映射索引文件
+
+    Returns:
+        _ReverseIndex: 文件不存在、损坏或与速查表不一致时返回 None
+    """
+    if sys.byteorder != "little":
+        # 文件按小端保存，大端机器上直接在内存中生成
+        return None
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取八字反查索引文件失败: {str(e)}")
+        return None
+
+    try:
+        magic, start, count, file_checksum = _FILE_HEADER.unpack_from(mapped)
+        if (magic != _FILE_MAGIC or start != bazi_calendar.TABLE_START.toordinal() or
+                file_checksum != checksum or len(mapped) != _FILE_HEADER.size + count * 8):
+            logger.warning(f"八字反查索引文件与速查表不一致: {path}")
+            mapped.close()
+            return None
+    except struct.error as e:
+        logger.warning(f"读取八字反查索引文件失败: {str(e)}")
+        mapped.close()
+        return None
+
+    view = memoryview(mapped)
+    keys = view[_FILE_HEADER.size:_FILE_HEADER.size + count * 4].cast("I")
+    offsets = view[_FILE_HEADER.size + count * 4:].cast("I")
+    return _ReverseIndex(keys, offsets, mapped)
+
+
+def get_index():
+    """获取反查索引，首次调用时映射文件或重新生成"""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                table = bazi_calendar.get_table()
+                checksum = _table_checksum(table)
+                index = load_index(checksum)
+                if index is None:
+                    index = build_index(table)
+                    try:
+                        save_index(index, checksum)
+                    except OSError as e:
+                        logger.warning(f"写入八字反查索引文件失败: {str(e)}")
+                _index = index
+    return _index
+
+
+def parse_pillars(pillars):
+    """
+    解析四柱输入
+
+    Args:
+        pillars: "庚午 辛巳 庚辰 癸未"、"庚午辛巳庚辰癸未"（可用空格或逗号分隔）或干支列表；
+                 时柱可以省略
+
+    Returns:
+        list: 每柱的六十甲子序号，3 或 4 个
+
+    Raises:
+        ValueError: 柱数不对或不是有效的六十甲子
+    """
+    if isinstance(pillars, str):
+        text = "".join(pillars.replace(",", " ").replace("，", " ").split())
+        pillars = [text[i:i + 2] for i in range(0, len(text), 2)]
+    if len(pillars) not in (3, 4):
+        raise ValueError("请提供年、月、日柱（时柱可选）")
+
+    indexes = []
+    for pillar in pillars:
+        if not isinstance(pillar, str) or len(pillar) != 2 or pillar[0] not in TIAN_GAN or pillar[1] not in DI_ZHI:
+            raise ValueError(f"无效的干支: {pillar}")
+        gan_index = TIAN_GAN.index(pillar[0])
+        zhi_index = DI_ZHI.index(pillar[1])
+        # 天干地支阴阳相同才是六十甲子中的一柱
+        if gan_index % 2 != zhi_index % 2:
+            raise ValueError(f"无效的干支: {pillar}")
+        indexes.append(bazi_calendar.gan_zhi_index(gan_index, zhi_index))
+    return indexes
+
+
+def find_birth_datetimes(pillars):
+    """
+    反查产生给定四柱的公历出生时间（1900-2100 年）
+
+    Args:
+        pillars: 见 parse_pillars
+
+    Returns:
+        list: 按时间先后的 {"date": "YYYY-MM-DD", "startTime": "HH:MM", "endTime": "HH:MM"}；
+              不指定时柱时为整天 00:00-23:59
+
+    Raises:
+        ValueError: 输入无效
+    """
+    indexes = parse_pillars(pillars)
+    index = get_index()
+    key = _pillar_key(*indexes[:3])
+    low = bisect.bisect_left(index.keys, key)
+    high = bisect.bisect_right(index.keys, key, low)
+    if low == high:
+        return []
+
+    start_time, end_time = "00:00", "23:59"
+    if len(indexes) == 4:
+        hour_gan, hour_zhi = indexes[3] % 10, indexes[3] % 12
+        # 时干由日干按五鼠遁推出，同一个键下的日干都相同
+        day_gan = indexes[2] % 10
+        if (day_gan % 5 * 2 + hour_zhi) % 10 != hour_gan:
+            return []
+        start_time, end_time = f"{hour_zhi * 2:02d}:00", f"{hour_zhi * 2 + 1:02d}:59"
+
+    return [
+        {
+            "date": (bazi_calendar.TABLE_START + timedelta(days=offset)).isoformat(),
+            "startTime": start_time,
+            "endTime": end_time
+        }
+        for offset in index.offsets[low:high]
+    ]
+
+
+if __name__ == "__main__":
+    calendar_table = bazi_calendar.get_table()
+    save_index(build_index(calendar_table), _table_checksum(calendar_table))
+    print(f"已生成八字反查索引: {INDEX_FILE}")
@@ -0,0 +1,184 @@
+"""
+大运流年时间线
+
+命盘（calculate_bazi）只保存前 8 步大运和当前年份附近的流年窗口。这里用生成器按需
+逐步生成一生的时间线：每一步大运连同其中的流年（可选每年的流月）只在被取到时才计算，
+接口按 offset / limit 分页读取，不需要一次展开整个人生。
+
+时间线的每一项是一个大运周期：
+
+    {
+        "index": 0,            // 0 为起运前，1 起为第几步大运
+        "startAge", "endAge", "startYear", "endYear",
+        "heavenlyStem", "earthlyBranch", "naYin", "jiXiong",   // 起运前的周期没有这些字段
+        "liuNian": [...]       // 格式同 flowingYears，include_months 时每年带 liuYue
+    }
+"""
+
+import os
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+
+from utils import bazi_calendar
+from utils.bazi_calculator import (
+    DI_ZHI, TIAN_GAN, calculate_ji_xiong, get_flowing_years, get_na_yin, iter_da_yun
+)
+
+# 时间线默认推算到的年龄
+BAZI_TIMELINE_MAX_AGE = int(os.getenv('BAZI_TIMELINE_MAX_AGE', '120'))
+# 每页最多返回的大运周期数
+BAZI_TIMELINE_MAX_LIMIT = int(os.getenv('BAZI_TIMELINE_MAX_LIMIT', '20'))
+
+
+def _next_jie(moment):
+    """
+    给定时刻之后的第一个节
+
+    速查表范围内二分查找，超出范围时回退到 lunar_python。
+
+    Returns:
+        tuple: (节名称, 交节时刻 datetime)
+    """
+    if bazi_calendar.in_range(moment.year, moment.month, moment.day):
+        try:
+            return bazi_calendar.next_jie(moment.year, moment.month, moment.day,
+                                          moment.hour, moment.minute, moment.second)
+        except ValueError:
+            # 速查表最后一个节之后，交给 lunar_python
+            pass
+
+    from lunar_python import Solar
+
+    jie = Solar.fromYmdHms(moment.year, moment.month, moment.day,
+                           moment.hour, moment.minute, moment.second).getLunar().getNextJie()
+    solar = jie.getSolar()
+    return jie.getName(), datetime(solar.getYear(), solar.getMonth(), solar.getDay(),
+                                   solar.getHour(), solar.getMinute(), solar.getSecond())
+
+
+@lru_cache(maxsize=256)
+def _get_liu_yue(year):
+    """
+    计算一个流年的十二个流月，按年份缓存，调用方不能修改返回的字典
+
+    流月从当年立春（寅月）排到次年小寒（丑月），月干按五虎遁由年干推出。
+    """
+    year_gan_index = (year - 4) % 10
+    first_gan_index = (year_gan_index % 5 * 2 + 2) % 10
+
+    # 小寒在一月上旬，从 1 月 20 日往后找到的第一个节就是立春
+    jie_name, jie_time = _next_jie(datetime(year, 1, 20))
+    months = []
+    for i in range(12):
+        gan = TIAN_GAN[(first_gan_index + i) % 10]
+        zhi = DI_ZHI[(2 + i) % 12]
+        months.append({
+            "month": i + 1,
+            "jieQi": jie_name,
+            "startTime": jie_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "heavenlyStem": gan,
+            "earthlyBranch": zhi,
+            "naYin": get_na_yin(gan + zhi),
+            "jiXiong": calculate_ji_xiong(gan + zhi)
+        })
+        jie_name, jie_time = _next_jie(jie_time)
+    return tuple(months)
+
+
+def iter_liu_yue(year):
+    """
+    逐月生成流年 year 的流月
+
+    Args:
+        year: 流年年份（以立春为界）
+
+    Yields:
+        dict: month（1 为寅月）、jieQi、startTime、heavenlyStem、earthlyBranch、naYin、jiXiong
+    """
+    for month in _get_liu_yue(year):
+        yield dict(month)
+
+
+def _liu_nian(chart, start_year, end_year, include_months):
+    """一个周期内的流年列表"""
+    liu_nian = get_flowing_years(chart.birth_year, start_year, end_year)
+    if include_months:
+        for year_data in liu_nian:
+            year_data["liuYue"] = list(iter_liu_yue(year_data["year"]))
+    return liu_nian
+
+
+def _iter_periods(chart, max_age):
+    """逐步生成大运周期本身，不含流年"""
+    if chart.da_yun_start_age is None:
+        return
+
+    start_age = chart.da_yun_start_age
+    if start_age > 0:
+        yield {
+            "index": 0,
+            "startAge": 0,
+            "endAge": start_age - 1,
+            "startYear": chart.birth_year,
+            "endYear": chart.birth_year + start_age - 1
+        }
+
+    for da_yun in iter_da_yun(chart.birth_year, start_age, chart.da_yun_forward,
+                              chart.stems[1], chart.branches[1]):
+        if max_age is not None and da_yun["startAge"] > max_age:
+            return
+        yield da_yun
+
+
+def iter_timeline(chart, include_months=False, max_age=None):
+    """
+    逐步生成命盘的大运流年时间线
+
+    起运前的年份（出生当年到起运前一年）作为第 0 项，之后每步大运一项。
+    起运年龄未能算出（da_yun_start_age 为 None）的命盘没有时间线。
+
+    Args:
+        chart: BaziChart
+        include_months: 流年是否附带流月
+        max_age: 推算到的最大年龄（包含该年龄所在的大运），为 None 时不限
+
+    Yields:
+        dict: 大运周期，见模块说明
+    """
+    for period in _iter_periods(chart, max_age):
+        period["liuNian"] = _liu_nian(chart, period["startYear"], period["endYear"], include_months)
+        yield period
+
+
+def get_timeline_page(chart, offset=0, limit=3, include_months=False, max_age=None):
+    """
+    分页读取时间线，只计算本页的大运周期
+
+    Args:
+        chart: BaziChart
+        offset: 跳过的周期数
+        limit: 本页周期数，最多 BAZI_TIMELINE_MAX_LIMIT
+        include_months: 流年是否附带流月
+        max_age: 推算到的最大年龄，默认 BAZI_TIMELINE_MAX_AGE
+
+    Returns:
+        dict: items（大运周期列表）、offset、limit、hasMore
+    """
+    offset = max(0, offset)
+    limit = max(1, min(limit, BAZI_TIMELINE_MAX_LIMIT))
+    if max_age is None:
+        max_age = BAZI_TIMELINE_MAX_AGE
+
+    # 先只生成大运周期，跳过的周期和用来判断 hasMore 的下一项都不展开流年
+    items = list(islice(_iter_periods(chart, max_age), offset, offset + limit + 1))
+    has_more = len(items) > limit
+    items = items[:limit]
+    for period in items:
+        period["liuNian"] = _liu_nian(chart, period["startYear"], period["endYear"], include_months)
+    return {
+        "items": items,
+        "offset": offset,
+        "limit": limit,
+        "hasMore": has_more
+    }
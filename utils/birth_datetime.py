@@ -0,0 +1,152 @@
+"""
+出生日期时间解析
+
+所有路由、排盘和 AI 服务共用的出生时间解析器。一条预编译的正则一次匹配整个输入，
+再查表把时辰换算成小时，支持的写法：
+
+- 日期：YYYY-MM-DD、YYYY/MM/DD、YYYY.MM.DD、YYYYMMDD（分隔写法的年份可以少于四位）
+- 时间：HH:MM、HH:MM:SS（ISO 写法 YYYY-MM-DDTHH:MM:SS 也可以）
+- 时辰："子时 (23:00-01:00)"、"子时"、单字地支"子"
+
+日期和时间既可以分两个参数传入，也可以合在一个字符串里（以空格或 T 分隔）。
+解析失败时抛出 BirthDateTimeError，它是 ValueError 的子类，带有错误代码和出错字段，
+路由可以直接把 to_dict() 的结果返回给前端。
+"""
+
+import re
+from collections import namedtuple
+from datetime import date
+
+# 地支顺序，时辰对应的小时为序号 * 2（子时记为 0 点）
+DI_ZHI = "子丑寅卯辰巳午未申酉戌亥"
+
+_DATE = (r"(?:(?P<year>\d{1,4})(?P<sep>[-/.])(?P<month>\d{1,2})(?P=sep)(?P<day>\d{1,2})"
+         r"|(?P<compact_year>\d{4})(?P<compact_month>\d{2})(?P<compact_day>\d{2}))")
+_TIME = (r"(?:(?P<hour>\d{1,2}):(?P<minute>\d{1,2})(?::(?P<second>\d{1,2})(?:\.\d+)?)?"
+         r"|(?P<zhi>[子丑寅卯辰巳午未申酉戌亥])时?(?:\s*[(（][^)）]*[)）])?)")
+
+_DATE_TIME_PATTERN = re.compile(rf"\s*{_DATE}(?:(?:\s+|T){_TIME})?\s*")
+_TIME_PATTERN = re.compile(rf"\s*{_TIME}\s*")
+
+# 错误代码
+MISSING_DATE = "missing_date"
+MISSING_TIME = "missing_time"
+INVALID_FORMAT = "invalid_format"
+INVALID_DATE = "invalid_date"
+INVALID_TIME = "invalid_time"
+OUT_OF_RANGE = "out_of_range"
+
+
+class BirthDateTimeError(ValueError):
+    """
+    出生时间解析错误
+
+    Attributes:
+        code: 错误代码（MISSING_DATE、INVALID_FORMAT 等）
+        field: 出错的字段，birthDate 或 birthTime
+        value: 原始输入
+    """
+
+    def __init__(self, code, message, field=None, value=None):
+        super().__init__(message)
+        self.code = code
+        self.field = field
+        self.value = value
+
+    def to_dict(self):
+        return {"code": self.code, "field": self.field, "message": str(self)}
+
+
+class BirthDateTime(namedtuple("BirthDateTime", "year month day hour minute shi_chen")):
+    """
+    解析后的出生时间
+
+    Attributes:
+        year, month, day: 公历年月日
+        hour, minute: 小时、分钟；按时辰输入时为该时辰的起始小时，分钟为 0
+        shi_chen: 按时辰输入时的地支（如"子"），按钟点输入时为 None
+    """
+
+    __slots__ = ()
+
+    @property
+    def date_text(self):
+        """YYYY-MM-DD"""
+        return f"{self.year:04d}-{self.month:02d}-{self.day:02d}"
+
+    @property
+    def time_text(self):
+        """HH:MM"""
+        return f"{self.hour:02d}:{self.minute:02d}"
+
+    def to_dict(self):
+        """与 parse_birth_date_time 相同的 {'year', 'month', 'day', 'hour'} 字典"""
+        return {"year": self.year, "month": self.month, "day": self.day, "hour": self.hour}
+
+
+def parse_birth_datetime(birth_date, birth_time=None, require_time=True, year_range=None):
+    """
+    解析出生日期时间
+
+    Args:
+        birth_date: 出生日期，或日期和时间合在一起的字符串
+        birth_time: 出生时间或时辰；为 None 时从 birth_date 中读取
+        require_time: 缺少时间时是否报错；不报错时按 0 点处理
+        year_range: (最小年份, 最大年份)，为 None 时不限制
+
+    Returns:
+        BirthDateTime: 解析结果
+
+    Raises:
+        BirthDateTimeError: 输入缺失、格式无法识别或日期时间无效
+    """
+    if not birth_date or not isinstance(birth_date, str):
+        raise BirthDateTimeError(MISSING_DATE, "出生日期不能为空", "birthDate", birth_date)
+
+    match = _DATE_TIME_PATTERN.fullmatch(birth_date)
+    if match is None:
+        raise BirthDateTimeError(INVALID_FORMAT, f"日期格式错误: {birth_date}，应为 YYYY-MM-DD 格式",
+                                 "birthDate", birth_date)
+    time_match = match
+    time_field = "birthDate"
+
+    if birth_time is not None and birth_time != "":
+        if not isinstance(birth_time, str):
+            raise BirthDateTimeError(INVALID_FORMAT, f"无法识别的时间格式: {birth_time}", "birthTime", birth_time)
+        if match.group("hour") is not None or match.group("zhi") is not None:
+            raise BirthDateTimeError(INVALID_FORMAT, f"出生日期中不应包含时间: {birth_date}",
+                                     "birthDate", birth_date)
+        time_match = _TIME_PATTERN.fullmatch(birth_time)
+        if time_match is None:
+            raise BirthDateTimeError(INVALID_FORMAT, f"无法识别的时间格式: {birth_time}", "birthTime", birth_time)
+        time_field = "birthTime"
+
+    groups = match.groupdict()
+    year = int(groups["year"] or groups["compact_year"])
+    month = int(groups["month"] or groups["compact_month"])
+    day = int(groups["day"] or groups["compact_day"])
+    try:
+        date(year, month, day)
+    except ValueError:
+        raise BirthDateTimeError(INVALID_DATE, f"无效的日期: {year}-{month}-{day}", "birthDate", birth_date)
+    if year_range is not None and not year_range[0] <= year <= year_range[1]:
+        raise BirthDateTimeError(OUT_OF_RANGE, f"年份 {year} 超出范围 ({year_range[0]}-{year_range[1]})",
+                                 "birthDate", birth_date)
+
+    time_groups = time_match.groupdict()
+    zhi = time_groups["zhi"]
+    if zhi is not None:
+        return BirthDateTime(year, month, day, DI_ZHI.index(zhi) * 2, 0, zhi)
+
+    if time_groups["hour"] is None:
+        if require_time:
+            raise BirthDateTimeError(MISSING_TIME, "出生时辰不能为空", "birthTime", birth_time)
+        return BirthDateTime(year, month, day, 0, 0, None)
+
+    hour = int(time_groups["hour"])
+    minute = int(time_groups["minute"])
+    second = int(time_groups["second"] or 0)
+    if hour > 23 or minute > 59 or second > 59:
+        raise BirthDateTimeError(INVALID_TIME, f"时间超出范围: {time_match.group(0).strip()}",
+                                 time_field, birth_time if time_field == "birthTime" else birth_date)
+    return BirthDateTime(year, month, day, hour, minute, None)
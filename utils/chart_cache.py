@@ -0,0 +1,163 @@
+"""
+八字命盘结果缓存
+
+同一天同一时辰出生、性别相同的两个人，四柱、大运、神煞完全相同。排盘时先算出
+紧凑的 BaziChart（只有速查表下标访问，开销很小），用 BaziChart.key() 作为规范
+键，在有界的进程内 LRU 缓存中查找已经展开好的命盘字典；未命中时再展开并写入。
+
+可选的 MongoDB 二级缓存（BAZI_CHART_CACHE_MONGO=1 启用）让多个进程共享展开结果。
+二级缓存的键带上命盘格式版本 CHART_FORMAT_VERSION，BaziChart.to_dict() 的输出结构
+变化时递增版本，旧格式的记录不再命中；记录带 expireAt 字段，由 TTL 索引到期自动删除。
+
+通过环境变量配置：
+
+- BAZI_CHART_CACHE_SIZE：进程内缓存条目上限（默认 4096，0 表示不缓存）
+- BAZI_CHART_CACHE_MONGO：是否启用 MongoDB 二级缓存（默认 0）
+- BAZI_CHART_CACHE_COLLECTION：二级缓存集合名（默认 bazi_chart_cache）
+- BAZI_CHART_CACHE_TTL：二级缓存记录保留秒数（默认 30 天）
+
+缓存中保存的是序列化后的字典，每次命中都返回一份新的副本，调用方可以放心修改。
+"""
+
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+BAZI_CHART_CACHE_SIZE = int(os.getenv('BAZI_CHART_CACHE_SIZE', '4096'))
+BAZI_CHART_CACHE_MONGO = os.getenv('BAZI_CHART_CACHE_MONGO', '0') == '1'
+BAZI_CHART_CACHE_COLLECTION = os.getenv('BAZI_CHART_CACHE_COLLECTION', 'bazi_chart_cache')
+BAZI_CHART_CACHE_TTL = float(os.getenv('BAZI_CHART_CACHE_TTL', str(30 * 24 * 3600)))
+
+# 命盘字典格式版本，BaziChart.to_dict() 的输出结构变化时递增
+CHART_FORMAT_VERSION = 1
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_stats = {"hits": 0, "mongoHits": 0, "misses": 0}
+_collection = None
+
+
+def _get_collection():
+    """获取 MongoDB 二级缓存集合，未启用或连接失败时返回 None"""
+    global _collection, BAZI_CHART_CACHE_MONGO
+    if not BAZI_CHART_CACHE_MONGO:
+        return None
+    if _collection is None:
+        try:
+            from pymongo import MongoClient
+            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/bazi_system')
+            client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+            collection = client.get_database()[BAZI_CHART_CACHE_COLLECTION]
+            collection.create_index("expireAt", expireAfterSeconds=0)
+            _collection = collection
+        except Exception as e:
+            logger.error(f"连接命盘二级缓存失败，已停用二级缓存: {str(e)}")
+            BAZI_CHART_CACHE_MONGO = False
+            return None
+    return _collection
+
+
+def _mongo_id(key):
+    """二级缓存记录的 _id：格式版本 + 命盘规范键"""
+    return f"v{CHART_FORMAT_VERSION}:{key}"
+
+
+def _mongo_get(key):
+    collection = _get_collection()
+    if collection is None:
+        return None
+    try:
+        # TTL 索引每分钟才清理一次，过期但未删除的记录不用
+        doc = collection.find_one({"_id": _mongo_id(key), "expireAt": {"$gt": datetime.utcnow()}})
+        return doc["chart"] if doc else None
+    except Exception as e:
+        logger.warning(f"读取命盘二级缓存失败: {str(e)}")
+        return None
+
+
+def _mongo_put(key, chart_dict):
+    collection = _get_collection()
+    if collection is None:
+        return
+    try:
+        mongo_id = _mongo_id(key)
+        collection.replace_one({"_id": mongo_id}, {
+            "_id": mongo_id,
+            "chart": chart_dict,
+            "expireAt": datetime.utcnow() + timedelta(seconds=BAZI_CHART_CACHE_TTL)
+        }, upsert=True)
+    except Exception as e:
+        logger.warning(f"写入命盘二级缓存失败: {str(e)}")
+
+
+def _remember(key, payload):
+    with _lock:
+        _cache[key] = payload
+        _cache.move_to_end(key)
+        while len(_cache) > BAZI_CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_chart_dict(chart):
+    """
+    获取命盘的完整字典，优先使用缓存
+
+    Args:
+        chart: BaziChart
+
+    Returns:
+        dict: 与 chart.to_dict() 相同的八字信息（每次返回新的副本）
+    """
+    if BAZI_CHART_CACHE_SIZE <= 0 and not BAZI_CHART_CACHE_MONGO:
+        return chart.to_dict()
+
+    key = chart.key()
+    with _lock:
+        payload = _cache.get(key)
+        if payload is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+    if payload is not None:
+        return pickle.loads(payload)
+
+    chart_dict = _mongo_get(key)
+    if chart_dict is not None:
+        with _lock:
+            _stats["mongoHits"] += 1
+    else:
+        with _lock:
+            _stats["misses"] += 1
+        chart_dict = chart.to_dict()
+        _mongo_put(key, chart_dict)
+
+    if BAZI_CHART_CACHE_SIZE > 0:
+        payload = pickle.dumps(chart_dict, pickle.HIGHEST_PROTOCOL)
+        _remember(key, payload)
+        return pickle.loads(payload)
+    return chart_dict
+
+
+def get_cache_stats():
+    """
+    获取缓存命中统计
+
+    Returns:
+        dict: hits（进程内命中）、mongoHits（二级缓存命中）、misses（未命中）、size（进程内条目数）
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_cache)
+    return stats
+
+
+def clear_cache():
+    """清空进程内缓存并重置命中统计"""
+    with _lock:
+        _cache.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,156 @@
+"""
+八字排盘进程池
+
+排盘是纯 CPU 计算，在 Flask 请求线程里直接执行会和 DeepSeek、MongoDB 的 I/O
+线程争抢 GIL。这里提供一个可选的进程池：路由把排盘任务提交到池中执行，worker
+进程启动时预先加载 lunar_python、历法速查表和流年表，避免首个请求承担冷启动开销。
+
+通过环境变量配置：
+
+- BAZI_POOL_WORKERS：worker 进程数，0（默认）表示不启用进程池，直接在当前线程计算
+- BAZI_POOL_MAX_PENDING：池中允许排队的最大任务数（默认 worker 数的 4 倍），
+  超出时不再排队，改为在当前线程直接计算
+- BAZI_POOL_TIMEOUT：等待单个任务结果的秒数（默认 30），超时后抛出 TimeoutError；
+  不在当前线程重算，以免同一任务占用两份 CPU
+
+进程池在每个进程内首次使用时才创建，gunicorn 预加载应用后 fork 出的每个 worker
+各自持有独立的进程池。
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import bazi_calculator
+
+logger = logging.getLogger(__name__)
+
+BAZI_POOL_WORKERS = int(os.getenv('BAZI_POOL_WORKERS', '0'))
+BAZI_POOL_MAX_PENDING = int(os.getenv('BAZI_POOL_MAX_PENDING', str(BAZI_POOL_WORKERS * 4)))
+BAZI_POOL_TIMEOUT = float(os.getenv('BAZI_POOL_TIMEOUT', '30'))
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_pending = 0
+
+
+def _warm_worker():
+    """worker 进程初始化：预加载 lunar_python、历法速查表和流年表"""
+    import lunar_python  # noqa: F401
+    from utils import bazi_calendar
+
+    bazi_calendar.get_table()
+    bazi_calculator._get_flowing_year_table()
+
+
+def _get_pool():
+    """获取当前进程的进程池，未启用时返回 None"""
+    global _pool, _pool_pid, _pending
+    if BAZI_POOL_WORKERS <= 0:
+        return None
+    # fork 出来的子进程不能复用父进程的进程池
+    if _pool is None or _pool_pid != os.getpid():
+        with _lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=BAZI_POOL_WORKERS, initializer=_warm_worker)
+                _pool_pid = os.getpid()
+                _pending = 0
+                logger.info(f"八字排盘进程池已创建，worker 数: {BAZI_POOL_WORKERS}")
+    return _pool
+
+
+def _reset_pool():
+    """进程池损坏后丢弃，下次使用时重新创建"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def _acquire_slot():
+    global _pending
+    with _lock:
+        if _pending >= BAZI_POOL_MAX_PENDING:
+            return False
+        _pending += 1
+        return True
+
+
+def _release_slot(_future=None):
+    global _pending
+    with _lock:
+        _pending = max(0, _pending - 1)
+
+
+def run_chart_job(func, *args):
+    """
+    执行排盘任务：进程池可用且未饱和时提交到进程池，否则在当前线程直接执行
+
+    Args:
+        func: bazi_calculator 中可被 pickle 的模块级函数
+        *args: 函数参数
+
+    Returns:
+        函数返回值；函数抛出的异常原样抛出
+
+    Raises:
+        TimeoutError: 进程池中的任务超过 BAZI_POOL_TIMEOUT 秒未完成
+    """
+    pool = _get_pool()
+    if pool is None or not _acquire_slot():
+        if pool is not None:
+            logger.info(f"八字排盘进程池已满，在当前线程执行: {func.__name__}")
+        return func(*args)
+
+    try:
+        future = pool.submit(func, *args)
+    except (BrokenProcessPool, RuntimeError) as e:
+        _release_slot()
+        logger.error(f"提交排盘任务到进程池失败，在当前线程执行: {str(e)}")
+        _reset_pool()
+        return func(*args)
+    future.add_done_callback(_release_slot)
+
+    try:
+        return future.result(timeout=BAZI_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        # 仍在排队的任务直接取消；已在执行的任务无法中断，完成后自动释放排队名额
+        logger.error(f"排盘任务超时({BAZI_POOL_TIMEOUT}秒): {func.__name__}")
+        future.cancel()
+        raise TimeoutError(f"排盘任务超时（{BAZI_POOL_TIMEOUT}秒）") from None
+    except BrokenProcessPool as e:
+        logger.error(f"八字排盘进程池异常，在当前线程重新计算: {str(e)}")
+        _reset_pool()
+        return func(*args)
+
+
+def calculate_bazi(birth_datetime, gender, longitude=None):
+    """在进程池中计算八字，参数与返回值同 bazi_calculator.calculate_bazi"""
+    return run_chart_job(bazi_calculator.calculate_bazi, birth_datetime, gender, longitude)
+
+
+def calculate_bazi_many(records):
+    """在进程池中批量计算八字，参数与返回值同 bazi_calculator.calculate_bazi_many"""
+    return run_chart_job(bazi_calculator.calculate_bazi_many, records)
+
+
+def calculate_flowing_years(gender, bazi_data):
+    """在进程池中计算流年，参数与返回值同 bazi_calculator.calculate_flowing_years"""
+    return run_chart_job(bazi_calculator.calculate_flowing_years, gender, bazi_data)
+
+
+def shutdown_pool():
+    """关闭当前进程的进程池"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
@@ -0,0 +1,211 @@
+"""
+大模型 HTTP 客户端
+
+ai_service 中所有大模型调用（DeepSeek、OpenAI）共用一个进程内的 requests.Session：
+连接池复用到 API 服务器的 keep-alive 连接，不再每次分析都重新握手 TLS。
+
+通过环境变量配置：
+
+- LLM_CONNECT_TIMEOUT / LLM_READ_TIMEOUT：连接和读取超时秒数（默认 5 / 180），
+  读取超时按两次收到数据之间的间隔计算，长篇分析生成慢也不会误判
+- LLM_MAX_CONCURRENCY：同时进行的请求数上限（默认 8），超出时排队等待
+- LLM_ACQUIRE_TIMEOUT：排队等待的最长秒数（默认 300），超时放弃本次调用
+- LLM_MAX_RETRIES：遇到 429、5xx 或连接失败时的最多重试次数（默认 3）
+- LLM_RETRY_BASE_DELAY / LLM_RETRY_MAX_DELAY：重试退避的基数和上限秒数（默认 1 / 30），
+  第 n 次重试前随机等待 [0, min(上限, 基数 * 2^n)] 秒，响应带 Retry-After 时至少等待该时长
+
+读取超时不重试：请求可能已经在服务端生成，重试只会再等一遍。stream_events 用于
+stream: true 的 SSE 响应，读取超时同样按两次收到数据之间的间隔计算。
+Session 在每个进程内首次使用时创建，gunicorn fork 出的 worker 各自持有独立的连接池。
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '180'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv('LLM_ACQUIRE_TIMEOUT', '300'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '1'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '30'))
+
+# 可以重试的响应状态码
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+class LLMError(Exception):
+    """大模型调用失败（重试后仍失败、排队超时或响应不是 JSON）"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMClient:
+    """
+    线程安全的大模型 HTTP 客户端
+
+    Args:
+        max_concurrency: 同时进行的请求数上限
+        connect_timeout, read_timeout: 连接、读取超时秒数
+        max_retries: 最多重试次数
+        base_delay, max_delay: 重试退避的基数和上限秒数
+        acquire_timeout: 排队等待的最长秒数
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, connect_timeout=LLM_CONNECT_TIMEOUT,
+                 read_timeout=LLM_READ_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 base_delay=LLM_RETRY_BASE_DELAY, max_delay=LLM_RETRY_MAX_DELAY,
+                 acquire_timeout=LLM_ACQUIRE_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+        # 重试由 _send 自己处理，连接池大小与并发上限一致
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, max_concurrency), max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """第 attempt 次重试（从 0 起）前等待的秒数"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    def _send(self, url, payload, api_key=None, stream=False):
+        """
+        发送 POST 请求，可重试的失败按退避策略重试
+
+        成功时返回的响应仍占着一个并发名额，调用方读完响应后必须调用 self._slots.release()。
+
+        Raises:
+            LLMError: 排队超时，或非 2xx 响应（可重试的状态码重试后仍失败）
+            requests.exceptions.RequestException: 读取超时，或连接失败且重试次数用尽
+        """
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        attempt = 0
+        while True:
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                raise LLMError(f"等待大模型请求排队超时（{self.acquire_timeout}秒）")
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout,
+                                             stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # 包括连接超时；读取超时（ReadTimeout）不是 ConnectionError，直接抛出
+                self._slots.release()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"大模型接口连接失败，{delay:.1f}秒后第{attempt + 1}次重试: {str(e)}")
+            except BaseException:
+                self._slots.release()
+                raise
+            else:
+                if response.status_code < 400:
+                    return response
+                self._slots.release()
+                detail = response.text[:200]
+                response.close()
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    raise LLMError(f"大模型接口返回错误 {response.status_code}: {detail}", response.status_code)
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"大模型接口返回 {response.status_code}，{delay:.1f}秒后第{attempt + 1}次重试")
+
+            # 退避等待时不占用并发名额
+            time.sleep(delay)
+            attempt += 1
+
+    def post_json(self, url, payload, api_key=None):
+        """
+        POST JSON 请求并返回解析后的 JSON 响应
+
+        Args:
+            url: 接口地址
+            payload: 请求体
+            api_key: 放入 Authorization: Bearer 头的密钥
+
+        Returns:
+            dict: 响应 JSON
+
+        Raises:
+            LLMError: 排队超时、非 2xx 响应（可重试的状态码重试后仍失败）或响应不是 JSON
+            requests.exceptions.RequestException: 读取超时，或连接失败且重试次数用尽
+        """
+        response = self._send(url, payload, api_key)
+        try:
+            return response.json()
+        except ValueError:
+            raise LLMError(f"大模型接口返回的不是JSON: {response.text[:200]}", response.status_code)
+        finally:
+            self._slots.release()
+
+    def stream_events(self, url, payload, api_key=None):
+        """
+        POST 流式请求（text/event-stream），逐条生成事件
+
+        只在收到响应头之前重试；流读到一半断开时异常直接抛给调用方。整个流读完或
+        生成器关闭前一直占着一个并发名额。
+
+        Args:
+            参数同 post_json，payload 中应带 "stream": true
+
+        Yields:
+            dict: 每个 data 事件解析后的 JSON，收到 data: [DONE] 时结束
+
+        Raises:
+            同 post_json
+        """
+        response = self._send(url, payload, api_key, stream=True)
+        try:
+            # 按字节分行再解码：换行符不会出现在 UTF-8 多字节字符中间
+            for raw_line in response.iter_lines():
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    yield json.loads(data)
+                except ValueError:
+                    logger.warning(f"无法解析的流式事件: {data[:200]}")
+        finally:
+            response.close()
+            self._slots.release()
+
+
+def get_client():
+    """获取当前进程共用的客户端"""
+    global _client, _client_pid
+    # fork 出来的子进程不能复用父进程的连接
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = LLMClient()
+                _client_pid = os.getpid()
+    return _client
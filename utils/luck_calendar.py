@@ -0,0 +1,189 @@
+"""
+流月、流日运势日历
+
+给定命盘，按日期范围生成每月（流月，以节为界）或每天（流日）的干支，并给出相对命主
+日主的十神和相对日柱的吉凶。流日直接读取 bazi_calendar 的逐日速查表，按
+(日柱, 公历年, 公历月) 缓存整月结果，同一日柱的命盘共用，一整年的逐日日历只需取 12 次缓存。
+"""
+
+import os
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from utils import bazi_calendar
+from utils.bazi_calculator import (
+    DI_ZHI, TIAN_GAN, calculate_ji_xiong_by_day_pillar, get_na_yin, get_shi_shen_name, get_ymd_gan_zhi
+)
+from utils.bazi_timeline import iter_liu_yue
+
+# 每次最多返回的流日天数、流月个数
+BAZI_LUCK_CALENDAR_MAX_DAYS = int(os.getenv('BAZI_LUCK_CALENDAR_MAX_DAYS', '400'))
+BAZI_LUCK_CALENDAR_MAX_MONTHS = int(os.getenv('BAZI_LUCK_CALENDAR_MAX_MONTHS', '120'))
+
+
+def _relative(gan, zhi, day_gan, day_zhi):
+    """干支相对命主的十神和吉凶"""
+    return {
+        "shiShen": get_shi_shen_name(day_gan, gan),
+        "jiXiong": calculate_ji_xiong_by_day_pillar(gan, zhi, day_gan, day_zhi)
+    }
+
+
+@lru_cache(maxsize=4096)
+def _get_month_days(day_gan, day_zhi, year, month):
+    """
+    一个公历月中每天的流日，按日柱和月份缓存，调用方不能修改返回的字典
+
+    Returns:
+        tuple: 每天一个 dict
+    """
+    days = []
+    for day in range(1, monthrange(year, month)[1] + 1):
+        if bazi_calendar.in_range(year, month, day):
+            _, month_index, day_index = bazi_calendar.lookup(year, month, day)
+            month_gan, month_zhi = bazi_calendar.gan_zhi(month_index)
+            gan, zhi = bazi_calendar.gan_zhi(day_index)
+        else:
+            _, _, month_gan, month_zhi, gan, zhi = get_ymd_gan_zhi(year, month, day)
+        days.append({
+            "date": f"{year:04d}-{month:02d}-{day:02d}",
+            "heavenlyStem": gan,
+            "earthlyBranch": zhi,
+            "naYin": get_na_yin(gan + zhi),
+            "monthStem": month_gan,
+            "monthBranch": month_zhi,
+            **_relative(gan, zhi, day_gan, day_zhi)
+        })
+    return tuple(days)
+
+
+def get_daily_calendar(chart, start_date, end_date):
+    """
+    逐日运势日历
+
+    Args:
+        chart: BaziChart
+        start_date: 起始日期 date（包含）
+        end_date: 结束日期 date（包含）
+
+    Returns:
+        list: 每天的流日信息：date、heavenlyStem、earthlyBranch、naYin、monthStem、monthBranch、
+              shiShen（日干相对日主）、jiXiong（相对日柱）
+
+    Raises:
+        ValueError: 日期范围无效或超过 BAZI_LUCK_CALENDAR_MAX_DAYS 天
+    """
+    if end_date < start_date:
+        raise ValueError("结束日期不能早于起始日期")
+    if (end_date - start_date).days >= BAZI_LUCK_CALENDAR_MAX_DAYS:
+        raise ValueError(f"日期范围不能超过 {BAZI_LUCK_CALENDAR_MAX_DAYS} 天")
+
+    day_gan = TIAN_GAN[chart.stems[2]]
+    day_zhi = DI_ZHI[chart.branches[2]]
+    calendar_days = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        month_days = _get_month_days(day_gan, day_zhi, year, month)
+        first = start_date.day - 1 if (year, month) == (start_date.year, start_date.month) else 0
+        last = end_date.day if (year, month) == (end_date.year, end_date.month) else len(month_days)
+        calendar_days.extend(dict(day) for day in month_days[first:last])
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return calendar_days
+
+
+def get_monthly_calendar(chart, start_date, end_date):
+    """
+    逐月运势日历（流月以节为界）
+
+    Args:
+        chart: BaziChart
+        start_date: 起始日期 date（包含）
+        end_date: 结束日期 date（包含）
+
+    Returns:
+        list: 与日期范围有交集的流月，每项在 bazi_timeline.iter_liu_yue 的字段之外
+              增加 year（所属流年）、endTime、shiShen（月干相对日主）和 jiXiong（相对日柱）
+
+    Raises:
+        ValueError: 日期范围无效或超过 BAZI_LUCK_CALENDAR_MAX_MONTHS 个月
+    """
+    if end_date < start_date:
+        raise ValueError("结束日期不能早于起始日期")
+    if (end_date.year - start_date.year) * 12 + end_date.month - start_date.month >= BAZI_LUCK_CALENDAR_MAX_MONTHS:
+        raise ValueError(f"日期范围不能超过 {BAZI_LUCK_CALENDAR_MAX_MONTHS} 个月")
+
+    day_gan = TIAN_GAN[chart.stems[2]]
+    day_zhi = DI_ZHI[chart.branches[2]]
+    range_start = datetime(start_date.year, start_date.month, start_date.day)
+    range_end = datetime(end_date.year, end_date.month, end_date.day) + timedelta(days=1)
+
+    # 一月上旬属于上一流年的丑月，所以从前一年开始找
+    months = []
+    for year in range(start_date.year - 1, end_date.year + 1):
+        months.extend((year, month) for month in iter_liu_yue(year))
+
+    calendar_months = []
+    for (year, month), (_, following) in zip(months, months[1:] + [(None, None)]):
+        month_start = datetime.strptime(month["startTime"], "%Y-%m-%d %H:%M:%S")
+        if following is not None:
+            month_end = datetime.strptime(following["startTime"], "%Y-%m-%d %H:%M:%S")
+        else:
+            month_end = datetime.strptime(next(iter_liu_yue(year + 1))["startTime"], "%Y-%m-%d %H:%M:%S")
+        if month_end <= range_start or month_start >= range_end:
+            continue
+        month["year"] = year
+        month["endTime"] = month_end.strftime("%Y-%m-%d %H:%M:%S")
+        month.update(_relative(month["heavenlyStem"], month["earthlyBranch"], day_gan, day_zhi))
+        calendar_months.append(month)
+    return calendar_months
+
+
+def parse_calendar_date(value, default=None):
+    """
+    解析 YYYY-MM-DD 格式的日期参数
+
+    Args:
+        value: 日期字符串，为空时返回 default
+        default: 默认日期
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"日期格式错误: {value}，应为 YYYY-MM-DD 格式")
+
+
+def get_luck_calendar(chart, start_date=None, end_date=None, granularity="day"):
+    """
+    按粒度生成运势日历，默认从今天起一个月（逐日）或一年（逐月）
+
+    Args:
+        chart: BaziChart
+        start_date: 起始日期 date，默认今天
+        end_date: 结束日期 date
+        granularity: "day" 或 "month"
+
+    Returns:
+        dict: startDate、endDate、granularity 和 items 列表
+    """
+    if granularity not in ("day", "month"):
+        raise ValueError(f"不支持的粒度: {granularity}")
+    start_date = start_date or date.today()
+    if end_date is None:
+        end_date = start_date + timedelta(days=30 if granularity == "day" else 365)
+
+    if granularity == "day":
+        items = get_daily_calendar(chart, start_date, end_date)
+    else:
+        items = get_monthly_calendar(chart, start_date, end_date)
+    return {
+        "startDate": start_date.isoformat(),
+        "endDate": end_date.isoformat(),
+        "granularity": granularity,
+        "items": items
+    }
@@ -1,10 +1,17 @@
+"""
+lunar_python 八字计算（旧接口）
+
+get_bazi 返回早期的 {"bazi", "shen_sha", "da_yun", "lunar_date"} 结构，只供旧脚本使用。
+路由和服务统一通过 bazi_calculator.calculate_bazi 排盘，lunar_python 参考实现见
+bazi_engine.LunarEngine（BAZI_ENGINE=lunar）。
+"""
+
 import logging
 import datetime
 import traceback
 from lunar_python import Solar, Lunar
 from lunar_python.util import LunarUtil
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # 天干
@@ -20,19 +27,19 @@ def get_bazi(year, month, day, hour, gender='男'):
     gender: '男' 或 '女'
     """
     try:
-        print(f"输入参数: 年={year}, 月={month}, 日={day}, 时={hour}, 性别={gender}")
+        logger.debug(f"输入参数: 年={year}, 月={month}, 日={day}, 时={hour}, 性别={gender}")
         
         # 创建公历对象
         solar = Solar.fromYmdHms(year, month, day, hour, 0, 0)
-        print(f"公历日期: {solar.toYmd()} {hour}时")
+        logger.debug(f"公历日期: {solar.toYmd()} {hour}时")
         
         # 转换为农历
         lunar = solar.getLunar()
-        print(f"农历日期: {lunar.toString()}")
+        logger.debug(f"农历日期: {lunar.toString()}")
         
         # 获取八字对象
         eight_char = lunar.getEightChar()
-        print(f"八字对象: {eight_char}")
+        logger.debug(f"八字对象: {eight_char}")
         
         # 获取年、月、日、时的天干地支
         year_gan = lunar.getYearGan()
@@ -44,10 +51,10 @@ def get_bazi(year, month, day, hour, gender='男'):
         hour_gan = lunar.getTimeGan()
         hour_zhi = lunar.getTimeZhi()
         
-        print(f"年柱: {year_gan}{year_zhi}")
-        print(f"月柱: {month_gan}{month_zhi}")
-        print(f"日柱: {day_gan}{day_zhi}")
-        print(f"时柱: {hour_gan}{hour_zhi}")
+        logger.debug(f"年柱: {year_gan}{year_zhi}")
+        logger.debug(f"月柱: {month_gan}{month_zhi}")
+        logger.debug(f"日柱: {day_gan}{day_zhi}")
+        logger.debug(f"时柱: {hour_gan}{hour_zhi}")
         
         # 组合八字
         bazi = {
@@ -94,7 +101,7 @@ def get_bazi(year, month, day, hour, gender='男'):
         for zhi in [year_zhi, month_zhi, day_zhi, hour_zhi]:
             five_elements[wu_xing_zhi.get(zhi, "木")] += 1
         
-        print(f"五行分布: {five_elements}")
+        logger.debug(f"五行分布: {five_elements}")
         
         # 获取神煞（简化示例）
         shen_sha = {}
@@ -102,12 +109,12 @@ def get_bazi(year, month, day, hour, gender='男'):
         # 计算大运
         try:
             yun = eight_char.getYun(1 if gender == '男' else 0)
-            print(f"大运方向: {'顺行' if yun.isForward() else '逆行'}")
-            print(f"起运年龄: {yun.getStartAge()}")
-            print(f"起运日期: {yun.getStartSolar().toYmd()}")
+            logger.debug(f"大运方向: {'顺行' if yun.isForward() else '逆行'}")
+            logger.debug(f"起运年龄: {yun.getStartAge()}")
+            logger.debug(f"起运日期: {yun.getStartSolar().toYmd()}")
             
             da_yun_list = yun.getDaYun()
-            print(f"大运数量: {len(da_yun_list)}")
+            logger.debug(f"大运数量: {len(da_yun_list)}")
             
             # 格式化大运信息
             da_yun = {
@@ -129,9 +136,9 @@ def get_bazi(year, month, day, hour, gender='男'):
                     gan_zhi = dy.getGanZhi()
                     gan = gan_zhi[0]
                     zhi = gan_zhi[1]
-                    print(f"第{i+1}步大运: {gan}{zhi}")
+                    logger.debug(f"第{i+1}步大运: {gan}{zhi}")
                 except Exception as e:
-                    print(f"获取第{i+1}步大运干支出错: {str(e)}")
+                    logger.debug(f"获取第{i+1}步大运干支出错: {str(e)}")
                     # 如果无法直接获取，则根据索引计算
                     if yun.isForward():
                         gan_idx = (HEAVENLY_STEMS.index(month_gan) + i + 1) % 10
@@ -142,7 +149,7 @@ def get_bazi(year, month, day, hour, gender='男'):
                         
                     gan = HEAVENLY_STEMS[gan_idx]
                     zhi = EARTHLY_BRANCHES[zhi_idx]
-                    print(f"计算得到第{i+1}步大运: {gan}{zhi}")
+                    logger.debug(f"计算得到第{i+1}步大运: {gan}{zhi}")
                 
                 # 计算年龄范围
                 start_age = yun.getStartAge() + i * 10
@@ -162,8 +169,7 @@ def get_bazi(year, month, day, hour, gender='男'):
                     "end_year": end_year
                 })
         except Exception as e:
-            print(f"计算大运出错: {str(e)}")
-            traceback.print_exc()
+            logger.exception(f"计算大运出错: {str(e)}")
             # 创建一个空的大运对象
             da_yun = {
                 "qi_yun": {
@@ -181,12 +187,12 @@ def get_bazi(year, month, day, hour, gender='男'):
             "lunar_date": lunar_date
         }
         
-        print("八字计算完成")
+        logger.debug("八字计算完成")
         return result
         
     except Exception as e:
         logger.error(f"计算八字出错: {str(e)}")
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise
 
 def format_bazi_analysis(bazi_data):
@@ -223,11 +229,12 @@ def format_bazi_analysis(bazi_data):
         }
     except Exception as e:
         logger.error(f"格式化八字分析出错: {str(e)}")
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise
 
 # 使用示例
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     try:
         # 测试用例：1986年4月23日17点出生的女性
         bazi_data = get_bazi(1986, 4, 23, 17, '女')
@@ -0,0 +1,245 @@
+"""
+神煞查表引擎
+
+神煞规则写在 utils/data/shen_sha_rules.json 中，导入时编译成每个类别、每一柱一张
+10×12 的位掩码数组：下标为 天干序号 * 12 + 地支序号，第 i 位表示该干支满足第 i 条
+规则中关于这一柱的条件。多柱类别（如本命神煞看年柱和日柱）把各柱的掩码按位与，
+就得到同时满足全部条件的规则集合，再按规则顺序取出名称。
+
+规则文件格式：
+
+    {
+      "version": 1,
+      "categories": {
+        "<类别>": {
+          "description": "说明",
+          "pillars": ["year", "day"],  // 可选，多柱类别的柱名，条件键加柱名前缀（yearGan 等）
+          "input": "gan",              // 可选，单柱类别只按天干（gan）或地支（zhi）判断
+          "rules": [
+            {"name": "神煞名", "gan": ["甲", "乙"], "zhi": ["子"], "ganZhi": ["甲子"]}
+          ]
+        }
+      }
+    }
+
+一条规则中的各个条件必须同时满足；省略的条件视为不限。新增神煞只需要在规则文件中
+追加一行，不需要改代码。
+"""
+
+import json
+import os
+from array import array
+
+TIAN_GAN = "甲乙丙丁戊己庚辛壬癸"
+DI_ZHI = "子丑寅卯辰巳午未申酉戌亥"
+_GAN_INDEX = {gan: i for i, gan in enumerate(TIAN_GAN)}
+_ZHI_INDEX = {zhi: i for i, zhi in enumerate(DI_ZHI)}
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shen_sha_rules.json')
+
+
+class ShenShaTable:
+    """
+    一个神煞类别编译后的查找表
+
+    Attributes:
+        names: 规则名称，按规则顺序
+        pillars: 柱名列表，单柱类别为 [""]
+        masks: 每一柱一个长度 120 的位掩码数组
+    """
+
+    __slots__ = ("names", "pillars", "masks", "_decoded", "_single")
+
+    def __init__(self, names, pillars, masks):
+        self.names = names
+        self.pillars = pillars
+        self.masks = masks
+        # 掩码到名称元组的缓存，一个类别最多 120 种组合
+        self._decoded = {}
+        # 单柱类别直接按下标保存名称元组，查询时省去解码
+        self._single = tuple(self._decode(mask) for mask in masks[0]) if len(masks) == 1 else None
+
+    def _decode(self, mask):
+        names = self._decoded.get(mask)
+        if names is None:
+            names = tuple(name for i, name in enumerate(self.names) if mask >> i & 1)
+            self._decoded[mask] = names
+        return names
+
+    def decode(self, mask):
+        """把位掩码转换为神煞名称列表（按规则顺序）"""
+        return list(self._decode(mask))
+
+    def mask(self, *pillars):
+        """
+        求满足全部条件的规则位掩码
+
+        Args:
+            *pillars: 每一柱的 (天干序号, 地支序号)，顺序与 self.pillars 一致
+        """
+        result = -1
+        for masks, (gan_index, zhi_index) in zip(self.masks, pillars):
+            result &= masks[gan_index * 12 + zhi_index]
+        return result
+
+    def lookup(self, *pillars):
+        """每一柱的 (天干序号, 地支序号) -> 神煞名称列表"""
+        if self._single is not None:
+            gan_index, zhi_index = pillars[0]
+            return list(self._single[gan_index * 12 + zhi_index])
+        return list(self._decode(self.mask(*pillars)))
+
+
+def _condition_key(pillar, key):
+    """多柱类别的条件键加柱名前缀，如 year + gan -> yearGan"""
+    return pillar + key[0].upper() + key[1:] if pillar else key
+
+
+def _condition_set(key, values, category, name):
+    """把条件中的干支转换为序号集合：天干、地支为单个序号，干支为 (天干序号, 地支序号)"""
+    try:
+        if key == "gan":
+            return {_GAN_INDEX[value] for value in values}
+        if key == "zhi":
+            return {_ZHI_INDEX[value] for value in values}
+        pairs = set()
+        for value in values:
+            if len(value) != 2:
+                raise KeyError(value)
+            pairs.add((_GAN_INDEX[value[0]], _ZHI_INDEX[value[1]]))
+        return pairs
+    except (KeyError, TypeError):
+        raise ValueError(f"神煞规则 {category}/{name} 中有无效的干支: {values}")
+
+
+def compile_rules(rules_data):
+    """
+    把规则数据编译成查找表
+
+    Args:
+        rules_data: 规则文件的内容（dict）
+
+    Returns:
+        dict: 类别名 -> ShenShaTable
+
+    Raises:
+        ValueError: 规则中有无效的干支或不支持的条件
+    """
+    tables = {}
+    for category, spec in rules_data.get("categories", {}).items():
+        pillars = spec.get("pillars") or [""]
+        allowed = {"gan", "zhi", "ganZhi"}
+        if spec.get("input") == "gan":
+            allowed = {"gan"}
+        elif spec.get("input") == "zhi":
+            allowed = {"zhi"}
+
+        rules = spec.get("rules", [])
+        if len(rules) > 30:
+            raise ValueError(f"神煞类别 {category} 的规则过多（最多 30 条）")
+
+        names = []
+        masks = [array("I", bytes(4 * 120)) for _ in pillars]
+        for bit, rule in enumerate(rules):
+            name = rule["name"]
+            names.append(name)
+            unknown = set(rule) - {"name"} - {
+                _condition_key(pillar, key) for pillar in pillars for key in allowed
+            }
+            if unknown:
+                raise ValueError(f"神煞规则 {category}/{name} 中有不支持的条件: {', '.join(sorted(unknown))}")
+
+            for pillar, pillar_masks in zip(pillars, masks):
+                conditions = {}
+                for key in ("gan", "zhi", "ganZhi"):
+                    values = rule.get(_condition_key(pillar, key))
+                    if values is not None:
+                        conditions[key] = _condition_set(key, values, category, name)
+
+                for gan_index in range(10):
+                    for zhi_index in range(12):
+                        if "gan" in conditions and gan_index not in conditions["gan"]:
+                            continue
+                        if "zhi" in conditions and zhi_index not in conditions["zhi"]:
+                            continue
+                        if "ganZhi" in conditions and (gan_index, zhi_index) not in conditions["ganZhi"]:
+                            continue
+                        pillar_masks[gan_index * 12 + zhi_index] |= 1 << bit
+
+        tables[category] = ShenShaTable(names, pillars, masks)
+    return tables
+
+
+def load_rules(path=RULES_FILE):
+    """读取并编译规则文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_rules(json.load(f))
+
+
+TABLES = load_rules()
+_CHART_TABLES = tuple(TABLES[category] for category in ("benMing", "yearGan", "yearZhi", "dayGan", "dayZhi"))
+
+
+def _pillar_index(gan, zhi):
+    """天干地支（字符或序号）转换为下标 天干序号 * 12 + 地支序号，无效时返回 None"""
+    gan_index = 0 if gan is None else _GAN_INDEX.get(gan, gan)
+    zhi_index = 0 if zhi is None else _ZHI_INDEX.get(zhi, zhi)
+    if gan_index.__class__ is int and zhi_index.__class__ is int and 0 <= gan_index < 10 and 0 <= zhi_index < 12:
+        return gan_index, zhi_index
+    return None
+
+
+def lookup(category, gan=None, zhi=None):
+    """
+    查询单柱类别的神煞
+
+    Args:
+        category: 类别名，如 yearGan、yearZhi、dayGan、dayZhi、liuNian
+        gan: 天干（字符或序号）
+        zhi: 地支（字符或序号）；只按天干判断的类别可省略，反之亦然
+
+    Returns:
+        list: 神煞名称列表，干支无效时返回空列表
+    """
+    index = _pillar_index(gan, zhi)
+    if index is None:
+        return []
+    return TABLES[category].lookup(index)
+
+
+def lookup_pillars(category, *pillars):
+    """
+    查询多柱类别的神煞
+
+    Args:
+        category: 类别名，如 benMing
+        *pillars: 每一柱的 (天干, 地支)，顺序与规则文件中的 pillars 一致
+
+    Returns:
+        list: 神煞名称列表，干支无效时返回空列表
+    """
+    indexes = [_pillar_index(gan, zhi) for gan, zhi in pillars]
+    if None in indexes:
+        return []
+    return TABLES[category].lookup(*indexes)
+
+
+def resolve_chart(year_gan, year_zhi, day_gan, day_zhi):
+    """
+    一次取出命盘 shenSha 中各类神煞
+
+    Args:
+        year_gan, year_zhi, day_gan, day_zhi: 年柱、日柱的天干地支序号
+
+    Returns:
+        dict: benMing、yearGan、yearZhi、dayGan、dayZhi 五类神煞名称列表
+    """
+    ben_ming, year_gan_table, year_zhi_table, day_gan_table, day_zhi_table = _CHART_TABLES
+    year_masks, day_masks = ben_ming.masks
+    return {
+        "benMing": list(ben_ming._decode(year_masks[year_gan * 12 + year_zhi] & day_masks[day_gan * 12 + day_zhi])),
+        "yearGan": list(year_gan_table._single[year_gan * 12]),
+        "yearZhi": list(year_zhi_table._single[year_zhi]),
+        "dayGan": list(day_gan_table._single[day_gan * 12]),
+        "dayZhi": list(day_zhi_table._single[day_zhi]),
+    }
@@ -0,0 +1,92 @@
+"""
+真太阳时校正
+
+出生时间通常是北京时间的钟表时间，而时辰应按出生地的真太阳时划分。校正分三步：
+
+1. 夏令时：1986-1991 年中国实行夏令时，期间的钟表时间比北京时间快一小时，先减回去；
+2. 经度：北京时间以东经 120° 为标准，出生地每偏西 1° 晚 4 分钟，得到地方平太阳时；
+3. 均时差：地方平太阳时加上当天的均时差（-14 到 +16 分钟）得到真太阳时。
+
+均时差按年内第几天预先算好一张 366 项的表（秒），夏令时是一张按年份的区间表，
+校正时只做两次查表和几次加减，不依赖任何外部服务。
+"""
+
+import math
+from datetime import datetime, timedelta
+
+# 北京时间的标准经度
+STANDARD_MERIDIAN = 120.0
+
+# 中国夏令时（钟表时间）：每年 [开始, 结束) 之间的钟表时间比北京时间快 60 分钟。
+# 开始时 2:00 拨到 3:00，结束时 2:00 拨回 1:00；结束当天重复的 1 点钟按夏令时处理。
+CHINA_DST_PERIODS = (
+    (datetime(1986, 5, 4, 2), datetime(1986, 9, 14, 2)),
+    (datetime(1987, 4, 12, 2), datetime(1987, 9, 13, 2)),
+    (datetime(1988, 4, 17, 2), datetime(1988, 9, 11, 2)),
+    (datetime(1989, 4, 16, 2), datetime(1989, 9, 17, 2)),
+    (datetime(1990, 4, 15, 2), datetime(1990, 9, 16, 2)),
+    (datetime(1991, 4, 14, 2), datetime(1991, 9, 15, 2)),
+)
+_DST_BY_YEAR = {start.year: (start, end) for start, end in CHINA_DST_PERIODS}
+DST_MINUTES = 60
+
+
+def _equation_of_time_seconds(day_of_year):
+    """均时差（秒，真太阳时 - 平太阳时），Spencer 公式，误差在半分钟以内"""
+    b = 2 * math.pi * (day_of_year - 1) / 365
+    minutes = 229.18 * (0.000075 + 0.001868 * math.cos(b) - 0.032077 * math.sin(b)
+                        - 0.014615 * math.cos(2 * b) - 0.040849 * math.sin(2 * b))
+    return round(minutes * 60)
+
+
+# 下标为年内第几天（1-366），0 号不用
+EQUATION_OF_TIME = (0,) + tuple(_equation_of_time_seconds(day) for day in range(1, 367))
+
+
+def china_dst_minutes(moment):
+    """
+    钟表时间 moment 处于中国夏令时中时返回 60，否则返回 0
+
+    Args:
+        moment: 北京时间的钟表时间 datetime
+    """
+    period = _DST_BY_YEAR.get(moment.year)
+    if period is not None and period[0] <= moment < period[1]:
+        return DST_MINUTES
+    return 0
+
+
+def equation_of_time(moment):
+    """moment 当天的均时差（秒）"""
+    return EQUATION_OF_TIME[moment.timetuple().tm_yday]
+
+
+def to_true_solar_time(moment, longitude, standard_meridian=STANDARD_MERIDIAN, correct_dst=True):
+    """
+    把钟表时间换算成出生地的真太阳时
+
+    Args:
+        moment: 钟表时间 datetime
+        longitude: 出生地经度（东经为正，西经为负）
+        standard_meridian: 钟表时间所用时区的标准经度，默认东经 120°（北京时间）
+        correct_dst: 是否扣除中国夏令时，只适用于北京时间
+
+    Returns:
+        tuple: (真太阳时 datetime, 明细 dict)，明细包含 dstMinutes、longitudeSeconds、
+               equationOfTimeSeconds 三项校正量
+
+    Raises:
+        ValueError: 经度超出 [-180, 180]
+    """
+    if not -180 <= longitude <= 180:
+        raise ValueError(f"经度超出范围: {longitude}")
+
+    dst_minutes = china_dst_minutes(moment) if correct_dst else 0
+    longitude_seconds = round((longitude - standard_meridian) * 240)
+    mean_solar = moment - timedelta(minutes=dst_minutes) + timedelta(seconds=longitude_seconds)
+    eot_seconds = equation_of_time(mean_solar)
+    return mean_solar + timedelta(seconds=eot_seconds), {
+        "dstMinutes": dst_minutes,
+        "longitudeSeconds": longitude_seconds,
+        "equationOfTimeSeconds": eot_seconds
+    }